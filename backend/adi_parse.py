@@ -7,19 +7,45 @@ Created on Tue Jul 13 13:31:17 2021
 
 ### ----------- IMPORTS --------------- ###
 import os
+from typing import Optional
 from beartype import beartype
-import numpy as np
 import pandas as pd
-import adi
+from backend.readers import get_reader
 ### ------------------------------------###
 
+def get_file_record(file_path:str, reader:str = 'auto'):
+    """
+    Read labchart file metadata once and collect all properties needed for indexing.
+
+    Parameters
+    ----------
+    file_path : str
+    reader : str, reader backend (auto, adi, sidecar, see backend.readers)
+
+    Returns
+    -------
+    record : dict, with keys:
+        n_channels : int, total number of channels
+        channel_names : list, channel names
+        record_lengths : list, number of samples per block (first channel)
+        block : int, block with the largest length
+        file_length : int, length of selected block in samples
+        tick_dt : list, sampling period per channel for the selected block
+        comments : list, [channel, text, tick_position] for each comment of first block
+
+    """
+    
+    return get_reader(reader).read_record(file_path)
+
+
 class AdiParse:
     """
-    Class to parse labchart files and retrieve information using the adi-reader library.
+    Class to parse labchart files and retrieve information from file records (see backend.readers).
     """   
     
     @beartype
-    def __init__(self, file_path:str, channel_structures:dict = {}):
+    def __init__(self, file_path:str, channel_structures:dict = {}, record:Optional[dict] = None,
+                 reader:str = 'auto'):
         """
         Retrieve file properties and pass to self.properties
 
@@ -27,6 +53,8 @@ class AdiParse:
         ----------
         file_path : str
         channel_structures : dict, keys =  total channels, values = channel list
+        record : dict, file record from get_file_record (file is read if None)
+        reader : str, reader backend used if record is None
 
         Returns
         -------
@@ -41,22 +69,19 @@ class AdiParse:
         # get file name
         self.file_name = os.path.basename(self.file_path)
         
-        # Get block
-        adi_obj = self.read_labchart_file()           # read file
+        # read all file properties in one pass
+        if record is None:
+            record = get_file_record(self.file_path, reader)
+        self.record = record
         
-        block_len = np.zeros(adi_obj.n_records)       # create empty array for storage
-        for block in range(adi_obj.n_records):
-            
-            # get block length
-           block_len[block] = adi_obj.channels[0].n_samples[block]
-       
-        self.block = np.argmax(block_len)           # find the block with larger length
+        # Get block
+        self.block = record['block']
          
         # Get total number of channels
-        self.n_channels = adi_obj.n_channels
+        self.n_channels = record['n_channels']
         
         # Get file length
-        self.file_length = int(block_len[self.block])
+        self.file_length = int(record['file_length'])
         
         # get channel order if total channel number matches
         channel_order = []
@@ -70,22 +95,6 @@ class AdiParse:
             self.channel_order = 'Brain regions provided do not match channel order'
         else:
             self.channel_order = channel_order
-            
-        del adi_obj                                   # clear memory
-    
-    
-    def read_labchart_file(self):
-        """
-        Creates read object for labchart file and passes to self
-
-        Returns
-        -------
-        adi_obj : Labchart read object
-
-        """
-        
-        # return labchart read object
-        return adi.read_file(self.file_path)
     
     
     def get_channel_names(self):
@@ -98,23 +107,9 @@ class AdiParse:
 
         """
         
-        # read labchart file
-        adi_obj = self.read_labchart_file()
-
-        # define dataframe columns
-        cols = {'channel_id', 'channel_name'}
-
-        # create empty dataframe
-        df = pd.DataFrame(data = np.zeros((self.n_channels, len(cols))), columns = cols, dtype = 'object')
-        
-        # iterate over channels and get names
-        for ch in range(self.n_channels):
-            
-            # append channel info to dictionary
-            df.at[ch, 'channel_id'] = str(ch)
-            df.at[ch, 'channel_name'] = adi_obj.channels[ch].name
-
-        del adi_obj # clear memory
+        # create dataframe from file record
+        df = pd.DataFrame({'channel_id' : [str(ch) for ch in range(self.n_channels)],
+                           'channel_name' : self.record['channel_names']}, dtype = 'object')
 
         return df
     
@@ -179,54 +174,30 @@ class AdiParse:
         
         return df
     
-    def add_comments(self, df):
+    def get_comments(self):
         """
-        Add one column to a channels df for each comment and comment time across channels.
-
-        Parameters
-        ----------
-        df : pd.DataFrame
+        Get comments in long format, one row per comment and channel.
+        Comments for all channels (channel = -1) are repeated for each channel.
+        Rows are ordered by channel and then by comment order in file.
 
         Returns
         -------
-        df : pd.DataFrame
+        df : pd.DataFrame, with channel_id, comment_text and comment_time columns
 
         """
         
-        # read labchart file
-        adi_obj = self.read_labchart_file()
-        
-        # add comments for each channel
-        properties = {'text' : 'comment_text_', 'tick_position' : 'comment_time_'}
-        
-        # retrieve all comments
-        comments = adi_obj.records[0].comments;
-        
-        # get channel order
-        ch_idx = np.array([com.channel_ for com in comments])
-
-        # iterate over properties
-        for key, val in properties.items():
-            
-            # index array
-            idx_array = np.array([getattr(com, key)for com in comments])
+        rows = [] # create empty list
+        for channel, text, tick_position in self.record['comments']: # iterate over comments
             
-            temp_coms = [] # creaty empty list
-            for ch in range(self.n_channels): # iterate over channels
-                
-                # get attribute that belongs in a channel
-                temp_coms.append(idx_array[ (ch_idx == ch) | (ch_idx == -1) ]) #-1 means all channels
-            
-            # convert list to dataframe
-            df_comments = pd.DataFrame(temp_coms)
-            
-            # add columns to dataframe
-            for i in range(df_comments.shape[1]): # iterate over max number of comments
-                
-                # pass to dataframe
-                df[val + str(i)] = df_comments.iloc[:,i]
-                
-        del adi_obj # clear memory
+            # get channels that the comment belongs to (-1 means all channels)
+            if channel == -1:
+                rows.extend([[ch, text, tick_position] for ch in range(self.n_channels)])
+            elif 0 <= channel < self.n_channels:
+                rows.append([channel, text, tick_position])
+        
+        # convert to dataframe and order by channel
+        df = pd.DataFrame(rows, columns = ['channel_id', 'comment_text', 'comment_time'])
+        df = df.sort_values('channel_id', kind = 'stable').reset_index(drop = True)
         
         return df
     
@@ -265,20 +236,16 @@ class AdiParse:
 
         """
         
-        # read labchart file
-        adi_obj = self.read_labchart_file()
-        
-        # get sampling rate
-        for i in range(len(df)):
-            df.at[i,'sampling_rate'] = int(1/adi_obj.channels[i].tick_dt[self.block])
+        # get sampling rate from file record
+        df['sampling_rate'] = [int(1/tick_dt) for tick_dt in self.record['tick_dt']]
             
         return df
             
     
     def get_all_file_properties(self):
         """
-        Extracts file name, channel names, channel number, brain region, comment text and time.
-        These information are added to a pandas DataFrame
+        Extracts file name, channel names, channel number and brain region.
+        These information are added to a pandas DataFrame (comments are retrieved with get_comments)
 
         Returns
         -------
@@ -292,9 +259,6 @@ class AdiParse:
         # add file names
         df = self.add_file_name(df)
         
-        # add comments
-        df = self.add_comments(df)
-        
         # add brain region
         df = self.add_brain_region(df)
         
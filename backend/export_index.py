@@ -0,0 +1,251 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import io
+import shutil
+import zipfile
+import tempfile
+### ------------------------------------------- ###
+
+# index column types (group columns are categorical, other columns are text)
+index_int_columns = ['file_id', 'file_length', 'channel_id', 'block', 'sampling_rate', 'start_time', 'stop_time']
+
+# export formats and file extensions
+export_formats = {'csv' : '.csv', 'parquet' : '.parquet', 'arrow' : '.arrow'}
+
+
+def import_pyarrow():
+    """
+    Import pyarrow (only needed for parquet and arrow export)
+
+    Returns
+    -------
+    pa : module
+
+    """
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError:
+        raise Exception('pyarrow is required to export parquet or arrow files (pip install pyarrow).')
+
+    return pa
+
+
+def get_index_schema(index_df, group_columns:list):
+    """
+    Get arrow schema of index (integer times and sampling rate, float metrics, dictionary encoded group columns)
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    group_columns : list, columns that denote groups
+
+    Returns
+    -------
+    schema : pa.Schema
+
+    """
+
+    pa = import_pyarrow()
+
+    fields = []
+    for col in index_df.columns:
+        if col in group_columns:
+            col_type = pa.dictionary(pa.int32(), pa.string())
+        elif col in index_int_columns or index_df[col].dtype.kind in 'iu':
+            col_type = pa.int64()
+        elif index_df[col].dtype.kind == 'f':
+            col_type = pa.float64()
+        else:
+            col_type = pa.string()
+        fields.append(pa.field(col, col_type))
+
+    return pa.schema(fields)
+
+
+def convert_index_types(index_df, group_columns:list):
+    """
+    Convert index columns to export types
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    group_columns : list, columns that denote groups
+
+    Returns
+    -------
+    index_df : pd.DataFrame, copy with int64, float64, category and text columns
+
+    """
+
+    index_df = index_df.copy()
+    for col in index_df.columns:
+        if col in group_columns:
+            index_df[col] = index_df[col].astype('category')
+        elif col in index_int_columns or index_df[col].dtype.kind in 'iu':
+            index_df[col] = index_df[col].astype('int64')
+        elif index_df[col].dtype.kind == 'f':
+            index_df[col] = index_df[col].astype('float64')
+        else:
+            index_df[col] = index_df[col].astype(str)
+
+    return index_df
+
+
+def check_partition_columns(index_df, partition_cols:list):
+    """
+    Check that partition columns exist and leave data columns
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    partition_cols : list
+
+    Returns
+    -------
+    None.
+
+    """
+
+    missing = [col for col in partition_cols if col not in index_df.columns]
+    if missing:
+        raise Exception('Partition columns -' + ', '.join(missing) + '- were not found in index.')
+    if len(set(partition_cols)) >= len(index_df.columns):
+        raise Exception('Index can not be partitioned by all of its columns.')
+
+
+def write_index(index_df, group_columns:list, path:str, file_format:str = 'csv', partition_cols:list = []):
+    """
+    Write index as csv, parquet or arrow ipc file.
+    Parquet and arrow indexes can be partitioned into folders by column values (hive style, e.g. brain_region=bla).
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    group_columns : list, columns that denote groups (stored as categories)
+    path : str, file path (folder path if partitioned)
+    file_format : str, csv, parquet or arrow
+    partition_cols : list, columns used to partition index (e.g. brain_region, animal_id)
+
+    Returns
+    -------
+    None.
+
+    """
+
+    if file_format not in export_formats:
+        raise Exception('Export format -' + file_format + '- is not supported, use ' + ', '.join(export_formats) + '.')
+
+    if file_format == 'csv':
+        if partition_cols:
+            raise Exception('Partitioned export is only supported for parquet and arrow formats.')
+        index_df.to_csv(path, index = False)
+        return
+
+    pa = import_pyarrow()
+    table = pa.Table.from_pandas(convert_index_types(index_df, group_columns),
+                                 schema = get_index_schema(index_df, group_columns), preserve_index = False)
+
+    if partition_cols:
+        check_partition_columns(index_df, partition_cols)
+        pa.dataset.write_dataset(table, path, format = 'parquet' if file_format == 'parquet' else 'ipc',
+                                 partitioning = list(partition_cols), partitioning_flavor = 'hive',
+                                 existing_data_behavior = 'delete_matching')
+    elif file_format == 'parquet':
+        pa.parquet.write_table(table, path)
+    else:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def get_index_bytes(index_df, group_columns:list, file_format:str = 'csv', partition_cols:list = []):
+    """
+    Write index to bytes for download (partitioned indexes are zipped)
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    group_columns : list, columns that denote groups
+    file_format : str, csv, parquet or arrow
+    partition_cols : list, columns used to partition index
+
+    Returns
+    -------
+    content : bytes
+    file_name : str
+
+    """
+
+    file_name = 'index' if partition_cols else 'index' + export_formats.get(file_format, '')
+    temp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(temp_dir, file_name)
+        write_index(index_df, group_columns, path, file_format, partition_cols)
+
+        if not partition_cols:
+            with open(path, 'rb') as file:
+                return file.read(), file_name
+
+        # zip partition folders
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for root, dirs, files in os.walk(path):
+                for file in files:
+                    zip_file.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), temp_dir))
+        return buffer.getvalue(), file_name + '_' + file_format + '.zip'
+
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors = True)
+
+
+def get_folder_extension(path:str):
+    """
+    Get file extension of partitioned index folder from the first parquet or arrow file found
+
+    Parameters
+    ----------
+    path : str, partitioned index folder
+
+    Returns
+    -------
+    extension : str, .parquet or .arrow
+
+    """
+
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for file in sorted(files):
+            extension = os.path.splitext(file)[1].lower()
+            if extension in ('.parquet', '.arrow'):
+                return extension
+
+    raise Exception('No parquet or arrow files were found in ' + path + '.')
+
+
+def read_index(path:str):
+    """
+    Read index (or other table) from csv, parquet or arrow ipc file or partitioned folder
+    (format of folder is detected from its files, parquet and arrow require pyarrow)
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    df : pd.DataFrame
+
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if os.path.isdir(path):
+        extension = get_folder_extension(path)
+    if extension in ('.parquet', '.arrow'):
+        pa = import_pyarrow()
+        file_format = 'ipc' if extension == '.arrow' else 'parquet'
+        return pa.dataset.dataset(path, format = file_format, partitioning = 'hive').to_table().to_pandas()
+
+    import pandas as pd
+    return pd.read_csv(path)
@@ -0,0 +1,429 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from backend.file_walker import get_file_entries
+from backend.filter_table import check_cancel
+from backend.readers import get_reader
+### ------------------------------------------- ###
+
+# segment store formats and file names (segment table is written next to the store as segments.csv,
+# segments.json records the format of the store that belongs to the segment table)
+store_formats = {'npy' : 'segments.npy', 'hdf5' : 'segments.h5'}
+segment_table_name = 'segments.csv'
+manifest_name = 'segments.json'
+
+# samples read from a channel at a time (bounds memory of each worker)
+chunk_samples = 1000000
+
+# maximum samples returned by one task when the main process writes the store (hdf5)
+max_task_samples = 10 * chunk_samples
+
+
+def import_h5py():
+    """
+    Import h5py (only needed for hdf5 segment stores)
+
+    Returns
+    -------
+    h5py : module
+
+    """
+
+    try:
+        import h5py
+    except ImportError:
+        raise Exception('h5py is required for hdf5 segment stores (pip install h5py), or use npy format.')
+
+    return h5py
+
+
+def get_index_paths(index_df, folder_path:str):
+    """
+    Get labchart file path of each index row.
+    Index text is lower case, so index paths are matched to the files found in the folder.
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, with folder_path and file_name (relative to folder_path)
+    folder_path : str, data folder that was indexed
+
+    Returns
+    -------
+    file_paths : np.array, file path per index row
+
+    """
+
+    # lower case relative path -> file path
+    lookup = {}
+    for root, file, _ in get_file_entries(folder_path):
+        file_path = os.path.join(root, file)
+        lookup[os.path.relpath(file_path, folder_path).replace(os.sep, '/').lower()] = file_path
+
+    # relative paths of index rows (folder separators of the indexing system are accepted)
+    folders = index_df['folder_path'].fillna('').astype(str)
+    files = index_df['file_name'].astype(str)
+    keys = pd.Series([re.sub(r'[\\/]+', '/', folder + '/' + file).strip('/').lower()
+                      for folder, file in zip(folders, files)], index = index_df.index)
+
+    file_paths = keys.map(lookup)
+    if file_paths.isna().any():
+        missing = keys[file_paths.isna()].unique()
+        raise Exception('Got ' + str(len(missing)) + ' indexed files that were not found in ' + folder_path +
+                        ' (e.g. ' + missing[0] + ').')
+
+    return file_paths.to_numpy()
+
+
+def get_segment_plan(index_df, folder_path:str):
+    """
+    Get file path, position and length of each index segment in the segment store.
+    Segments are stored back to back in index row order (samples start_time to stop_time, included).
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index
+    folder_path : str, data folder that was indexed
+
+    Returns
+    -------
+    plan : pd.DataFrame, with file_path, channel_id, block, start_time, stop_time, offset, length and row
+        (position in index) per index row
+
+    """
+
+    for col in ['folder_path', 'file_name', 'channel_id', 'block', 'start_time', 'stop_time']:
+        if col not in index_df.columns:
+            raise Exception('Column -' + col + '- is missing from index.')
+
+    plan = pd.DataFrame({'file_path' : get_index_paths(index_df, folder_path),
+                         'channel_id' : index_df['channel_id'].to_numpy(dtype = np.int64),
+                         'block' : index_df['block'].to_numpy(dtype = np.int64),
+                         'start_time' : index_df['start_time'].to_numpy(dtype = np.int64),
+                         'stop_time' : index_df['stop_time'].to_numpy(dtype = np.int64)})
+    plan['length'] = np.maximum(plan['stop_time'] - plan['start_time'] + 1, 0)
+    plan['offset'] = plan['length'].cumsum() - plan['length']
+    plan['row'] = np.arange(len(plan))
+
+    return plan
+
+
+def split_segments(plan, max_samples:int):
+    """
+    Split segments longer than max_samples into consecutive pieces of at most max_samples
+    (start_time, stop_time, offset and length of each piece, other columns are repeated)
+
+    Parameters
+    ----------
+    plan : pd.DataFrame, from get_segment_plan
+    max_samples : int, maximum samples per piece
+
+    Returns
+    -------
+    plan : pd.DataFrame, one row per piece
+
+    """
+
+    max_samples = max(int(max_samples), 1)
+    n_pieces = np.maximum(-(-plan['length'].to_numpy() // max_samples), 1)
+    if (n_pieces == 1).all():
+        return plan
+
+    # position of each piece in its segment
+    pieces = plan.iloc[np.repeat(np.arange(len(plan)), n_pieces)].reset_index(drop = True)
+    shift = (np.arange(len(pieces)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)) * max_samples
+    pieces['start_time'] += shift
+    pieces['offset'] += shift
+    pieces['length'] = np.minimum(pieces['length'] - shift, max_samples).clip(lower = 0)
+    pieces['stop_time'] = np.where(pieces['length'] > 0, pieces['start_time'] + pieces['length'] - 1,
+                                   pieces['stop_time'])
+
+    return pieces
+
+
+def get_file_tasks(plan, max_samples:int = None, columns:list = ['channel_id', 'block', 'start_time', 'stop_time',
+                                                                   'offset']):
+    """
+    Group segments by file (each file is opened once) and order them by block, start and channel.
+    Files with more than max_samples are split into several tasks of at most max_samples
+    (unless a single segment is longer, see split_segments).
+
+    Parameters
+    ----------
+    plan : pd.DataFrame, from get_segment_plan
+    max_samples : int, maximum samples per task (None for one task per file)
+    columns : list, plan columns of each segment
+
+    Returns
+    -------
+    tasks : list, of (file_path, segments) where segments is an int array with columns
+        (default: channel_id, block, start_time, stop_time, offset)
+
+    """
+
+    plan = plan[plan['length'] > 0].sort_values(['file_path', 'block', 'start_time', 'channel_id'], kind = 'stable')
+
+    tasks = []
+    for file_path, file_plan in plan.groupby('file_path', sort = False):
+        segments = file_plan[columns].to_numpy(dtype = np.int64)
+        if max_samples is None:
+            tasks.append((file_path, segments))
+            continue
+
+        # start new task before it would exceed max samples (at least one segment per task)
+        bounds, n_samples = [], 0
+        for i, length in enumerate(file_plan['length'].to_numpy()):
+            if n_samples > 0 and n_samples + length > max_samples:
+                bounds.append(i)
+                n_samples = 0
+            n_samples += length
+        for idx in np.split(np.arange(len(segments)), bounds):
+            tasks.append((file_path, segments[idx]))
+
+    return tasks
+
+
+def iter_segment_chunks(signals, file_path:str, channel_id:int, block:int, start:int, stop:int,
+                        chunk:int = chunk_samples):
+    """
+    Read samples of one segment in chunks
+
+    Parameters
+    ----------
+    signals : object, from ReaderBackend.open_signals
+    file_path : str, labchart file (used in errors)
+    channel_id : int
+    block : int
+    start : int, first sample (starts at 1)
+    stop : int, last sample (included)
+    chunk : int, samples read at a time
+
+    Yields
+    -------
+    pos : int, position of chunk in segment
+    values : np.array, chunk samples
+
+    """
+
+    for pos in range(start, stop + 1, chunk):
+        end = min(pos + chunk - 1, stop)
+        values = signals.get_data(int(channel_id), int(block), int(pos), int(end))
+        if len(values) != end - pos + 1:
+            raise Exception('Got ' + str(len(values)) + ' samples instead of ' + str(end - pos + 1) + ' from '
+                            + file_path + ' (channel ' + str(channel_id) + ', samples ' + str(pos) + '-' + str(end)
+                            + '), segment is beyond the end of the file.')
+        yield pos - start, values
+
+
+def read_segments(file_path:str, segments, reader:str = 'auto', store_path:str = None,
+                  dtype:str = 'float32', chunk:int = chunk_samples):
+    """
+    Read segments of one labchart file in chunks.
+    Segments are written into the npy store (opened as memory map) when store_path is given,
+    otherwise they are returned.
+
+    Parameters
+    ----------
+    file_path : str, labchart file
+    segments : np.array, (channel_id, block, start_time, stop_time, offset) rows
+    reader : str or ReaderBackend, reader backend that can open signals
+    store_path : str, npy store (None to return segments)
+    dtype : str, store data type
+    chunk : int, samples read at a time
+
+    Returns
+    -------
+    result : int, number of samples written (store_path) or list of (offset, data) per segment
+
+    """
+
+    signals = get_reader(reader).open_signals(file_path)
+    store = np.load(store_path, mmap_mode = 'r+') if store_path is not None else None
+
+    results, n_samples = [], 0
+    for channel_id, block, start, stop, offset in segments:
+        length = stop - start + 1
+        data = store[offset:offset + length] if store is not None else np.empty(length, dtype = dtype)
+
+        for pos, values in iter_segment_chunks(signals, file_path, channel_id, block, start, stop, chunk):
+            data[pos:pos + len(values)] = values
+
+        if store is None:
+            results.append((int(offset), data))
+        n_samples += length
+
+    if store is not None:
+        store.flush()
+        del store
+        return n_samples
+
+    return results
+
+
+def run_tasks(tasks:list, func, n_workers:int = 1, progress = None, cancel = None):
+    """
+    Run file tasks in worker processes (at most two tasks per worker are in flight to bound memory)
+
+    Parameters
+    ----------
+    tasks : list, of argument tuples passed to func
+    func : callable, picklable task function
+    n_workers : int, number of worker processes (1 runs tasks in the main process)
+    progress : callable, called with (tasks done, total tasks)
+    cancel : threading.Event, extraction stops when set
+
+    Yields
+    -------
+    result : return value of func (in completion order)
+
+    """
+
+    n_done = 0
+    if n_workers <= 1 or len(tasks) <= 1:
+        for args in tasks:
+            check_cancel(cancel)
+            yield func(*args)
+            n_done += 1
+            if progress is not None:
+                progress(n_done, len(tasks))
+        return
+
+    with ProcessPoolExecutor(max_workers = n_workers) as executor:
+        pending, queued = set(), iter(tasks)
+        try:
+            while True:
+                for args in queued:
+                    pending.add(executor.submit(func, *args))
+                    if len(pending) >= 2 * n_workers:
+                        break
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    n_done += 1
+                    if progress is not None:
+                        progress(n_done, len(tasks))
+                check_cancel(cancel)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def extract_segments(index_df, folder_path:str, output_path:str, file_format:str = 'npy', n_workers:int = 1,
+                     reader:str = 'auto', dtype:str = 'float32', progress = None, cancel = None):
+    """
+    Extract samples of each index row into one flat segment store.
+    Rows are grouped by file and read in order of position, so each labchart file is opened once,
+    and files are read in parallel. Memory is bounded by the read chunk and the tasks in flight.
+
+    npy : samples are written by the workers straight into a memory mapped segments.npy.
+    hdf5 : workers return samples of tasks of at most max_task_samples (long segments are split) and the
+        main process writes them into the chunked dataset 'samples' of segments.h5 (with 'offset' and 'length' datasets).
+
+    The samples of index row i are samples[segment_offset[i]:segment_offset[i] + segment_length[i]].
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index
+    folder_path : str, data folder that was indexed
+    output_path : str, output folder
+    file_format : str, npy or hdf5 (requires h5py)
+    n_workers : int, number of worker processes reading files
+    reader : str or ReaderBackend, reader backend that can open signals (auto, adi or registered backend)
+    dtype : str, data type of stored samples
+    progress : callable, called with (files done, total files)
+    cancel : threading.Event, extraction stops when set
+
+    Raises
+    ------
+    ScanCancelled
+
+    Returns
+    -------
+    segment_df : pd.DataFrame, index with segment_offset and segment_length columns
+
+    """
+
+    if file_format not in store_formats:
+        raise Exception('Segment format -' + file_format + '- is not supported, use ' + ', '.join(store_formats) + '.')
+
+    plan = get_segment_plan(index_df, os.path.normpath(folder_path))
+    total = int(plan['length'].sum())
+    os.makedirs(output_path, exist_ok = True)
+    store_path = os.path.join(output_path, store_formats[file_format])
+
+    # remove manifest and stores of previous extractions (output is only loadable when complete)
+    for name in [manifest_name] + list(store_formats.values()):
+        if os.path.isfile(os.path.join(output_path, name)):
+            os.remove(os.path.join(output_path, name))
+
+    if file_format == 'npy':
+        # create store, workers write their segments into it
+        store = np.lib.format.open_memmap(store_path, mode = 'w+', dtype = dtype, shape = (total,))
+        del store
+        tasks = [(file_path, segments, reader, store_path, dtype) for file_path, segments in get_file_tasks(plan)]
+        for _ in run_tasks(tasks, read_segments, n_workers, progress, cancel):
+            pass
+
+    else:
+        # long segments are split so that a task never holds more than max_task_samples
+        h5py = import_h5py()
+        tasks = [(file_path, segments, reader, None, dtype)
+                 for file_path, segments in get_file_tasks(split_segments(plan, max_task_samples), max_task_samples)]
+        with h5py.File(store_path, 'w') as file:
+            samples = file.create_dataset('samples', shape = (total,), dtype = dtype,
+                                          chunks = (min(chunk_samples, total),) if total else None)
+            file.create_dataset('offset', data = plan['offset'].to_numpy())
+            file.create_dataset('length', data = plan['length'].to_numpy())
+            for results in run_tasks(tasks, read_segments, n_workers, progress, cancel):
+                for offset, data in results:
+                    samples[offset:offset + len(data)] = data
+
+    segment_df = index_df.copy()
+    segment_df['segment_offset'] = plan['offset'].to_numpy()
+    segment_df['segment_length'] = plan['length'].to_numpy()
+    segment_df.to_csv(os.path.join(output_path, segment_table_name), index = False)
+    with open(os.path.join(output_path, manifest_name), 'w') as file:
+        json.dump({'format' : file_format, 'store' : store_formats[file_format], 'segments' : len(segment_df),
+                   'samples' : total, 'dtype' : str(np.dtype(dtype))}, file)
+
+    return segment_df
+
+
+def load_segments(output_path:str):
+    """
+    Open segment store written by extract_segments (samples are not loaded into memory).
+    The store is selected by the manifest of the extraction, so stores of older extractions are never read.
+
+    Parameters
+    ----------
+    output_path : str, output folder of extract_segments
+
+    Returns
+    -------
+    samples : np.memmap (npy) or h5py.Dataset (hdf5, file stays open until the dataset is closed)
+    segment_df : pd.DataFrame, index with segment_offset and segment_length columns
+
+    """
+
+    manifest_path = os.path.join(output_path, manifest_name)
+    if not os.path.isfile(manifest_path):
+        raise Exception('No complete segment extraction was found in ' + output_path + ' (' + manifest_name
+                        + ' is missing), extract segments again.')
+    with open(manifest_path, 'r') as file:
+        manifest = json.load(file)
+    if manifest.get('format') not in store_formats:
+        raise Exception('Segment format -' + str(manifest.get('format')) + '- in ' + manifest_path + ' is not supported.')
+
+    segment_df = pd.read_csv(os.path.join(output_path, segment_table_name))
+    store_path = os.path.join(output_path, store_formats[manifest['format']])
+    if manifest['format'] == 'npy':
+        return np.load(store_path, mmap_mode = 'r'), segment_df
+
+    h5py = import_h5py()
+    return h5py.File(store_path, 'r')['samples'], segment_df
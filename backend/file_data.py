@@ -0,0 +1,356 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import numpy as np
+import pandas as pd
+### ------------------------------------------- ###
+
+# file data and comment data column types, text and category columns are converted to lower case,
+# path columns are normalized with os.path.normcase (lower case only on case insensitive systems)
+file_data_schema = {'file_key' : 'int32',
+                    'channel_id' : 'int16',
+                    'channel_name' : 'category',
+                    'file_name' : 'category',
+                    'brain_region' : 'category',
+                    'file_length' : 'int64',
+                    'block' : 'int16',
+                    'sampling_rate' : 'int32',
+                    'folder_path' : 'path',
+                    'file_id' : 'int32',
+                    'comment_text' : 'category',
+                    'comment_time' : 'int64',
+                    }
+
+# columns stored once per file (all other file data columns are stored per channel)
+file_table_columns = ['file_name', 'folder_path', 'file_length', 'block']
+
+# column order of flat file data (see FileData.to_frame)
+file_data_columns = ['channel_id', 'channel_name', 'file_name', 'brain_region', 'file_length', 'block',
+                     'sampling_rate', 'folder_path']
+
+
+def get_column_type(column:str):
+    """
+    Get column type from file_data_schema
+
+    Parameters
+    ----------
+    column : str, column name
+
+    Returns
+    -------
+    col_type : str
+
+    """
+
+    if column not in file_data_schema:
+        raise Exception('Column -' + column + '- is not defined in file data schema.')
+
+    return file_data_schema[column]
+
+
+def map_unique(values, func):
+    """
+    Apply function once per unique value and return results as categorical.
+    Missing values stay missing.
+
+    Parameters
+    ----------
+    values : array like
+    func : callable, applied to each unique value
+
+    Returns
+    -------
+    result : pd.Categorical
+
+    """
+
+    codes, uniques = pd.factorize(values)
+    new_codes, categories = pd.factorize(pd.Series([func(x) for x in uniques], dtype = object))
+
+    # last code is used for missing values (code -1)
+    new_codes = np.append(new_codes, -1)
+    return pd.Categorical.from_codes(new_codes[codes], categories)
+
+
+def map_unique_series(values, func):
+    """
+    Apply vectorized function once to the unique values and return results as categorical
+    (e.g. pandas string methods). Missing values stay missing.
+
+    Parameters
+    ----------
+    values : array like
+    func : callable, gets pd.Series of unique values and returns pd.Series of the same length
+
+    Returns
+    -------
+    result : pd.Categorical
+
+    """
+
+    codes, uniques = pd.factorize(values)
+    result = func(pd.Series(np.asarray(uniques, dtype = object), dtype = object))
+    new_codes, categories = pd.factorize(pd.Series(np.asarray(result, dtype = object), dtype = object))
+
+    # last code is used for missing values (code -1)
+    new_codes = np.append(new_codes, -1)
+    return pd.Categorical.from_codes(new_codes[codes], categories)
+
+
+class FileDataBuilder:
+    """
+    Collect file data column by column and build one typed dataframe at the end.
+    """
+
+    def __init__(self):
+        """
+        Create empty column storage
+
+        Returns
+        -------
+        None.
+
+        """
+
+        # list of (row offset, array) per column
+        self.columns = {}
+        self.n_rows = 0
+
+    def append(self, df):
+        """
+        Append dataframe rows (e.g. from one file) to builder
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for col in df.columns:
+            self.columns.setdefault(col, []).append((self.n_rows, df[col].to_numpy()))
+        self.n_rows += len(df)
+
+    def pop_first_values(self, column:str):
+        """
+        Remove column from builder and get its first value in each appended dataframe
+        (e.g. file columns that are repeated on each channel row)
+
+        Parameters
+        ----------
+        column : str
+
+        Returns
+        -------
+        values : list
+
+        """
+
+        return [chunk[0] for offset, chunk in self.columns.pop(column, [])]
+
+    def build_column(self, column:str):
+        """
+        Concatenate column chunks and convert to schema type.
+        Rows with missing values are filled with '' for text and nan for numbers.
+
+        Parameters
+        ----------
+        column : str
+
+        Returns
+        -------
+        values : np.array or pd.Categorical
+
+        """
+
+        col_type = get_column_type(column)
+
+        # create filled array
+        if col_type in ('text', 'category', 'path'):
+            values = np.full(self.n_rows, '', dtype = object)
+        else:
+            values = np.full(self.n_rows, np.nan, dtype = float)
+
+        # add chunks
+        for offset, chunk in self.columns[column]:
+            values[offset:offset + len(chunk)] = chunk
+
+        # convert types (repeated text is converted once per unique value)
+        if col_type == 'text':
+            values = pd.Series(values).fillna('').astype(str).str.lower().to_numpy(dtype = object)
+        elif col_type == 'category':
+            values = map_unique(pd.Series(values).fillna(''), lambda x: str(x).lower())
+        elif col_type == 'path':
+            values = map_unique(pd.Series(values).fillna(''), lambda x: os.path.normcase(str(x)))
+        else:
+            values = values.astype(col_type)
+
+        return values
+
+    def build(self):
+        """
+        Build typed dataframe from collected columns
+
+        Returns
+        -------
+        df : pd.DataFrame
+
+        """
+
+        return pd.DataFrame({col: self.build_column(col) for col in self.columns})
+
+
+class FileData:
+    """
+    Scanned labchart files stored as a file table (one row per file) and a channel table
+    (one row per channel, file_key = file table row). Columns of both tables are accessed per channel
+    row with file_data[column], file columns are broadcast through file_key without copying text.
+    """
+
+    def __init__(self, files, channels):
+        """
+        Parameters
+        ----------
+        files : pd.DataFrame, one row per file (file_table_columns)
+        channels : pd.DataFrame, one row per channel with file_key and channel columns
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.files = files
+        self.channels = channels
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Create file data from flat file data with one row per channel (e.g. from to_frame).
+        Rows with the same folder_path and file_name belong to one file, schema columns are converted
+        as in FileDataBuilder and other text columns (e.g. animal_id) to categories.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+
+        Returns
+        -------
+        file_data : FileData
+
+        """
+
+        df = df.reset_index(drop = True)
+        builder = FileDataBuilder()
+        builder.append(df[[col for col in df.columns if col in file_data_schema]])
+        columns = {}
+        for col in df.columns:
+            if col in file_data_schema:
+                columns[col] = builder.build_column(col)
+            elif df[col].dtype == object:
+                columns[col] = df[col].astype('category')
+            else:
+                columns[col] = df[col]
+
+        # first channel row of each file
+        keys = [col for col in ['folder_path', 'file_name'] if col in df.columns]
+        file_key = df.groupby(keys, sort = False, dropna = False).ngroup().to_numpy() if keys else np.arange(len(df))
+        first_rows = np.unique(file_key, return_index = True)[1]
+
+        files = pd.DataFrame({col: pd.Series(columns[col]).iloc[first_rows].to_numpy()
+                              for col in file_table_columns if col in columns})
+        for col in files.columns:
+            if isinstance(columns[col].dtype, pd.CategoricalDtype):
+                files[col] = files[col].astype('category')
+        channels = pd.DataFrame({'file_key' : file_key.astype(file_data_schema['file_key'])})
+        for col in df.columns:
+            if col not in file_table_columns:
+                channels[col] = columns[col]
+
+        return cls(files, channels)
+
+    def __len__(self):
+        return len(self.channels)
+
+    @property
+    def columns(self):
+        return [col for col in self.channels.columns if col != 'file_key'] + list(self.files.columns)
+
+    def __contains__(self, column:str):
+        return column in self.columns
+
+    def __getitem__(self, column:str):
+        return self.get_column(column)
+
+    def __setitem__(self, column:str, values):
+        if column in self.files.columns or column == 'file_key':
+            raise Exception('File column -' + column + '- can not be set per channel.')
+        self.channels[column] = values
+
+    def copy(self):
+        return FileData(self.files.copy(), self.channels.copy())
+
+    def get_column(self, column:str):
+        """
+        Get column with one value per channel row
+
+        Parameters
+        ----------
+        column : str
+
+        Returns
+        -------
+        values : pd.Series
+
+        """
+
+        if column in self.channels.columns:
+            return self.channels[column]
+
+        if column not in self.files.columns:
+            raise Exception('Column -' + column + '- was not found in file data.')
+
+        # broadcast file column to channels
+        file_key = self.channels['file_key'].to_numpy()
+        values = self.files[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = pd.Categorical.from_codes(values.cat.codes.to_numpy()[file_key], values.cat.categories)
+        else:
+            values = values.to_numpy()[file_key]
+
+        return pd.Series(values, index = self.channels.index, name = column)
+
+    def to_frame(self):
+        """
+        Get flat file data with one row per channel (text columns as objects)
+
+        Returns
+        -------
+        df : pd.DataFrame
+
+        """
+
+        columns = [col for col in file_data_columns if col in self] + \
+                  [col for col in self.columns if col not in file_data_columns]
+        df = pd.DataFrame({col: self.get_column(col) for col in columns})
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+
+        return df
+
+    def memory_usage(self, index:bool = True, deep:bool = True):
+        """
+        Get memory of file and channel table columns (same arguments as pd.DataFrame.memory_usage)
+
+        Returns
+        -------
+        usage : pd.Series, bytes per table column (e.g. files.file_name, channels.channel_name)
+
+        """
+
+        return pd.concat([self.files.memory_usage(index = index, deep = deep).add_prefix('files.'),
+                          self.channels.memory_usage(index = index, deep = deep).add_prefix('channels.')])
@@ -0,0 +1,166 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+### ------------------------------------------- ###
+
+# labchart file extension (matched exactly, e.g. x.adicht.bak is skipped)
+labchart_extension = '.adicht'
+
+# number of folders listed at a time (listing is mostly waiting on the file system, e.g. network shares)
+walk_threads = 8
+
+
+def is_labchart_file(file_name:str):
+    """
+    Check if file has labchart extension (case insensitive)
+
+    Parameters
+    ----------
+    file_name : str
+
+    Returns
+    -------
+    bool
+
+    """
+
+    return os.path.splitext(file_name)[1].lower() == labchart_extension
+
+
+def get_file_order_key(folder_path:str, file_path:str):
+    """
+    Get sort key that orders file paths in sorted walk order
+    (files of a folder by name, followed by subfolders by name)
+
+    Parameters
+    ----------
+    folder_path : str
+    file_path : str
+
+    Returns
+    -------
+    key : tuple
+
+    """
+
+    root, file = os.path.split(file_path)
+    rel_root = os.path.relpath(root, folder_path)
+    return (() if rel_root == os.curdir else tuple(rel_root.split(os.sep)), file)
+
+
+def list_folder(folder_path:str):
+    """
+    List labchart files and subfolders of one folder with os.scandir.
+    File stats come from the directory entries (no extra call on windows).
+    Symbolic links to folders are not followed (same as os.walk) and unreadable folders are skipped.
+
+    Parameters
+    ----------
+    folder_path : str
+
+    Returns
+    -------
+    files : list, of (root, file, (size, mtime_ns)) tuples
+    folders : list, of subfolder paths
+
+    """
+
+    files, folders = [], []
+    try:
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            folders.append(entry.path)
+                    elif is_labchart_file(entry.name):
+                        stat = entry.stat()
+                        files.append((folder_path, entry.name, (stat.st_size, stat.st_mtime_ns)))
+                except OSError: # entry was removed while listing
+                    continue
+    except OSError:
+        pass
+
+    return files, folders
+
+
+def iter_file_entries(folder_path:str, n_threads:int = walk_threads, cancel = None):
+    """
+    Walk folder and subfolders concurrently and yield labchart files of each folder as soon as it is listed.
+    Subfolders are queued by the listing threads, so the walk continues while yielded files are processed
+    (folders are yielded in completion order, use get_file_order_key for sorted walk order).
+
+    Parameters
+    ----------
+    folder_path : str
+    n_threads : int, maximum number of folders listed at a time
+    cancel : threading.Event, walk stops when set
+
+    Yields
+    -------
+    files : list, of (root, file, (size, mtime_ns)) tuples of one folder
+
+    """
+
+    results = queue.Queue()
+    stop = threading.Event()
+    lock = threading.Lock()
+    n_folders = [1] # folders queued for listing
+    executor = ThreadPoolExecutor(max_workers = max(n_threads, 1))
+
+    def walk(path):
+        files = []
+        try:
+            if stop.is_set() or (cancel is not None and cancel.is_set()):
+                return
+            files, folders = list_folder(path)
+
+            # count subfolders before this folder is reported as done
+            with lock:
+                n_folders[0] += len(folders)
+            for folder in folders:
+                try:
+                    executor.submit(walk, folder)
+                except RuntimeError: # walk was stopped
+                    results.put([])
+        finally:
+            results.put(files)
+
+    executor.submit(walk, folder_path)
+    n_done = 0
+    try:
+        while True:
+            with lock:
+                if n_done == n_folders[0]:
+                    break
+            files = results.get()
+            n_done += 1
+            if cancel is not None and cancel.is_set():
+                return
+            if files:
+                yield files
+    finally:
+        # skip queued folders if walk is stopped early
+        stop.set()
+        executor.shutdown(wait = True)
+
+
+def get_file_entries(folder_path:str, n_threads:int = walk_threads):
+    """
+    Get all labchart files in folder and subfolders with stats (in sorted walk order)
+
+    Parameters
+    ----------
+    folder_path : str
+    n_threads : int, maximum number of folders listed at a time
+
+    Returns
+    -------
+    file_entries : list, of (root, file, (size, mtime_ns)) tuples
+
+    """
+
+    file_entries = [entry for files in iter_file_entries(folder_path, n_threads) for entry in files]
+    return sorted(file_entries, key = lambda x: get_file_order_key(folder_path, os.path.join(x[0], x[1])))
@@ -1,68 +1,547 @@
 
 ### ----------------- IMPORTS ----------------- ###
 import os
+import re
+import time
+import hashlib
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
 from beartype import beartype
 import numpy as np
 import pandas as pd
-from backend.adi_parse import AdiParse
-from backend import search_function
+from backend.adi_parse import AdiParse, get_file_record
+from backend.metadata_cache import MetadataCache, get_file_stat
+from backend.file_data import FileDataBuilder, FileData, file_table_columns, map_unique, map_unique_series
+from backend.index_table import IndexTable
+from backend.scan_cache import normalize_folder_path
+from backend.file_walker import get_file_entries, iter_file_entries, get_file_order_key
+from backend.rule_engine import RuleProgram
 from backend.get_all_comments import GetComments
+from backend.profiler import profile_stage
 ### ------------------------------------------- ###
 
-@beartype
-def get_file_data(folder_path:str, channel_structures:dict):
+# user data Search Functions that define the animal id (the row is not used as group rule)
+animal_id_functions = ['within', 'regex', 'template']
+
+def get_file_paths(folder_path:str):
     """
-    Get file data in dataframe
+    Get all labchart file paths in folder and subfolders (in sorted walk order)
 
     Parameters
     ----------
     folder_path : str
-    channel_structures : dict, keys =  total channels, values = channel list
 
     Returns
     -------
-    file_data : pd.DataFrame
+    file_paths : list, of (root, file) tuples
 
     """
     
-    # make lower string and path type
-    folder_path = folder_path = os.path.normpath(folder_path.lower())
-    file_data = pd.DataFrame()
-    cntr = 0
+    return [(root, file) for root, file, stat in get_file_entries(folder_path)]
+
+
+def get_folder_fingerprint(folder_path:str, file_entries:list):
+    """
+    Get fingerprint of labchart files in folder from their paths, sizes and modification times
+    (files are not opened).
+
+    Parameters
+    ----------
+    folder_path : str
+    file_entries : list, of (root, file, (size, mtime_ns)) tuples from get_file_entries
+
+    Returns
+    -------
+    fingerprint : str
+
+    """
     
-    # walk through all folders
-    for root, dirs, files in os.walk(folder_path):
+    fingerprint = hashlib.sha1()
+    for root, file, (size, mtime_ns) in file_entries:
+        fingerprint.update(('%s|%s|%d|%d\n' % (os.path.relpath(root, folder_path), file, size, mtime_ns)).encode())
         
-        # get labchart file list
-        filelist = list(filter(lambda k: '.adicht' in k, files))
+    return fingerprint.hexdigest()
+
+
+class ScanCancelled(Exception):
+    """
+    Raised when a folder scan is cancelled by the user.
+    """
+
+
+def check_cancel(cancel):
+    """
+    Raise ScanCancelled if cancel event is set
+
+    Parameters
+    ----------
+    cancel : threading.Event or None
+
+    Returns
+    -------
+    None.
+
+    """
+    
+    if cancel is not None and cancel.is_set():
+        raise ScanCancelled('Scan was cancelled.')
+
+
+def read_timed_file_record(file_path:str, reader:str = 'auto'):
+    """
+    Read labchart file record and measure read time
+
+    Parameters
+    ----------
+    file_path : str
+    reader : str, reader backend (see backend.readers)
+
+    Returns
+    -------
+    record : dict
+    elapsed : float, seconds
+
+    """
+    
+    start = time.perf_counter()
+    record = get_file_record(file_path, reader)
+    return record, time.perf_counter() - start
+
+
+def read_file_chunk(file_paths:list, reader:str = 'auto'):
+    """
+    Read labchart file records of one chunk (used by worker processes)
+
+    Parameters
+    ----------
+    file_paths : list, of file paths
+    reader : str, reader backend (see backend.readers)
+
+    Returns
+    -------
+    records : list, with one (record, read time) tuple per file
+
+    """
+    
+    return [read_timed_file_record(file_path, reader) for file_path in file_paths]
+
+
+def read_file_records(file_paths:list, n_workers:int = 1, chunksize:int = 1, progress = None, cancel = None,
+                      profiler = None, reader:str = 'auto'):
+    """
+    Read labchart file records serially or across a process pool.
+    Records are returned in the same order as file_paths.
+
+    Parameters
+    ----------
+    file_paths : list, of file paths
+    n_workers : int, number of worker processes (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    progress : callable, called with (files read, total files) after each file/chunk
+    cancel : threading.Event, scan stops between files/chunks when set
+    profiler : StageProfiler, read time of each file is added if not None
+    reader : str, reader backend (see backend.readers)
+
+    Raises
+    ------
+    ScanCancelled
+
+    Returns
+    -------
+    records : list, with one record per file
 
-        for file in filelist: # iterate over list
+    """
+    
+    if n_workers < 1:
+        raise Exception('Number of workers must be at least 1.')
+    if chunksize < 1:
+        raise Exception('Chunk size must be at least 1.')
+    
+    records = []
+    times = []
+    
+    # serial scan
+    if n_workers == 1 or len(file_paths) < 2:
+        for file_path in file_paths:
+            check_cancel(cancel)
+            record, elapsed = read_timed_file_record(file_path, reader)
+            records.append(record)
+            times.append(elapsed)
+            if progress is not None:
+                progress(len(records), len(file_paths))
+        if profiler is not None:
+            profiler.add_file_times(file_paths, times)
+        return records
+    
+    # parallel scan (chunks are collected in order)
+    chunks = [file_paths[i:i + chunksize] for i in range(0, len(file_paths), chunksize)]
+    with ProcessPoolExecutor(max_workers = min(n_workers, len(chunks))) as executor:
+        futures = [executor.submit(read_file_chunk, chunk, reader) for chunk in chunks]
+        for future in futures:
+            
+            # cancel pending chunks
+            if cancel is not None and cancel.is_set():
+                for pending in futures:
+                    pending.cancel()
+                check_cancel(cancel)
+                
+            for record, elapsed in future.result():
+                records.append(record)
+                times.append(elapsed)
+            if progress is not None:
+                progress(len(records), len(file_paths))
+    
+    if profiler is not None:
+        profiler.add_file_times(file_paths, times)
         
-            # initiate adi parse object      
-            adi_parse = AdiParse(os.path.join(root, file), channel_structures)
+    return records
+
+
+def read_cached_file_records(file_paths:list, cache, n_workers:int = 1, chunksize:int = 1, 
+                             progress = None, cancel = None, profiler = None, file_stats:list = None,
+                             reader:str = 'auto'):
+    """
+    Get file records from cache and read only new or modified files.
+
+    Parameters
+    ----------
+    file_paths : list, of file paths
+    cache : MetadataCache
+    n_workers : int, number of worker processes (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    progress : callable, called with (files done, total files)
+    cancel : threading.Event, scan stops between files/chunks when set
+    profiler : StageProfiler, read time of each new or modified file is added if not None
+    file_stats : list, of (size, mtime_ns) for each file (files are stat if None)
+    reader : str, reader backend (see backend.readers)
+
+    Returns
+    -------
+    records : list, with one record per file
+
+    """
+    
+    # get cached records of unchanged files
+    if file_stats is None:
+        file_stats = [get_file_stat(file_path) for file_path in file_paths]
+    records = cache.get_records(file_paths, file_stats)
+    
+    # read missing files and add to cache
+    missing = [i for i, record in enumerate(records) if record is None]
+    n_cached = len(file_paths) - len(missing)
+    if progress is not None:
+        progress(n_cached, len(file_paths))
+        
+    if len(missing) > 0:
+        
+        # report cached files as done
+        missing_progress = None
+        if progress is not None:
+            missing_progress = lambda n_done, n_total: progress(n_cached + n_done, len(file_paths))
             
-            # get all file data in dataframe
-            temp_file_data = adi_parse.get_all_file_properties()
+        new_records = read_file_records([file_paths[i] for i in missing], n_workers, chunksize,
+                                        missing_progress, cancel, profiler, reader)
+        cache.put_records([file_paths[i] for i in missing], [file_stats[i] for i in missing], new_records)
+        for i, record in zip(missing, new_records):
+            records[i] = record
             
-            # add folder path
-            temp_file_data['folder_path'] = os.path.normcase(root)
+    return records
+
+
+def read_folder_records(folder_path:str, n_workers:int = 1, chunksize:int = 1, cache = None, progress = None,
+                        cancel = None, profiler = None, file_entries:list = None, reader:str = 'auto'):
+    """
+    Walk folder and read labchart file records while subfolders are still being listed.
+    Records of unchanged files are taken from cache (validated with directory entry stats),
+    other files are read in this process or sent to worker processes as soon as they are found.
+
+    Parameters
+    ----------
+    folder_path : str, normalized folder path
+    n_workers : int, number of worker processes (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    cache : MetadataCache, persistent file record cache (files are always read if None)
+    progress : callable, called with (files done, files found)
+    cancel : threading.Event, scan stops between files/chunks when set
+    profiler : StageProfiler, read time of each new or modified file is added if not None
+    file_entries : list, of (root, file, (size, mtime_ns)) tuples (folder is walked if None)
+    reader : str, reader backend (see backend.readers)
 
-            # apppend to dataframe
-            file_data = file_data.append(temp_file_data, ignore_index = True)
+    Raises
+    ------
+    ScanCancelled
 
-            cntr+=1
+    Returns
+    -------
+    file_paths : list, in sorted walk order
+    records : list, with one record per file
+
+    """
+    
+    if n_workers < 1:
+        raise Exception('Number of workers must be at least 1.')
+    if chunksize < 1:
+        raise Exception('Chunk size must be at least 1.')
+    
+    # files of each listed folder are processed as one batch
+    batches = [file_entries] if file_entries is not None else iter_file_entries(folder_path, cancel = cancel)
+    
+    paths, stats, records = [], [], []
+    read_idx, times = [], []        # position and read time of files that were read
+    chunk, futures = [], []         # file positions sent to workers
+    executor = ProcessPoolExecutor(max_workers = n_workers) if n_workers > 1 else None
+    n_done = 0
+    try:
+        for batch in batches:
+            check_cancel(cancel)
+            batch_paths = [os.path.join(root, file) for root, file, stat in batch]
+            batch_stats = [stat for root, file, stat in batch]
+            cached = cache.get_records(batch_paths, batch_stats) if cache is not None else [None] * len(batch)
+            
+            for file_path, file_stat, record in zip(batch_paths, batch_stats, cached):
+                paths.append(file_path)
+                stats.append(file_stat)
+                records.append(record)
+                if record is not None:
+                    n_done += 1
+                    continue
                 
-    # convert data frame to lower case
-    file_data = file_data.apply(lambda x: x.astype(str).str.lower())
+                # read file or send chunk to workers
+                read_idx.append(len(paths) - 1)
+                if executor is None:
+                    check_cancel(cancel)
+                    records[-1], elapsed = read_timed_file_record(file_path, reader)
+                    times.append(elapsed)
+                    n_done += 1
+                else:
+                    chunk.append(len(paths) - 1)
+                    if len(chunk) == chunksize:
+                        futures.append((chunk, executor.submit(read_file_chunk, [paths[i] for i in chunk], reader)))
+                        chunk = []
+            
+            if progress is not None:
+                progress(n_done, len(paths))
+        check_cancel(cancel)
         
-    # convert file length to int
-    file_data['file_length'] = file_data['file_length'].astype(np.int64)
+        # collect records from workers (in order of submission)
+        if chunk:
+            futures.append((chunk, executor.submit(read_file_chunk, [paths[i] for i in chunk], reader)))
+        for positions, future in futures:
+            check_cancel(cancel)
+            for i, (record, elapsed) in zip(positions, future.result()):
+                records[i] = record
+                times.append(elapsed)
+            n_done += len(positions)
+            if progress is not None:
+                progress(n_done, len(paths))
+    
+    finally:
+        if executor is not None:
+            for positions, future in futures:
+                future.cancel()
+            executor.shutdown(wait = True)
+    
+    # add new records to cache
+    if cache is not None and len(read_idx) > 0:
+        cache.put_records([paths[i] for i in read_idx], [stats[i] for i in read_idx], [records[i] for i in read_idx])
+    if profiler is not None:
+        profiler.add_file_times([paths[i] for i in read_idx], times)
+    
+    # sort in walk order
+    order = sorted(range(len(paths)), key = lambda i: get_file_order_key(folder_path, paths[i]))
+    return [paths[i] for i in order], [records[i] for i in order]
+
+
+@beartype
+def get_file_data(folder_path:str, channel_structures:dict, n_workers:int = 1, chunksize:int = 1,
+                  cache:Optional[MetadataCache] = None, progress = None, cancel = None, profiler = None,
+                  file_entries:Optional[list] = None, reader:str = 'auto'):
+    """
+    Get file data in dataframe
+
+    Parameters
+    ----------
+    folder_path : str
+    channel_structures : dict, keys =  total channels, values = channel list
+    n_workers : int, number of worker processes used to read files (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    cache : MetadataCache, persistent file record cache (files are always read if None)
+    progress : callable, called with (files done, files found)
+    cancel : threading.Event, scan stops between files when set
+    profiler : StageProfiler, records walk and read, parse and lowercase stages if not None
+    file_entries : list, of (root, file, (size, mtime_ns)) tuples from get_file_entries (folder is walked if None)
+    reader : str, reader backend (auto, adi, sidecar, see backend.readers)
+
+    Returns
+    -------
+    file_data : FileData, file and channel tables
+    comment_data : pd.DataFrame, one row per comment and channel (file_id = file_data channel row)
+
+    """
+    
+    # normalize path (lower case only on case insensitive systems)
+    folder_path = normalize_folder_path(folder_path)
+    
+    # get labchart files and read file properties (files are read while subfolders are listed)
+    with profile_stage(profiler, 'walk and read') as stage:
+        if progress is not None:
+            progress(0, 0)
+        paths, records = read_folder_records(folder_path, n_workers, chunksize, cache, progress, cancel, profiler,
+                                             file_entries, reader)
+        stage['items'] = len(paths)
+    
+    # get channel and comment data of each file
+    with profile_stage(profiler, 'parse', len(paths)):
+        file_frames = [get_file_frames(path, record, channel_structures) for path, record in zip(paths, records)]
+    
+    with profile_stage(profiler, 'lowercase', len(paths)):
+        return build_file_data(folder_path, file_frames)
+
+
+def get_file_frames(file_path:str, record:dict, channel_structures:dict):
+    """
+    Get channel and comment data of one file from its record
+
+    Parameters
+    ----------
+    file_path : str
+    record : dict, file record from get_file_record
+    channel_structures : dict, keys =  total channels, values = channel list
+
+    Returns
+    -------
+    temp_file_data : pd.DataFrame, one row per channel
+    temp_comments : pd.DataFrame, one row per comment and channel (channel_id, comment_text, comment_time)
+
+    """
+    
+    # initiate adi parse object      
+    adi_parse = AdiParse(file_path, channel_structures, record)
+    
+    # get all file data in dataframe
+    temp_file_data = adi_parse.get_all_file_properties()
+    
+    # add folder path
+    temp_file_data['folder_path'] = os.path.normcase(os.path.dirname(file_path))
+    
+    # get comments
+    temp_comments = adi_parse.get_comments()
+    
+    return temp_file_data, temp_comments
+
+
+def build_file_data(folder_path:str, file_frames:list):
+    """
+    Build file and comment data from channel and comment data of each file
+
+    Parameters
+    ----------
+    folder_path : str, normalized folder path (used to make folder paths relative)
+    file_frames : list, of (temp_file_data, temp_comments) from get_file_frames
+
+    Returns
+    -------
+    file_data : FileData, file table (one row per file) and channel table (one row per channel)
+    comment_data : pd.DataFrame, one row per comment and channel (file_id = file_data channel row)
+
+    """
+    
+    if len(file_frames) == 0:
+        raise Exception('No labchart files were found in ' + folder_path + '.')
+    
+    channels = FileDataBuilder()
+    comment_data = FileDataBuilder()
+    
+    offsets = [] # first channel row of each file
+    counts = [] # number of comments of each file
+    n_channels = [] # number of channels of each file
+    for temp_file_data, temp_comments in file_frames: # iterate over list
+        
+        # files without channels have no rows in file data
+        if len(temp_file_data) == 0:
+            continue
+        
+        offsets.append(channels.n_rows)
+        counts.append(len(temp_comments))
+        n_channels.append(len(temp_file_data))
+
+        # add columns to builders
+        comment_data.append(temp_comments)
+        channels.append(temp_file_data)
+    
+    # keep file columns once per file
+    files = FileDataBuilder()
+    files.append(pd.DataFrame({col: channels.pop_first_values(col) for col in file_table_columns}))
+    
+    # build typed tables (text columns are converted to lower case categories)
+    files = files.build()
+    channels = channels.build()
+    channels.insert(0, 'file_key', np.repeat(np.arange(len(n_channels), dtype = np.int32), n_channels))
+    comment_data = comment_data.build()
+    
+    # link comments to channel rows
+    file_id = np.repeat(np.array(offsets, dtype = np.int64), counts) + comment_data.pop('channel_id').to_numpy()
+    comment_data.insert(0, 'file_id', file_id.astype(np.int32))
     
     # make paths relative
-    file_data.folder_path = file_data.folder_path.str.replace(folder_path, '', regex=False)
-    file_data.folder_path = file_data.folder_path.map(lambda x: x.lstrip('\\'))
+    files['folder_path'] = map_unique(files['folder_path'],
+                                      lambda x: x.replace(folder_path, '').lstrip('\\'))
     
-    return file_data
+    return FileData(files, channels), comment_data
+
+
+def get_scan_data(folder_path:str, channel_structures:dict, n_workers:int = 1, chunksize:int = 1,
+                  cache = None, scan_cache = None, progress = None, cancel = None, profiler = None,
+                  reader:str = 'auto'):
+    """
+    Get file and comment data from scan cache if folder did not change, otherwise scan folder.
+
+    Parameters
+    ----------
+    folder_path : str
+    channel_structures : dict, keys =  total channels, values = channel list
+    n_workers : int, number of worker processes used to read files (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    cache : MetadataCache, persistent file record cache
+    scan_cache : ScanCache, in-memory cache of scanned folders
+    progress : callable, called with (files done, total files)
+    cancel : threading.Event, scan stops between files when set
+    profiler : StageProfiler, records scan stages if not None
+    reader : str, reader backend (see backend.readers)
+
+    Returns
+    -------
+    file_data : FileData
+    comment_data : pd.DataFrame
+    scan_cached : bool, True if data were retrieved from scan_cache
+
+    """
+    
+    if scan_cache is None:
+        return get_file_data(folder_path, channel_structures, n_workers, chunksize, cache,
+                             progress, cancel, profiler, reader = reader) + (False,)
+    
+    # get cache key and fingerprint of current folder contents
+    norm_path = normalize_folder_path(folder_path)
+    key = (norm_path, repr(sorted(channel_structures.items())))
+    with profile_stage(profiler, 'fingerprint') as stage:
+        file_entries = get_file_entries(norm_path)
+        fingerprint = get_folder_fingerprint(norm_path, file_entries)
+        stage['items'] = len(file_entries)
+    
+    # return a copy so that cached data are not modified
+    data = scan_cache.get(key, fingerprint)
+    if data is not None:
+        if progress is not None:
+            progress(1, 1)
+        return tuple(df.copy() for df in data) + (True,)
+    
+    # scan listed files and add to cache
+    data = get_file_data(folder_path, channel_structures, n_workers, chunksize, cache, progress, cancel, profiler,
+                         file_entries, reader)
+    scan_cache.put(key, fingerprint, tuple(df.copy() for df in data))
+    
+    return data + (False,)
 
 
 def get_channel_structures(user_data):
@@ -98,46 +577,129 @@ def get_channel_structures(user_data):
         
     return regions
 
+def get_animal_id_pattern(search_function:str, search_value:str):
+    """
+    Get regular expression that extracts animal id from source names
+
+    within : id is the text between the first and second separator, returned with separators
+             (e.g. -a1- from m_-a1-_wt for separator -)
+    regex : id is the named group -id-, the first capture group, or the whole match (e.g. animal(\\d+))
+    template : source name with {id} field, other {name} fields match any text (e.g. {sex}_{id}_{genotype})
+
+    Parameters
+    ----------
+    search_function : str, within, regex or template
+    search_value : str, separator, regular expression or template
+
+    Returns
+    -------
+    pattern : re.Pattern, with at least one capture group
+
+    """
+
+    if search_value == '':
+        raise Exception('Search Value is required for animal id Search Function -' + search_function + '-.\n')
+
+    if search_function == 'within':
+        sep = re.escape(search_value)
+        pattern = '^.*?' + sep + '(?P<id>.*?)(?:' + sep + '|$)'
+
+    elif search_function == 'regex':
+        pattern = search_value
+        try:
+            if re.compile(pattern).groups == 0:
+                pattern = '(?P<id>' + pattern + ')'
+        except re.error as err:
+            raise Exception('Animal id regex -' + search_value + '- is not valid: ' + str(err) + '\n')
+
+    elif search_function == 'template':
+        parts = re.split(r'\{(\w*)\}', search_value)
+        if 'id' not in parts[1::2]:
+            raise Exception('Animal id template -' + search_value + '- requires an {id} field.\n')
+
+        # escape text between fields, id is the only captured field
+        pattern = ''.join(re.escape(part) if i % 2 == 0 else '(?P<id>.+?)' if part == 'id' else '.*?'
+                          for i, part in enumerate(parts))
+        pattern = '^' + pattern + '$'
+
+    else:
+        raise Exception('Search Function -' + search_function + '- can not be used for animal id.\n')
+
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def extract_animal_id(names, search_function:str, search_value:str):
+    """
+    Extract animal id from each name with one vectorized string operation over unique names
+
+    Parameters
+    ----------
+    names : pd.Series, source names (e.g. channel_name)
+    search_function : str, within, regex or template
+    search_value : str, separator, regular expression or template
+
+    Returns
+    -------
+    animal_id : pd.Categorical, '' where no id was found
+
+    """
+
+    pattern = get_animal_id_pattern(search_function, search_value)
+
+    def extract(unique_names):
+        matches = unique_names.astype(str).str.extract(pattern, expand = True)
+        ids = matches['id'] if 'id' in matches.columns else matches.iloc[:, 0]
+        if search_function == 'within':
+            ids = search_value + ids + search_value
+        return ids.fillna('')
+
+    return map_unique_series(names, extract)
+
+
 def add_animal_id(file_data, user_data):
     """
-    Add animal id from channel name to labchart data
+    Add animal id from user selected source (e.g. channel name) to labchart data.
+    The animal id row of user data has Search Function within, regex or template.
 
     Parameters
     ----------
-    file_data : pd.DataFrame
+    file_data : FileData
     user_data : Dataframe with user data for SAKE input
 
     Returns
     -------
-    file_data : List with channels in order
+    file_data : FileData, with categorical animal_id column
     user_data: Dataframe with user data for SAKE input
+    warning_str: str, lists channels where no animal id was found
 
     """
     
-    # get data containing channel order
-    drop_idx = user_data['Search Function'] == 'within'
+    # get animal id row
+    drop_idx = user_data['Search Function'].isin(animal_id_functions)
     animal_id = user_data[drop_idx].reset_index().drop(['index'], axis = 1)
     
     # check if present
     if len(animal_id) > 1:
-        raise(Exception('Only one Search Function with -within- is allowed!\n'))
+        raise(Exception('Only one animal id Search Function (' + ', '.join(animal_id_functions) + ') is allowed!\n'))
     if len(animal_id)  == 0:
-        raise(Exception('Search Function -within- is required!\n'))
+        raise(Exception('Animal id Search Function (' + ', '.join(animal_id_functions) + ') is required!\n'))
     
     # convert to dictionary
     ids = animal_id.loc[0].to_dict()
     
-    # define separator
-    sep = ids['Search Value']
-    
-    # get file name
-    # ids['Category']
-    file_data['animal_id'] = ''
-    for i,name in enumerate(file_data[ids['Source']]):
-        if sep in name:
-            file_data.at[i, ids['Category']] = sep + name.split(sep)[1] + sep
+    # get id once per unique name
+    file_data['animal_id'] = extract_animal_id(file_data[ids['Source']], ids['Search Function'], ids['Search Value'])
+
+    # report channels without id
+    warning_str = ''
+    missing = np.where(file_data['animal_id'] == '')[0]
+    if len(missing) > 0:
+        names = file_data['file_name'].astype(str) + ': ' + file_data[ids['Source']].astype(str)
+        examples = names.iloc[missing].drop_duplicates().iloc[:5]
+        warning_str = 'Warning: No animal id was found in ' + str(len(missing)) + ' of ' + str(len(file_data)) + \
+            ' channels (e.g. ' + ', '.join(examples) + ')!!'
 
-    return file_data, user_data.drop(np.where(drop_idx)[0], axis = 0)
+    return file_data, user_data.drop(np.where(drop_idx)[0], axis = 0), warning_str
 
 
 def get_categories(user_data):
@@ -182,23 +744,15 @@ def reverse_hot_encoding(sort_df):
     """
 
     # get columns
-    labels = np.array(sort_df.columns)
+    labels = np.array(sort_df.columns, dtype = object)
     
-    # find index where column is True #np.argmax(np.array(sort_df), axis = 1)
-    idx_array = np.array(sort_df)
-    col_labels = np.zeros(len(sort_df), dtype=object)
+    # find rows where exactly one column is True
+    idx_array = np.array(sort_df, dtype = bool)
+    single = idx_array.sum(axis = 1) == 1
     
-    for i in range(idx_array.shape[0]): # iterate over idx_array
-        
-        # find which column
-        idx = np.where(idx_array[i] == True)[0]
-        
-        if len(idx) == 0:       # if no True value present
-            col_labels[i] = np.NaN
-        elif  len(idx) > 1:     # if more than one True value present
-            col_labels[i] = np.NaN
-        elif len(idx) == 1:     # if one True value present
-            col_labels[i] = labels[idx[0]]
+    # get column label for rows with one True value (nan if none or more than one)
+    col_labels = np.full(len(sort_df), np.NaN, dtype = object)
+    col_labels[single] = labels[np.argmax(idx_array[single], axis = 1)]
             
     return col_labels
     
@@ -229,7 +783,7 @@ def convert_logicdf_to_groups(index_df, logic_index_df, groups_ids:dict):
             if (logic_index_df[groups].any().any() == True):  # was any group detected? 
             
                 # convert logic to groups
-                index_df[category] = reverse_hot_encoding(logic_index_df[groups])
+                index_df[category] = pd.Categorical(reverse_hot_encoding(logic_index_df[groups]))
                 
     return index_df
 
@@ -252,14 +806,15 @@ def get_source_logic(file_data, user_data, source:str):
     # get only user data form source
     user_data = user_data[user_data['Source'] == source].reset_index()
     
+    # run all rules on unique source values
+    program = RuleProgram(user_data['Search Function'], user_data['Search Value'])
+    logic = program.run(file_data[source])
+    
     index = {}
     for i in range(len(user_data)): # iterate over user data entries       
-                
-        # find index for specified source and match string
-        idx = getattr(search_function, user_data.at[i, 'Search Function'])(file_data[source], user_data.at[i, 'Search Value'])                  
         
         # append to index dictionary                
-        index.update({user_data.at[i, 'Assigned Group Name']: idx})
+        index.update({user_data.at[i, 'Assigned Group Name']: logic[:,i]})
         
     return pd.DataFrame(index)
 
@@ -282,38 +837,44 @@ def get_drop_logic(file_data, user_data, source:str):
     # get only user data form source
     user_data = user_data[user_data['Source'] == source].reset_index()
     
+    # run all rules on unique source values
+    program = RuleProgram(user_data['Search Function'], user_data['Search Value'])
+    logic = program.run(file_data[source])
+    
     index = {}
     for i in range(len(user_data)): # iterate over user data entries       
-                
-        # find index for specified source and match string
-        idx = getattr(search_function, user_data.at[i, 'Search Function'])(file_data[source], user_data.at[i, 'Search Value'])
 
         # append to index dictionary
         col_name =  source + '_' + user_data.at[i, 'Assigned Group Name'] + str(i)
-        index.update({col_name: idx})
+        index.update({col_name: logic[:,i]})
         
     return pd.DataFrame(index)
     
 
-def create_index_array(file_data, user_data):
+def create_index_array(file_data, user_data, comment_data = None, profiler = None):
     """
     Create index for experiments according to user selection
 
     Parameters
     ----------
-    file_data : pd.DataFrame, aggregated data from labchart files
+    file_data : FileData or pd.DataFrame, aggregated data from labchart files (with animal_id)
     user_data : pd.DataFrame, user search and grouping parameters
+    comment_data : pd.DataFrame, comments in long format (file_id, comment_text, comment_time)
+    profiler : StageProfiler, records rule logic, comments and drop stages if not None
 
     Returns
     -------
-    index_df: pd.DataFrame, with index
+    index_table: IndexTable, with index (materialize with index_table.to_frame())
     group_columns: list, column names that denote groups
     warning_str: str, string used for warning
     """
     
+    # flat file data (one row per channel) is split into file and channel tables
+    if isinstance(file_data, pd.DataFrame):
+        file_data = FileData.from_frame(file_data)
+    
     # create empty dataframes for storage
     logic_index_df = pd.DataFrame()
-    index_df = pd.DataFrame()
     drop_df = pd.DataFrame()
     warning_str = ''
     
@@ -325,65 +886,74 @@ def create_index_array(file_data, user_data):
     user_data_drop = user_data[drop_idx]
     user_data_use = user_data[~drop_idx]
 
-    for source in sources: # iterate over user data entries  
-        
-        # get index logic for each assigned group
-        df = get_source_logic(file_data, user_data_use, source)
-        logic_index_df = pd.concat([logic_index_df, df], axis=1)
-        
-        # get drop_logic
-        df = get_drop_logic(file_data, user_data_drop, source)
-        drop_df = pd.concat([drop_df, df], axis=1)
-
-    # add columns from file to data
-    add_columns = ['animal_id','folder_path','file_name','file_length',
-     'channel_id', 'block' , 'sampling_rate', 'brain_region',]
-    index_df = pd.concat([index_df, file_data[add_columns]], axis=1)
+    with profile_stage(profiler, 'rule logic', len(file_data)):
+        for source in sources: # iterate over user data entries  
+            
+            # get index logic for each assigned group
+            df = get_source_logic(file_data, user_data_use, source)
+            logic_index_df = pd.concat([logic_index_df, df], axis=1)
+            
+            # get drop_logic
+            df = get_drop_logic(file_data, user_data_drop, source)
+            drop_df = pd.concat([drop_df, df], axis=1)
     
-    # get time
-    index_df['start_time'] = 1
-    index_df['stop_time'] = file_data['file_length']
-
-    # get category with group names
-    groups_ids = get_categories(user_data_use)
+        # one index row per file data row (other file data columns are looked up by file_id)
+        index_df = pd.DataFrame({'animal_id' : file_data['animal_id'],
+                                 'sampling_rate' : file_data['sampling_rate']})
+        
+        # get time
+        index_df['start_time'] = np.int64(1)
+        index_df['stop_time'] = file_data['file_length'].to_numpy()
     
-    # convert logic to groups
-    index_df = convert_logicdf_to_groups(index_df, logic_index_df, groups_ids)
+        # get category with group names
+        groups_ids = get_categories(user_data_use)
+        
+        # convert logic to groups
+        index_df = convert_logicdf_to_groups(index_df, logic_index_df, groups_ids)
     
     # get time and comments
-    obj = GetComments(file_data, user_data_use, 'comment_text', 'comment_time')
-    index_df, com_warning = obj.add_comments_to_index(index_df)
+    with profile_stage(profiler, 'comments') as stage:
+        obj = GetComments(comment_data, user_data_use, 'comment_text', 'comment_time')
+        index_df, com_warning = obj.add_comments_to_index(index_df)
+        stage['items'] = len(index_df)
     
     # reset index and rename previous index to file_id
     index_df = index_df.rename_axis('file_id').reset_index()
+    index_df['file_id'] = index_df['file_id'].astype(np.int32)
     
     # check if user selected time exceeds bounds
-    if (index_df['start_time']<0).any() or (index_df['start_time']>index_df['file_length']).any():
+    file_length = file_data['file_length'].to_numpy()[index_df['file_id'].to_numpy()]
+    if (index_df['start_time']<0).any() or (index_df['start_time']>file_length).any():
         raise Exception('Start time exceeds bounds.')
-    elif (index_df['stop_time']<0).any() or (index_df['stop_time']>index_df['file_length']).any():
+    elif (index_df['stop_time']<0).any() or (index_df['stop_time']>file_length).any():
         raise Exception('Stop time exceeds bounds.')
 
-    # update group columns
+    # update group columns (brain region is the last level)
     group_columns = list(index_df.columns[index_df.columns.get_loc('stop_time')+1:]) + ['brain_region']
+    brain_region = file_data['brain_region']
+    index_df['brain_region'] = pd.Categorical.from_codes(brain_region.cat.codes.to_numpy()[index_df['file_id'].to_numpy()],
+                                                         brain_region.cat.categories)
     
-    # remove rows containing drop
-    region_drop = pd.DataFrame((index_df['brain_region'] == 'drop').rename('drop'))
-    if len(drop_df) != 0:
-        drop_df = pd.concat([drop_df]*int(len(region_drop)/len(drop_df))
-                            , axis=0).reset_index(drop=True)
-    drop_df =  pd.concat((drop_df, region_drop), axis=1)
-    index_df = index_df[~drop_df.any(axis=1).values]
+    # remove rows containing drop (drop logic is per file_data row, mapped by file_id)
+    with profile_stage(profiler, 'drop', len(index_df)):
+        drop_mask = (index_df['brain_region'] == 'drop').to_numpy()
+        if drop_df.shape[1] != 0:
+            drop_mask |= drop_df.to_numpy(dtype = bool).any(axis = 1)[index_df['file_id'].to_numpy()]
+        index_df = index_df[~drop_mask]
     
     # check if groups were not detected
     if index_df.isnull().values.any():
         warning_str = 'Warning: Some conditons were not found!!'
     
-    # put categories at end
-    index_df = index_df[ [x for x in list(index_df.columns) if x not in group_columns] + group_columns]           
-    return index_df, group_columns, warning_str + com_warning
+    # keep keys, times and categories (other columns are added when index is materialized)
+    index_df = index_df[['file_id', 'animal_id', 'start_time', 'stop_time'] + group_columns]
+    for col in ['animal_id'] + group_columns:
+        index_df[col] = index_df[col].cat.remove_unused_categories()
+    return IndexTable(index_df, file_data, group_columns), group_columns, warning_str + com_warning
 
 
-def get_index_array(folder_path, user_data):
+def get_index_array(folder_path, user_data, n_workers:int = 1, chunksize:int = 1, cache = None, scan_cache = None,
+                    progress = None, cancel = None, profiler = None, reader:str = 'auto'):
     """
     Get file data, channel array and create index
     for experiments according to user selection
@@ -392,18 +962,60 @@ def get_index_array(folder_path, user_data):
     ----------
     file_data : pd.DataFrame, aggregated data from labchart files
     user_data : 2D list, user search and grouping parameters from datatable
+    n_workers : int, number of worker processes used to read files (1 = serial)
+    chunksize : int, number of files sent to a worker at a time
+    cache : MetadataCache, persistent file record cache (files are always read if None)
+    scan_cache : ScanCache, in-memory cache of scanned folders (folder is always scanned if None)
+    progress : callable, called with (files scanned, total files)
+    cancel : threading.Event, scan stops between files when set
+    profiler : StageProfiler, records time, items and memory of each stage if not None
+    reader : str, reader backend (auto, adi, sidecar, see backend.readers)
 
     Returns
     -------
-    index_df: pd.DataFrame, with index
+    index_table: IndexTable, with index (materialize with index_table.to_frame())
     group_columns: list, column names that denote groups
     warning_str: str, string used for warning
 
     """
     
-    # get dataframe and convert to lower case
+    # get user data and channel order
+    user_data, channel_structures, warning_str = prepare_user_data(user_data)
+    
+    # get all file data in dataframe (use get_scan_data directly to know if the scan cache was used)
+    file_data, comment_data, _ = get_scan_data(folder_path, channel_structures, n_workers,
+                                                         chunksize, cache, scan_cache, progress, cancel, profiler,
+                                                         reader)
+    
+    # get index table
+    index_table, group_columns, warning_add = index_file_data(file_data, comment_data, user_data, profiler)
+    warning_str += warning_add
+           
+    return index_table, group_columns, warning_str
+
+
+def prepare_user_data(user_data):
+    """
+    Convert user data to lower case dataframe and get channel order
+
+    Parameters
+    ----------
+    user_data : 2D list, user search and grouping parameters from datatable
+
+    Returns
+    -------
+    user_data : pd.DataFrame
+    channel_structures : dict, keys =  total channels, values = channel list
+    warning_str : str, string used for warning
+
+    """
+    
+    # get dataframe and convert to lower case (animal id regex keeps its case, e.g. \D)
     user_data = pd.DataFrame(user_data)
+    search_values = user_data['Search Value'].astype(str)
     user_data = user_data.apply(lambda x: x.astype(str).str.lower())
+    regex_idx = user_data['Search Function'] == 'regex'
+    user_data.loc[regex_idx, 'Search Value'] = search_values[regex_idx]
   
     # remove rows with missing inputs
     user_data = user_data.dropna(axis = 0)
@@ -416,25 +1028,45 @@ def get_index_array(folder_path, user_data):
     # get channel order
     channel_structures = get_channel_structures(user_data)
     
-    # get all file data in dataframe
-    file_data = get_file_data(folder_path, channel_structures)
+    return user_data, channel_structures, warning_str
+
+
+def index_file_data(file_data, comment_data, user_data, profiler = None):
+    """
+    Create index from scanned file data (used after scanning and by folder watcher updates)
+
+    Parameters
+    ----------
+    file_data : FileData, aggregated data from labchart files
+    comment_data : pd.DataFrame, comments linked to file data rows
+    user_data : pd.DataFrame, from prepare_user_data
+    profiler : StageProfiler, records index stages if not None
+
+    Returns
+    -------
+    index_table: IndexTable, with index
+    group_columns: list, column names that denote groups
+    warning_str: str, string used for warning
+
+    """
     
     # add animal id
-    file_data, user_data = add_animal_id(file_data, user_data)
+    with profile_stage(profiler, 'animal id', len(file_data)):
+        file_data, user_data, id_warning = add_animal_id(file_data, user_data)
     
-    # get index dataframe 
-    index_df, group_columns, warning_add = create_index_array(file_data, user_data)
-    warning_str += warning_add
+    # get index table
+    index_table, group_columns, warning_str = create_index_array(file_data, user_data, comment_data, profiler)
+    warning_str = id_warning + warning_str
     
-    # check if no conditions were found
-    if len(list(index_df.columns[index_df.columns.get_loc('stop_time')+1:])) < 2:
+    # check if no conditions were found (brain region is always a group column)
+    if len(group_columns) < 2:
         warning_str += 'Warning: Only Brain region column was found!!'
         
     # check if multiple blocks are found
-    if np.sum(index_df.block.astype(int)) > 0:
+    if index_table['block'].sum() > 0:
         warning_str += 'Warning: Some files contain more tha one block!!'
-           
-    return index_df, group_columns, warning_str
+    
+    return index_table, group_columns, warning_str
 
 if __name__ == '__main__':
     
@@ -454,10 +1086,10 @@ if __name__ == '__main__':
     channel_structures = get_channel_structures(user_data)
     
     # get all file data in dataframe
-    file_data = get_file_data(folder_path, channel_structures)
+    file_data, comment_data = get_file_data(folder_path, channel_structures)
 
     # get experiment index
-    index_df, group_columns, warning_str = create_index_array(file_data, user_data)
+    index_df, group_columns, warning_str = create_index_array(file_data, user_data, comment_data)
     
 
     
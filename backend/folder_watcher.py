@@ -0,0 +1,776 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import ctypes
+import ctypes.util
+import numpy as np
+import pandas as pd
+from backend.adi_parse import get_file_record
+from backend.metadata_cache import get_file_stat
+from backend.scan_cache import normalize_folder_path
+from backend.file_walker import get_file_entries, get_file_order_key, is_labchart_file
+from backend.filter_table import (ScanCancelled, read_file_records, read_cached_file_records, get_file_frames,
+                                  build_file_data, index_file_data)
+from backend.get_all_comments import GetComments
+### ------------------------------------------- ###
+
+# inotify event flags (see linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+# files are reported when closed after writing or moved, folders when created, moved or deleted
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+event_header = struct.Struct('iIII')
+
+
+class Inotify:
+    """
+    Minimal recursive inotify interface (linux only) using ctypes.
+    """
+
+    def __init__(self):
+        """
+        Create inotify instance
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}   # watch descriptor: folder path
+
+    def add_watch(self, folder_path:str):
+        """
+        Watch folder (subfolders are added separately)
+
+        Parameters
+        ----------
+        folder_path : str
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if folder_path in self.watches.values():
+            return
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder_path), watch_mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR): # folder was removed in the meantime
+                return
+            raise OSError(err, 'inotify_add_watch failed for ' + folder_path)
+        self.watches[wd] = folder_path
+
+    def add_tree(self, folder_path:str):
+        """
+        Watch folder and all subfolders
+
+        Parameters
+        ----------
+        folder_path : str
+
+        Returns
+        -------
+        None.
+
+        """
+
+        for root, dirs, files in os.walk(folder_path):
+            self.add_watch(root)
+
+    def read_events(self):
+        """
+        Read pending events
+
+        Returns
+        -------
+        events : list, of (mask, path)
+
+        """
+
+        events = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 64*1024)
+            except BlockingIOError:
+                return events
+
+            pos = 0
+            while pos < len(buffer):
+                wd, mask, cookie, length = event_header.unpack_from(buffer, pos)
+                name = buffer[pos + event_header.size:pos + event_header.size + length].rstrip(b'\0')
+                pos += event_header.size + length
+
+                # remove watches of deleted folders
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                folder_path = self.watches.get(wd)
+                if folder_path is None and not mask & IN_Q_OVERFLOW:
+                    continue
+                path = os.path.join(folder_path, os.fsdecode(name)) if name else folder_path
+                events.append((mask, path))
+
+    def close(self):
+        """
+        Close inotify instance
+
+        Returns
+        -------
+        None.
+
+        """
+
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Keep scanned file data of a folder up to date.
+    Only new or modified labchart files are read and deleted files are dropped.
+    Changes are detected with inotify on linux and by polling file stats otherwise.
+    """
+
+    def __init__(self, folder_path:str, channel_structures:dict, cache = None, n_workers:int = 1,
+                 chunksize:int = 1, poll_interval:float = 2.0, debounce:float = 1.0, use_inotify:bool = True,
+                 reader:str = 'auto'):
+        """
+        Create watcher (call scan or start to read files)
+
+        Parameters
+        ----------
+        folder_path : str
+        channel_structures : dict, keys =  total channels, values = channel list
+        cache : MetadataCache, persistent file record cache
+        n_workers : int, number of worker processes used to read many changed files
+        chunksize : int, number of files sent to a worker at a time
+        poll_interval : float, seconds between stat polls (without inotify)
+        debounce : float, seconds without new events before changes are read
+        use_inotify : bool, use inotify on linux if available
+        reader : str, reader backend (see backend.readers)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        # pass to object properties
+        self.folder_path = normalize_folder_path(folder_path)
+        self.channel_structures = channel_structures
+        self.cache = cache
+        self.n_workers = n_workers
+        self.chunksize = chunksize
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.use_inotify = use_inotify and sys.platform.startswith('linux')
+        self.reader = reader
+
+        self.files = {}         # file path: (stat, file frames)
+        self.changed = set()    # paths of files changed or removed since last pop_changes
+        self.failed = {}        # file path: error of files that could not be read (retried on next update)
+        self.version = 0        # increased when file data change
+        self.error = None       # last error of background thread
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def read_files(self, file_paths:list, file_stats:list, progress = None, cancel = None):
+        """
+        Read file records, files that can not be read (e.g. still being written) are skipped
+
+        Parameters
+        ----------
+        file_paths : list
+        file_stats : list, of (size, mtime_ns)
+        progress : callable, called with (files read, total files)
+        cancel : threading.Event
+
+        Returns
+        -------
+        records : dict, file path: (stat, file frames)
+
+        """
+
+        try:
+            if self.cache is None:
+                records = read_file_records(file_paths, self.n_workers, self.chunksize, progress, cancel,
+                                            reader = self.reader)
+            else:
+                records = read_cached_file_records(file_paths, self.cache, self.n_workers, self.chunksize,
+                                                   progress, cancel, file_stats = file_stats, reader = self.reader)
+        except ScanCancelled:
+            raise
+        except Exception:
+            # read files one by one to find unreadable files
+            records = []
+            for file_path in file_paths:
+                try:
+                    records.append(get_file_record(file_path, self.reader))
+                except Exception as err:
+                    self.failed[file_path] = err
+                    records.append(None)
+
+        out = {}
+        for file_path, file_stat, record in zip(file_paths, file_stats, records):
+            if record is None:
+                continue
+            self.failed.pop(file_path, None)
+            out[file_path] = (file_stat, get_file_frames(file_path, record, self.channel_structures))
+
+        return out
+
+    def update_paths(self, file_paths:list, file_stats:dict = {}):
+        """
+        Update changed, new or deleted files
+
+        Parameters
+        ----------
+        file_paths : list, of file paths (existing files are read if changed, missing files are removed)
+        file_stats : dict, file path: (size, mtime_ns) of listed files (other files are stat)
+
+        Returns
+        -------
+        changed : bool, True if file data changed
+
+        """
+
+        changed_paths, changed_stats, removed = [], [], []
+        for file_path in set(file_paths):
+            try:
+                file_stat = file_stats[file_path] if file_path in file_stats else get_file_stat(file_path)
+            except FileNotFoundError:
+                removed.append(file_path)
+                continue
+
+            previous = self.files.get(file_path)
+            if previous is None or previous[0] != file_stat:
+                changed_paths.append(file_path)
+                changed_stats.append(file_stat)
+
+        # read changed files outside lock
+        records = self.read_files(changed_paths, changed_stats) if changed_paths else {}
+
+        with self.lock:
+            n_removed = 0
+            for file_path in removed:
+                if self.files.pop(file_path, None) is not None:
+                    self.changed.add(file_path)
+                    n_removed += 1
+            self.files.update(records)
+            self.changed.update(records)
+            changed = n_removed > 0 or len(records) > 0
+            if changed:
+                self.version += 1
+
+        return changed
+
+    def scan(self, progress = None, cancel = None):
+        """
+        Walk folder, read new or modified files and drop deleted files
+
+        Parameters
+        ----------
+        progress : callable, called with (files read, total files)
+        cancel : threading.Event
+
+        Returns
+        -------
+        changed : bool, True if file data changed
+
+        """
+
+        # list files with stats of directory entries
+        file_entries = get_file_entries(self.folder_path)
+        file_paths = [os.path.join(root, file) for root, file, stat in file_entries]
+        file_stats = [stat for root, file, stat in file_entries]
+        removed = set(self.files) - set(file_paths)
+        if progress is None and cancel is None:
+            return self.update_paths(file_paths + list(removed), dict(zip(file_paths, file_stats)))
+
+        # initial scan with progress and cancellation
+        records = self.read_files(file_paths, file_stats, progress, cancel)
+        with self.lock:
+            self.changed.update(self.files)
+            self.changed.update(records)
+            self.files = records
+            self.version += 1
+
+        return True
+
+    def get_files(self, clear_changes:bool = False):
+        """
+        Get current files in the same order as get_file_data
+
+        Parameters
+        ----------
+        clear_changes : bool, also clear changed paths (current files are the new reference)
+
+        Returns
+        -------
+        file_paths : list
+        file_frames : list, of (temp_file_data, temp_comments) per file
+        version : int
+
+        """
+
+        with self.lock:
+            file_paths = sorted(self.files, key = lambda x: get_file_order_key(self.folder_path, x))
+            file_frames = [self.files[file_path][1] for file_path in file_paths]
+            if clear_changes:
+                self.changed = set()
+            return file_paths, file_frames, self.version
+
+    def pop_changes(self):
+        """
+        Get files changed or removed since the last call (or get_files with clear_changes)
+
+        Returns
+        -------
+        changes : dict, file path: file frames (None if file was removed)
+        version : int
+
+        """
+
+        with self.lock:
+            changes = {file_path: self.files[file_path][1] if file_path in self.files else None
+                       for file_path in self.changed}
+            self.changed = set()
+            return changes, self.version
+
+    def get_data(self):
+        """
+        Build file data from current files (in the same order as get_file_data)
+
+        Returns
+        -------
+        file_data : FileData
+        comment_data : pd.DataFrame
+        version : int
+
+        """
+
+        file_paths, file_frames, version = self.get_files()
+        file_data, comment_data = build_file_data(self.folder_path, file_frames)
+        return file_data, comment_data, version
+
+    def start(self):
+        """
+        Start watching folder in background thread
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop background thread
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """
+        Watch folder until stopped (falls back to polling if inotify is not available)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = Inotify()
+                inotify.add_tree(self.folder_path)
+            except (OSError, AttributeError) as err:
+                # e.g. watch limit reached or no inotify in libc
+                self.error = err
+                if inotify is not None:
+                    inotify.close()
+                inotify = None
+
+        try:
+            if inotify is None:
+                self.run_polling()
+            else:
+                self.run_inotify(inotify)
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def run_polling(self):
+        """
+        Rescan folder every poll_interval seconds
+
+        Returns
+        -------
+        None.
+
+        """
+
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.scan()
+            except Exception as err:
+                self.error = err
+
+    def run_inotify(self, inotify:Inotify):
+        """
+        Update files reported by inotify after debounce seconds without new events
+
+        Parameters
+        ----------
+        inotify : Inotify
+
+        Returns
+        -------
+        None.
+
+        """
+
+        # catch changes made between initial scan and watch creation
+        rescan = True
+        pending = set()
+        last_event = time.time()
+
+        while not self.stop_event.is_set():
+            ready, _, _ = select.select([inotify.fd], [], [], min(self.debounce, 0.5))
+            if ready:
+                for mask, path in inotify.read_events():
+                    if mask & (IN_Q_OVERFLOW | IN_ISDIR | IN_DELETE_SELF | IN_MOVE_SELF):
+                        rescan = True
+                    elif is_labchart_file(os.path.basename(path)) and not mask & IN_CREATE:
+                        pending.add(path)
+                last_event = time.time()
+                continue
+
+            if (not rescan and not pending) or time.time() - last_event < self.debounce:
+                continue
+
+            try:
+                if rescan:
+                    inotify.add_tree(self.folder_path)
+                    self.scan()
+                else:
+                    self.update_paths(list(pending))
+                self.error = None
+            except Exception as err:
+                self.error = err
+            rescan = False
+            pending = set()
+
+
+def get_comment_matches(comment_data, user_data):
+    """
+    Get comment group matches in the order of the index rows they create (see GetComments.get_comments_with_time)
+
+    Parameters
+    ----------
+    comment_data : pd.DataFrame, from build_file_data
+    user_data : pd.DataFrame, from prepare_user_data
+
+    Returns
+    -------
+    category : str, comment category (None if user data have no comment groups)
+    group_names : np.array, assigned group name of each comment group
+    matches : pd.DataFrame, file_id, group and position (of comment in channel) per match
+
+    """
+
+    obj = GetComments(comment_data, user_data[user_data['Assigned Group Name'] != 'drop'],
+                      'comment_text', 'comment_time')
+    if obj.category is None:
+        return None, None, None
+
+    com_idx, group_idx = np.nonzero(obj.get_comment_logic())
+    matches = pd.DataFrame({'file_id' : np.array(obj.comment_data['file_id'], dtype = np.int64)[com_idx],
+                            'group' : group_idx.astype(np.int64),
+                            'position' : obj.com_position[com_idx]})
+    matches = matches.sort_values(['group', 'position', 'file_id'], kind = 'stable').reset_index(drop = True)
+
+    return obj.category, obj.user_data['Assigned Group Name'].to_numpy(dtype = object), matches
+
+
+class WatchedIndex:
+    """
+    Index of a watched folder kept up to date file by file.
+    The full index is created once (build) and split into one block of index rows per file.
+    Afterwards only files reported by the watcher as changed are indexed again and their blocks are
+    replaced (or dropped when files are deleted). Comment group numbers (e.g. baseline1) are ranks of
+    comment positions over all files, so blocks keep the comment group and position of each row and
+    labels are numbered again when blocks are joined, which gives the same index as a full build.
+    """
+
+    def __init__(self, watcher:FolderWatcher, user_data):
+        """
+        Parameters
+        ----------
+        watcher : FolderWatcher, scanned watcher
+        user_data : pd.DataFrame, from prepare_user_data
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.watcher = watcher
+        self.user_data = user_data
+        self.group_names = None
+        self.columns = None         # columns of materialized index
+        self.category = None        # comment category column (None without comment groups)
+        self.comment_groups = None  # assigned group name of each comment group
+        self.blocks = {}            # file path: block of index rows (see get_block)
+        self.empty_rows = None      # typed index without rows (block of files without rows)
+        self.empty_matches = None   # comment matches without rows
+        self.warning_str = ''       # warning of full index
+        self.index_df = None        # index joined from blocks (None if blocks changed)
+        self.lock = threading.Lock()
+
+    def get_block(self, index_df, file_ids, n_channels:int, matches, warning_str:str = ''):
+        """
+        Create block of one file
+
+        Parameters
+        ----------
+        index_df : pd.DataFrame, index rows of file (materialized)
+        file_ids : np.array, channel of each row within file
+        n_channels : int, number of channels of file
+        matches : pd.DataFrame, comment matches of file (file_id = channel within file) or None
+        warning_str : str
+
+        Returns
+        -------
+        block : dict, with rows, group and position per row, positions of each comment group (before rows
+            were dropped), n_channels and warning
+
+        """
+
+        rows = index_df.reindex(columns = self.columns)
+        rows['file_id'] = np.asarray(file_ids, dtype = np.int64)
+        block = {'rows' : rows.reset_index(drop = True), 'group' : None, 'position' : None, 'positions' : {},
+                 'n_channels' : n_channels, 'warning' : warning_str}
+        if self.category is None:
+            return block
+
+        # matches of kept channels are the rows of the file in the same order
+        kept = matches[np.isin(matches['file_id'].to_numpy(), block['rows']['file_id'].to_numpy())]
+        if not np.array_equal(kept['file_id'].to_numpy(), block['rows']['file_id'].to_numpy()):
+            raise Exception('Comment matches do not match index rows.')
+        block['group'] = kept['group'].to_numpy()
+        block['position'] = kept['position'].to_numpy()
+        block['positions'] = {group: np.unique(positions) for group, positions
+                              in matches.groupby('group')['position']}
+
+        return block
+
+    def build(self, profiler = None):
+        """
+        Create index of all current files and split it into blocks per file
+
+        Parameters
+        ----------
+        profiler : StageProfiler, records index stages if not None
+
+        Returns
+        -------
+        index_table: IndexTable
+        group_names: list
+        warning_str: str
+        version : int, watcher version of the index
+
+        """
+
+        with self.lock:
+            file_paths, file_frames, version = self.watcher.get_files(clear_changes = True)
+            file_data, comment_data = build_file_data(self.watcher.folder_path, file_frames)
+            index_table, group_names, warning_str = index_file_data(file_data, comment_data, self.user_data, profiler)
+
+            self.group_names = list(group_names)
+            self.category, self.comment_groups, matches = get_comment_matches(comment_data, self.user_data)
+            index_df = index_table.to_frame()
+            self.columns = list(index_df.columns)
+
+            self.empty_rows = index_df.iloc[:0]
+            self.empty_matches = None if matches is None else matches.iloc[:0]
+
+            # file of each row and of each comment match (files without channels have no rows)
+            data_paths = [file_path for file_path, frames in zip(file_paths, file_frames) if len(frames[0]) > 0]
+            file_key = file_data.channels['file_key'].to_numpy()
+            n_channels = np.bincount(file_key, minlength = len(data_paths))
+            offsets = np.cumsum(n_channels) - n_channels
+            row_index = pd.Series(np.arange(len(index_df))).groupby(file_key[index_df['file_id'].to_numpy()]).indices
+            if matches is not None:
+                match_index = matches.groupby(file_key[matches['file_id'].to_numpy()]).indices
+
+            self.blocks = {file_path: self.get_block(self.empty_rows, [], 0, self.empty_matches)
+                           for file_path in file_paths}
+            for key, file_path in enumerate(data_paths):
+                rows = index_df.iloc[row_index.get(key, [])]
+                file_matches = None
+                if matches is not None:
+                    file_matches = matches.iloc[match_index.get(key, [])].copy()
+                    file_matches['file_id'] -= offsets[key]
+                self.blocks[file_path] = self.get_block(rows, rows['file_id'].to_numpy() - offsets[key],
+                                                        int(n_channels[key]), file_matches)
+            self.warning_str = warning_str
+            self.index_df = None
+
+        return index_table, group_names, warning_str, version
+
+    def index_file(self, file_path:str, frames):
+        """
+        Index one file
+
+        Parameters
+        ----------
+        file_path : str
+        frames : tuple, (temp_file_data, temp_comments) of file
+
+        Returns
+        -------
+        block : dict, None if file has group columns that are not in the index (full build is needed)
+
+        """
+
+        if len(frames[0]) == 0:
+            return self.get_block(self.empty_rows, [], 0, self.empty_matches)
+
+        try:
+            file_data, comment_data = build_file_data(self.watcher.folder_path, [frames])
+            index_table, group_names, warning_str = index_file_data(file_data, comment_data, self.user_data)
+        except Exception as err:
+            return self.get_block(self.empty_rows, [], 0, self.empty_matches,
+                                  'Warning: ' + file_path + ' could not be indexed (' + str(err) + ').')
+
+        if not set(group_names).issubset(self.group_names):
+            return None
+
+        # group columns that were only found in other files are missing
+        if len(group_names) < len(self.group_names):
+            warning_str = warning_str.replace('Warning: Only Brain region column was found!!', '')
+            if len(index_table) > 0 and 'Warning: Some conditons were not found!!' not in warning_str:
+                warning_str += 'Warning: Some conditons were not found!!'
+
+        index_df = index_table.to_frame()
+        matches = get_comment_matches(comment_data, self.user_data)[2]
+        return self.get_block(index_df, index_df['file_id'].to_numpy(), len(file_data), matches, warning_str)
+
+    def get_frame(self):
+        """
+        Join blocks in file order (file ids are offset by the channels of previous files)
+        and number comment groups by position over all files
+
+        Returns
+        -------
+        index_df : pd.DataFrame, same as the materialized index of a full build
+
+        """
+
+        file_paths = sorted(self.blocks, key = lambda x: get_file_order_key(self.watcher.folder_path, x))
+        blocks = [self.blocks[file_path] for file_path in file_paths]
+        offsets = np.cumsum([0] + [block['n_channels'] for block in blocks])[:-1]
+
+        index_df = pd.concat([block['rows'] for block in blocks], ignore_index = True)
+        lengths = [len(block['rows']) for block in blocks]
+        index_df['file_id'] += np.repeat(offsets, lengths).astype(np.int64)
+        if self.category is None:
+            return index_df
+
+        # rank comment positions of each group over all files (positions of dropped channels count)
+        group = np.concatenate([block['group'] for block in blocks]).astype(np.int64)
+        position = np.concatenate([block['position'] for block in blocks]).astype(np.int64)
+        suffix = np.zeros(len(index_df), dtype = np.int64)
+        for i in np.unique(group):
+            ranks = np.unique(np.concatenate([block['positions'][i] for block in blocks if i in block['positions']]))
+            suffix[group == i] = np.searchsorted(ranks, position[group == i]) + 1
+        labels = [self.comment_groups[i] + str(n) for i, n in zip(group, suffix)]
+        index_df[self.category] = pd.Series(labels, dtype = object)
+
+        # rows are ordered by comment group, position and file id
+        order = np.lexsort((index_df['file_id'].to_numpy(), position, group))
+        return index_df.iloc[order].reset_index(drop = True)
+
+    def update(self):
+        """
+        Index files changed since the last update and join index from blocks
+        (all files are indexed again if a changed file adds group columns)
+
+        Returns
+        -------
+        index_df : pd.DataFrame
+        group_names : list
+        warning_str : str, warning of full index and of files indexed since
+        version : int, watcher version of the index
+
+        """
+
+        rebuild = False
+        with self.lock:
+            changes, version = self.watcher.pop_changes()
+            for file_path, frames in changes.items():
+                if frames is None:
+                    self.blocks.pop(file_path, None)
+                    continue
+                block = self.index_file(file_path, frames)
+                if block is None:
+                    rebuild = True
+                    break
+                self.blocks[file_path] = block
+            if changes:
+                self.index_df = None
+
+        if rebuild:
+            _, _, _, version = self.build()
+
+        with self.lock:
+            if self.index_df is None:
+                self.index_df = self.get_frame()
+            # unique warnings (each warning ends with . or !)
+            warnings = re.split(r'(?<=[.!])\s*(?=[A-Z])', self.warning_str + ''.join(block['warning'] for block in
+                                                                                     self.blocks.values()))
+            warnings = [x.strip() for x in warnings if x.strip()]
+            return self.index_df, list(self.group_names), ''.join(dict.fromkeys(warnings)), version
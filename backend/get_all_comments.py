@@ -1,7 +1,7 @@
 ### --------- IMPORTS --------- ###
 import numpy as np
 import pandas as pd
-from backend import search_function
+from backend.rule_engine import RuleProgram
 ### --------------------------- ###
 
 
@@ -48,16 +48,17 @@ class GetComments:
         return com_label, com_time
     
     
-    def __init__(self, file_data, user_data, comment_text:str, comment_time:str):
+    def __init__(self, comment_data, user_data, comment_text:str, comment_time:str):
         """
         
 
         Parameters
         ----------
-        file_data : pd.DataFrame, aggregated data from labchart files
+        comment_data : pd.DataFrame, comments in long format, one row per comment and channel
+                       (file_id = file_data row, comment text and comment time columns)
         user_data : pd.DataFrame, user search and grouping parameters
-        comment_text : str, to search file_data columns for comment text
-        comment_time : str, to search file_data columns for comment times
+        comment_text : str, comment_data column with comment text (and user data source)
+        comment_time : str, comment_data column with comment times
 
         Returns
         -------
@@ -68,14 +69,14 @@ class GetComments:
         # pass to object
         self.comment_text = comment_text
         self.comment_time = comment_time
-
-        # Get matching comment text and time columns from file_data dataframe
-        self.com_text_cols = list(file_data.columns[file_data.columns.str.contains(self.comment_text)])
-        self.com_time_cols = list(file_data.columns[file_data.columns.str.contains(self.comment_time)])
-        self.com_match = dict(zip(self.com_text_cols, self.com_time_cols))
         
-        # pass file data to object
-        self.file_data = file_data    
+        # pass comment data to object
+        if comment_data is None:
+            comment_data = pd.DataFrame(columns = ['file_id', self.comment_text, self.comment_time])
+        self.comment_data = comment_data
+        
+        # get comment position within each channel (comments are ordered by file_id)
+        self.com_position = np.array(self.comment_data.groupby('file_id').cumcount(), dtype = np.int64)
         
         # get user data containing comment text
         self.user_data = user_data[user_data['Source'] == self.comment_text].reset_index(drop=True)
@@ -94,50 +95,63 @@ class GetComments:
             self.category = categories[0]
        
     
-    def get_index_per_comment(self, index:int):
+    def get_comment_logic(self):
         """
-        Get boolean index for comment. True if a comment is present. 
-        Along with it's respective time that occured.
-
-        Parameters
-        ----------
-        index : int, index of self.user_data
+        Get boolean logic for each comment and user comment group.
 
         Returns
         -------
-        comtext : np.array, true if comment present
-        comtime : np.array, time of comment
+        com_logic : np.array (comments x user groups), true if comment matches group
 
         """
         
-        # create empty arrays
-        comtext = np.zeros( (len(self.file_data), len(self.com_match)) )
-        comtime = np.zeros( (len(self.file_data), len(self.com_match)) )
+        # run all rules on unique comment texts
+        program = RuleProgram(self.user_data['Search Function'], self.user_data['Search Value'])
+        com_logic = program.run(self.comment_data[self.comment_text])
+            
+        return com_logic
+    
+    
+    def get_user_times(self):
+        """
+        Get user time selection for each user comment group.
+
+        Raises
+        ------
+        Exception
+
+        Returns
+        -------
+        user_times : np.array (user groups x 2), start and stop time relative to comment (seconds)
+
+        """
         
-        for i,text in enumerate(self.com_match):      # iterate over file comment columns
-           
-            # find index for specified source and match string
-            idx = getattr(search_function, self.user_data.at[index, 'Search Function'],
-                          )(self.file_data[text], self.user_data.at[index, 'Search Value'])
+        user_times = np.zeros((len(self.user_data), 2), dtype = np.int64)
+        for i in range(len(self.user_data)): # iterate over user comment groups in category
             
-            # add to numpy arrays
-            comtext[:,i] =  idx             
-            comtime[:,i] =  self.file_data[self.com_match[text]]
+            # get user selection
+            user_time = self.user_data.at[i, 'Time Selection (sec)'].split(':')
+            user_time = [int(x) for x in user_time]
+            if len(user_time) != 2:
+                raise Exception('Time could not be parsed for', self.user_data.at[i, 'Time Selection (sec)'])
+            elif (user_time[1] - user_time[0]) < 1:
+                raise Exception('Stop time must exceed start time.')
+            user_times[i] = user_time
             
-        return comtext, comtime
+        return user_times
      
 
-    def get_comments_with_time(self, index_df, com_names, user_times, com_logic, com_time):
+    def get_comments_with_time(self, index_df, com_logic, user_times):
         """
-        Convert comment logic to group names with their time to index_df
+        Convert comment logic to group names with their time to index_df.
+        Each index row is repeated once for every matching comment.
+        Group names are numbered by comment position within channel (e.g. baseline1, baseline2).
         
         Parameters
         ----------
-        index_df : pd.DataFrame, containing experiment index
-        com_names: list, with comment names
-        user_times: list, with 2 element numpy arrays containing time selection  
-        com_logic : np.array, containing detected comment logic
-        com_time : np.array, containing time for each comment
+        index_df : pd.DataFrame, containing experiment index (index = file_id)
+        com_logic : np.array, containing detected comment logic (comments x user groups)
+        user_times: np.array, containing time selection (user groups x 2)
 
         Returns
         -------
@@ -145,41 +159,34 @@ class GetComments:
 
         """
         
-        # create empty array for one category
-        category_df = pd.DataFrame(columns = list(index_df.columns) + [self.category])
-        
-        comment_suffix = 1
-        for i,comment in enumerate(com_names): # iterate over comments in one category
-            
-            # create temporary dataframe column for one category
-            temp_df = index_df.copy()
-            
-            # get index where comment is present
-            com_idx = com_logic[:,i]
-            
-            # reset index for new comment type
-            if (i % len(self.com_match)) == 0:
-                comment_suffix = 1
-                
-            # get categories were comment is present  
-            if com_idx.any() == 1:
-                temp_df.at[com_idx, self.category] = comment + str(comment_suffix)
-                comment_suffix += 1
-               
-            # get times from comment
-            fs = np.array(index_df['sampling_rate'], dtype = float)                   # convert sampling rate form string to float
-            temp_df.at[:,'start_time'] = com_time[:, i] + (user_times[i][0] * fs)     # get start time
-            temp_df.at[:,'stop_time'] = com_time[:, i] + (user_times[i][1] * fs)      # get stop time
-            
-            # concatenate to category_df
-            category_df = pd.concat([category_df, temp_df], axis=0)
-
-        # drop rows not containing the comments
-        category_df = category_df[category_df[self.category].notna()]
-        
-        # convert times to int
-        category_df['start_time'] = category_df['start_time'].astype(np.int64)
-        category_df['stop_time'] = category_df['stop_time'].astype(np.int64)
+        # get matching comment and user group pairs
+        com_idx, group_idx = np.nonzero(com_logic)
+        matches = pd.DataFrame({'file_id': np.array(self.comment_data['file_id'], dtype = np.int64)[com_idx],
+                                'position': self.com_position[com_idx],
+                                'group': group_idx,
+                                'time': np.array(self.comment_data[self.comment_time], dtype = np.int64)[com_idx]})
+        
+        # number comments by position among positions detected for each group
+        matches['suffix'] = matches.groupby('group')['position'].rank(method = 'dense').astype(np.int64)
+        matches = matches.sort_values(['group', 'position', 'file_id'], kind = 'stable')
+        
+        # repeat index rows for each matching comment
+        category_df = index_df.loc[matches['file_id'].to_numpy()].copy()
+        
+        # add group names as categories (labels are created once per group and suffix)
+        group_names = self.user_data['Assigned Group Name'].to_numpy(dtype = object)
+        n_suffix = int(matches['suffix'].max()) + 1 if len(matches) > 0 else 1
+        codes, keys = pd.factorize(matches['group'].to_numpy() * n_suffix + matches['suffix'].to_numpy())
+        label_codes, labels = pd.factorize(np.array([group_names[key // n_suffix] + str(key % n_suffix) for key in keys],
+                                                    dtype = object))
+        category_df[self.category] = pd.Categorical.from_codes(label_codes[codes], labels)
+        
+        # get times from comment
+        fs = category_df['sampling_rate'].to_numpy()
+        times = matches['time'].to_numpy()
+        group_times = user_times[matches['group'].to_numpy()]
+        category_df['start_time'] = (times + group_times[:,0] * fs).astype(np.int64)  # get start time
+        category_df['stop_time'] = (times + group_times[:,1] * fs).astype(np.int64)   # get stop time
         
         return  category_df
     
@@ -210,46 +217,17 @@ class GetComments:
         if self.category is None:
             return index_df, com_warning
            
-        # create empty arrays
-        com_logic = np.zeros( (len(self.file_data), len(self.com_text_cols)*len(self.user_data)))
-        com_time = np.zeros( (len(self.file_data), len(self.com_text_cols)*len(self.user_data)))
-        
-        # comment names
-        com_names = [] 
-        user_times = []
-        
-        cntr = 0 # init counter
-        for i in range(len(self.user_data)): # iterate over user comment groups in category
-            
-            # get comment names, add number for repeated comments
-            com_list = len(self.com_text_cols) * [self.user_data.at[i, 'Assigned Group Name']]
-            com_names.extend(com_list)
-            
-            # get user selection
-            user_time = self.user_data.at[i, 'Time Selection (sec)'].split(':')
-            user_time = [int(x) for x in user_time]
-            if len(user_time) != 2:
-                raise Exception('Time could not be parsed for', self.user_data.at[i, 'Time Selection (sec)'])
-            elif (user_time[1] - user_time[0]) < 1:
-                raise Exception('Stop time must exceed start time.')
-                
-            # append to user times
-            user_times.extend([np.array(user_time)] *len(self.com_text_cols))
-            
-            # get logic from all File comments
-            temp_com_logic, temp_com_time = self.get_index_per_comment(i)
-            
-            # append to arrays
-            com_logic[:,cntr:cntr + temp_com_logic.shape[1]] = temp_com_logic
-            com_time[:,cntr:cntr + temp_com_logic.shape[1]] = temp_com_time   
-            cntr += temp_com_logic.shape[1] 
+        # get user selected times and logic from all comments
+        user_times = self.get_user_times()
+        com_logic = self.get_comment_logic()
     
         # check if at least one comment is present in each file
-        if com_logic.any(axis=1).all() == False:
+        detected = np.unique(np.array(self.comment_data['file_id'], dtype = np.int64)[com_logic.any(axis=1)])
+        if np.isin(index_df.index, detected).all() == False:
             com_warning = 'Comments were not detected in all files. Some data might be ommited from indexing.'
         
         # add present comments along with their time
-        index_df = self.get_comments_with_time(index_df, com_names, user_times, com_logic.astype(bool), com_time)
+        index_df = self.get_comments_with_time(index_df, com_logic, user_times)
         
         return index_df, com_warning
         
@@ -0,0 +1,118 @@
+### ----------------- IMPORTS ----------------- ###
+import numpy as np
+import pandas as pd
+### ------------------------------------------- ###
+
+# index columns before group columns (in order of exported index)
+index_columns = ['file_id', 'animal_id', 'folder_path', 'file_name', 'file_length', 'channel_id', 'block',
+                 'sampling_rate', 'start_time', 'stop_time']
+
+
+class IndexTable:
+    """
+    Experiment index stored as rows of file_id (file data channel row), start_time, stop_time,
+    animal_id and categorical group columns. File and channel columns are looked up from file data
+    through file_id, and the full index dataframe is only materialized with to_frame (e.g. for export).
+    """
+
+    def __init__(self, rows, file_data, group_columns:list):
+        """
+        Parameters
+        ----------
+        rows : pd.DataFrame, with file_id, animal_id, start_time, stop_time and group columns
+        file_data : FileData, scanned file and channel tables
+        group_columns : list, column names that denote groups
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.rows = rows.reset_index(drop = True)
+        self.file_data = file_data
+        self.group_columns = list(group_columns)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def columns(self):
+        return index_columns + [col for col in self.group_columns if col not in index_columns]
+
+    def __getitem__(self, column):
+        """
+        Get index column (or dataframe of index row columns if column is a list)
+
+        Parameters
+        ----------
+        column : str or list
+
+        Returns
+        -------
+        values : pd.Series or pd.DataFrame
+
+        """
+
+        if isinstance(column, list):
+            return self.rows[column]
+
+        return self.get_column(column)
+
+    def get_column(self, column:str):
+        """
+        Get column with one value per index row
+
+        Parameters
+        ----------
+        column : str
+
+        Returns
+        -------
+        values : pd.Series
+
+        """
+
+        if column in self.rows.columns:
+            return self.rows[column]
+
+        # look up file data row of each index row
+        values = self.file_data[column]
+        file_id = self.rows['file_id'].to_numpy()
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = pd.Categorical.from_codes(values.cat.codes.to_numpy()[file_id], values.cat.categories)
+        else:
+            values = values.to_numpy()[file_id]
+
+        return pd.Series(values, index = self.rows.index, name = column)
+
+    def to_frame(self):
+        """
+        Materialize index dataframe (text as objects, numbers as int64, group columns at end)
+
+        Returns
+        -------
+        index_df : pd.DataFrame
+
+        """
+
+        index_df = pd.DataFrame({col: self.get_column(col) for col in self.columns})
+        for col in index_df.columns:
+            if isinstance(index_df[col].dtype, pd.CategoricalDtype):
+                index_df[col] = index_df[col].astype(object)
+            elif col not in self.group_columns:
+                index_df[col] = index_df[col].astype(np.int64)
+
+        return index_df
+
+    def memory_usage(self, index:bool = True, deep:bool = True):
+        """
+        Get memory of index rows (file data are shared with the scan)
+
+        Returns
+        -------
+        usage : pd.Series, bytes per column
+
+        """
+
+        return self.rows.memory_usage(index = index, deep = deep)
@@ -0,0 +1,186 @@
+### ----------------- IMPORTS ----------------- ###
+import time
+import uuid
+import threading
+### ------------------------------------------- ###
+
+class Job:
+    """
+    Background job state (status, progress, result).
+    """
+
+    def __init__(self):
+
+        self.job_id = uuid.uuid4().hex
+        self.status = 'running'         # running, done, cancelled or error
+        self.n_done = 0
+        self.n_total = 0
+        self.start_time = time.time()
+        self.end_time = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    def update_progress(self, n_done:int, n_total:int):
+        """
+        Update progress (passed as progress callback to scanning functions)
+
+        Parameters
+        ----------
+        n_done : int, files scanned
+        n_total : int, total files
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.n_done = n_done
+        self.n_total = n_total
+
+    def get_progress(self):
+        """
+        Get progress with throughput and estimated time remaining
+
+        Returns
+        -------
+        progress : dict, with status, n_done, n_total, elapsed (s), rate (files/s) and eta (s)
+
+        """
+
+        end_time = self.end_time if self.end_time is not None else time.time()
+        elapsed = end_time - self.start_time
+        rate = self.n_done / elapsed if elapsed > 0 else 0
+        eta = (self.n_total - self.n_done) / rate if rate > 0 else None
+
+        return {'status' : self.status, 'n_done' : self.n_done, 'n_total' : self.n_total,
+                'elapsed' : elapsed, 'rate' : rate, 'eta' : eta}
+
+
+class JobManager:
+    """
+    Run functions in background threads and keep track of their progress.
+    """
+
+    def __init__(self, max_jobs:int = 20):
+        """
+        Create empty job manager
+
+        Parameters
+        ----------
+        max_jobs : int, maximum number of finished jobs kept before the oldest are removed
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run function in background thread.
+        Function is called with progress and cancel keyword arguments.
+
+        Parameters
+        ----------
+        func : callable
+        *args, **kwargs : passed to func
+
+        Returns
+        -------
+        job_id : str
+
+        """
+
+        job = Job()
+
+        def run():
+            try:
+                job.result = func(*args, progress = job.update_progress, cancel = job.cancel_event, **kwargs)
+                status = 'done'
+            except Exception as err:
+                job.error = err
+                status = 'error'
+            
+            # set end time before status so that finished jobs always have an end time
+            job.end_time = time.time()
+            job.status = 'cancelled' if job.cancel_event.is_set() else status
+
+        with self.lock:
+            self.remove_finished()
+            self.jobs[job.job_id] = job
+
+        threading.Thread(target = run, daemon = True).start()
+        return job.job_id
+
+    def remove_finished(self):
+        """
+        Remove oldest finished jobs above max_jobs (called with lock)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        finished = [job for job in self.jobs.values() if job.status != 'running']
+        finished.sort(key = lambda job: job.end_time)
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self.jobs[job.job_id]
+
+    def get(self, job_id:str):
+        """
+        Get job
+
+        Parameters
+        ----------
+        job_id : str
+
+        Returns
+        -------
+        job : Job or None
+
+        """
+
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id:str):
+        """
+        Request job cancellation (job stops between files)
+
+        Parameters
+        ----------
+        job_id : str
+
+        Returns
+        -------
+        None.
+
+        """
+
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel_event.set()
+
+    def pop(self, job_id:str):
+        """
+        Remove job and return it
+
+        Parameters
+        ----------
+        job_id : str
+
+        Returns
+        -------
+        job : Job or None
+
+        """
+
+        with self.lock:
+            return self.jobs.pop(job_id, None)
@@ -0,0 +1,258 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import numpy as np
+import pandas as pd
+### ------------------------------------------- ###
+
+# bout time units (seconds are converted to samples with the sampling rate of each index row)
+time_units = ['seconds', 'samples']
+
+
+def check_columns(df, columns:list, name:str):
+    """
+    Check that columns exist in dataframe
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    columns : list
+    name : str, dataframe name used in error
+
+    Returns
+    -------
+    None.
+
+    """
+
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise Exception('Columns -' + ', '.join(missing) + '- are missing from ' + name + '.')
+
+
+def get_key_codes(index_df, bouts, on:list):
+    """
+    Get shared integer key of index rows and bouts (text keys are compared in lower case,
+    as index text is lower case)
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    bouts : pd.DataFrame
+    on : list, key columns (e.g. animal_id)
+
+    Returns
+    -------
+    index_keys : np.array, key code per index row
+    bout_keys : np.array, key code per bout (-1 if key is not in index)
+
+    """
+
+    def key_values(df):
+        keys = df[on].astype(str).apply(lambda x: x.str.lower())
+        return keys.iloc[:, 0] if len(on) == 1 else pd.Series(list(zip(*[keys[col] for col in on])), index = df.index)
+
+    index_keys, uniques = pd.factorize(key_values(index_df))
+    bout_keys = pd.Index(uniques).get_indexer(key_values(bouts))
+
+    return index_keys, bout_keys
+
+
+def join_key_intervals(row_start, row_stop, bout_start, bout_stop):
+    """
+    Find overlapping (index row, bout) pairs of one key.
+    Bouts are sorted by start and searched with the running maximum of bout stops,
+    so the work is proportional to the number of rows, bouts and candidate pairs.
+
+    Parameters
+    ----------
+    row_start : np.array, index row starts (bout time unit)
+    row_stop : np.array, index row stops (bout time unit)
+    bout_start : np.array, bout starts sorted ascending
+    bout_stop : np.array, bout stops (same order as bout_start)
+
+    Returns
+    -------
+    rows : np.array, row position of each pair
+    bouts : np.array, bout position of each pair
+
+    """
+
+    # candidate bouts start before row stop and are after the first bout that ends after row start
+    hi = np.searchsorted(bout_start, row_stop, side = 'left')
+    lo = np.searchsorted(np.maximum.accumulate(bout_stop), row_start, side = 'right')
+    counts = np.maximum(hi - lo, 0)
+
+    # expand candidate ranges
+    rows = np.repeat(np.arange(len(row_start)), counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    bouts = np.repeat(lo, counts) + np.arange(counts.sum()) - offsets
+
+    # drop candidates that end before row start (only when bouts overlap each other)
+    keep = bout_stop[bouts] > row_start[rows]
+    return rows[keep], bouts[keep]
+
+
+def iter_interval_join(index_df, bouts, on:list = ['animal_id'], time_unit:str = 'seconds', chunk_rows:int = 100000):
+    """
+    Join behavior bouts onto index rows of the same key (e.g. animal_id) where they overlap in time.
+    Each output row is an index row restricted to the overlap with one bout (start_time and stop_time in samples)
+    with the bout columns added as group columns before brain_region.
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index with sampling_rate, start_time and stop_time (samples)
+    bouts : pd.DataFrame, with key columns, start_time, stop_time and bout columns (e.g. behavior)
+    on : list, key columns present in index and bouts
+    time_unit : str, seconds or samples (bout times)
+    chunk_rows : int, approximate number of joined rows per chunk
+
+    Yields
+    -------
+    join_df : pd.DataFrame, joined rows of one or more keys (in index key order)
+
+    """
+
+    if time_unit not in time_units:
+        raise Exception('Time unit -' + time_unit + '- is not supported, use ' + ', '.join(time_units) + '.')
+    check_columns(index_df, list(on) + ['sampling_rate', 'start_time', 'stop_time'], 'index')
+    check_columns(bouts, list(on) + ['start_time', 'stop_time'], 'bouts')
+
+    # output columns (bout columns are inserted before brain region)
+    bout_columns = [col for col in bouts.columns if col not in list(on) + ['start_time', 'stop_time']]
+    index_columns = [col for col in index_df.columns if col not in bout_columns]
+    tail = ['brain_region'] if 'brain_region' in index_columns else []
+    columns = [col for col in index_columns if col not in tail] + bout_columns + tail
+
+    # index rows in bout time units
+    index_df = index_df.reset_index(drop = True)
+    bouts = bouts.reset_index(drop = True)
+    sampling_rate = index_df['sampling_rate'].to_numpy(dtype = np.float64)
+    factor = sampling_rate if time_unit == 'seconds' else np.ones(len(index_df))
+    row_start = index_df['start_time'].to_numpy(dtype = np.int64)
+    row_stop = index_df['stop_time'].to_numpy(dtype = np.int64)
+
+    # sort bouts by key and start (bouts without index key or times are skipped)
+    index_keys, bout_keys = get_key_codes(index_df, bouts, list(on))
+    bout_start = bouts['start_time'].to_numpy(dtype = np.float64)
+    bout_stop = bouts['stop_time'].to_numpy(dtype = np.float64)
+    bout_order = np.lexsort((bout_start, bout_keys))
+    bout_order = bout_order[(bout_keys[bout_order] >= 0) & np.isfinite(bout_start[bout_order]) &
+                            np.isfinite(bout_stop[bout_order])]
+
+    # get row and bout positions of each key
+    key_bounds = np.arange(index_keys.max() + 2 if len(index_keys) else 1)
+    bout_bounds = np.searchsorted(bout_keys[bout_order], key_bounds)
+    row_order = np.argsort(index_keys, kind = 'stable')
+    row_bounds = np.searchsorted(index_keys[row_order], key_bounds)
+
+    pairs, n_pairs, n_chunks = [], 0, 0
+    for key in range(len(key_bounds) - 1):
+        rows = row_order[row_bounds[key]:row_bounds[key + 1]]
+        key_bouts = bout_order[bout_bounds[key]:bout_bounds[key + 1]]
+        if len(rows) == 0 or len(key_bouts) == 0:
+            continue
+
+        # find overlaps in bout time units and convert to samples with row sampling rate
+        row_idx, bout_idx = join_key_intervals(row_start[rows] / factor[rows], row_stop[rows] / factor[rows],
+                                               bout_start[key_bouts], bout_stop[key_bouts])
+        row_idx, bout_idx = rows[row_idx], key_bouts[bout_idx]
+        start = np.maximum(row_start[row_idx], np.round(bout_start[bout_idx] * factor[row_idx]).astype(np.int64))
+        stop = np.minimum(row_stop[row_idx], np.round(bout_stop[bout_idx] * factor[row_idx]).astype(np.int64))
+        keep = start < stop
+        pairs.append((row_idx[keep], bout_idx[keep], start[keep], stop[keep]))
+        n_pairs += keep.sum()
+
+        if n_pairs >= chunk_rows:
+            yield get_join_frame(index_df, bouts, pairs, columns, bout_columns)
+            pairs, n_pairs, n_chunks = [], 0, n_chunks + 1
+
+    # last chunk (or empty dataframe if no bouts overlap)
+    if pairs or n_chunks == 0:
+        yield get_join_frame(index_df, bouts, pairs, columns, bout_columns)
+
+
+def get_join_frame(index_df, bouts, pairs:list, columns:list, bout_columns:list):
+    """
+    Create joined rows from (row positions, bout positions, start, stop) arrays
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame
+    bouts : pd.DataFrame
+    pairs : list, of (row positions, bout positions, start_time, stop_time) arrays
+    columns : list, output column order
+    bout_columns : list, columns added from bouts
+
+    Returns
+    -------
+    join_df : pd.DataFrame
+
+    """
+
+    if pairs:
+        row_idx, bout_idx, start, stop = [np.concatenate(x) for x in zip(*pairs)]
+    else:
+        row_idx = bout_idx = start = stop = np.array([], dtype = np.int64)
+
+    join_df = index_df.iloc[row_idx].reset_index(drop = True)
+    join_df['start_time'] = start
+    join_df['stop_time'] = stop
+    for col in bout_columns:
+        join_df[col] = bouts[col].to_numpy()[bout_idx]
+
+    return join_df[columns]
+
+
+def interval_join(index_df, bouts, on:list = ['animal_id'], time_unit:str = 'seconds'):
+    """
+    Join behavior bouts onto overlapping index rows (see iter_interval_join)
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index
+    bouts : pd.DataFrame, behavior bouts
+    on : list, key columns
+    time_unit : str, seconds or samples (bout times)
+
+    Returns
+    -------
+    join_df : pd.DataFrame
+
+    """
+
+    return pd.concat(list(iter_interval_join(index_df, bouts, on, time_unit)), ignore_index = True)
+
+
+def write_interval_join(index_df, bouts, path:str, on:list = ['animal_id'], time_unit:str = 'seconds',
+                        chunk_rows:int = 100000):
+    """
+    Stream joined rows to csv file in chunks (joined index is not kept in memory)
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index
+    bouts : pd.DataFrame, behavior bouts
+    path : str, output csv
+    on : list, key columns
+    time_unit : str, seconds or samples (bout times)
+    chunk_rows : int, approximate number of rows written at a time
+
+    Returns
+    -------
+    n_rows : int, number of joined rows
+
+    """
+
+    # get first chunk before creating file (inputs are checked)
+    chunks = iter_interval_join(index_df, bouts, on, time_unit, chunk_rows)
+    join_df = next(chunks)
+
+    n_rows = len(join_df)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    with open(path, 'w', newline = '') as file:
+        join_df.to_csv(file, index = False)
+        for join_df in chunks:
+            join_df.to_csv(file, index = False, header = False)
+            n_rows += len(join_df)
+
+    return n_rows
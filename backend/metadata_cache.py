@@ -0,0 +1,216 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+### ------------------------------------------- ###
+
+def get_cache_dir():
+    """
+    Get user cache directory for sake-plan
+
+    Returns
+    -------
+    cache_dir : str
+
+    """
+
+    if os.name == 'nt':
+        base_dir = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base_dir = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+
+    return os.path.join(base_dir, 'sake-plan')
+
+
+def get_file_stat(file_path:str):
+    """
+    Get file size and modification time used to validate cache entries
+
+    Parameters
+    ----------
+    file_path : str
+
+    Returns
+    -------
+    stat : tuple, (size in bytes, modification time in ns)
+
+    """
+
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class MetadataCache:
+    """
+    Persistent sqlite cache of labchart file records (see adi_parse.get_file_record).
+    Entries are keyed by file path and are only valid if file size and mtime match.
+    """
+
+    def __init__(self, cache_path:str = None, max_entries:int = 200000):
+        """
+        Create cache table if it does not exist
+
+        Parameters
+        ----------
+        cache_path : str, path to sqlite file (default in user cache dir)
+        max_entries : int, maximum number of files kept, least recently used are evicted
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if cache_path is None:
+            cache_path = os.path.join(get_cache_dir(), 'metadata.sqlite')
+
+        # pass to object properties
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        # create cache table
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok = True)
+        with self.lock, self.connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS records (
+                            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,
+                            record TEXT, last_access REAL)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS last_access_idx ON records (last_access)')
+
+    @contextmanager
+    def connect(self):
+        """
+        Open connection to cache file, commit on success and close
+
+        Yields
+        -------
+        conn : sqlite3.Connection
+
+        """
+
+        conn = sqlite3.connect(self.cache_path, timeout = 30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_key(file_path:str):
+        """
+        Normalize file path to cache key
+
+        Parameters
+        ----------
+        file_path : str
+
+        Returns
+        -------
+        key : str
+
+        """
+
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def get_records(self, file_paths:list, file_stats:list):
+        """
+        Get cached records for files that were not changed
+
+        Parameters
+        ----------
+        file_paths : list, of file paths
+        file_stats : list, of (size, mtime_ns) for each file
+
+        Returns
+        -------
+        records : list, record for each file or None if missing or outdated
+
+        """
+
+        records = []
+        hit_keys = []
+        with self.lock, self.connect() as conn:
+            for file_path, (size, mtime_ns) in zip(file_paths, file_stats):
+
+                # get entry and check that file did not change
+                key = self.get_key(file_path)
+                row = conn.execute('SELECT size, mtime_ns, record FROM records WHERE path = ?', (key,)).fetchone()
+                if row is not None and row[0] == size and row[1] == mtime_ns:
+                    records.append(json.loads(row[2]))
+                    hit_keys.append(key)
+                else:
+                    records.append(None)
+
+            # update access time for eviction
+            now = time.time()
+            conn.executemany('UPDATE records SET last_access = ? WHERE path = ?', [(now, key) for key in hit_keys])
+
+        # update counters
+        self.hits += len(hit_keys)
+        self.misses += len(records) - len(hit_keys)
+
+        return records
+
+    def put_records(self, file_paths:list, file_stats:list, records:list):
+        """
+        Store file records and evict least recently used entries above max_entries
+
+        Parameters
+        ----------
+        file_paths : list, of file paths
+        file_stats : list, of (size, mtime_ns) for each file
+        records : list, of file records
+
+        Returns
+        -------
+        None.
+
+        """
+
+        now = time.time()
+        rows = [(self.get_key(file_path), size, mtime_ns, json.dumps(record), now)
+                for file_path, (size, mtime_ns), record in zip(file_paths, file_stats, records)]
+
+        with self.lock, self.connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)', rows)
+
+            # evict least recently used entries
+            n_entries = conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+            if n_entries > self.max_entries:
+                conn.execute('''DELETE FROM records WHERE path IN (SELECT path FROM records
+                             ORDER BY last_access LIMIT ?)''', (n_entries - self.max_entries,))
+
+    def clear(self):
+        """
+        Remove all entries so that every file is read again (force rebuild)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with self.lock, self.connect() as conn:
+            conn.execute('DELETE FROM records')
+        self.hits = 0
+        self.misses = 0
+
+    def get_stats(self):
+        """
+        Get cache counters
+
+        Returns
+        -------
+        stats : dict, with hits, misses and number of entries
+
+        """
+
+        with self.lock, self.connect() as conn:
+            n_entries = conn.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+        return {'hits': self.hits, 'misses': self.misses, 'entries': n_entries}
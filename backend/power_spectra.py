@@ -0,0 +1,258 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import numpy as np
+import pandas as pd
+from backend.extract_segments import get_segment_plan, get_file_tasks, iter_segment_chunks, run_tasks
+from backend.readers import get_reader
+### ------------------------------------------- ###
+
+# psd store file names (psd is frequency x index row, psd_index.csv holds the index rows in column order)
+psd_names = {'psd' : 'psd.npy', 'freqs' : 'freqs.npy', 'index' : 'psd_index.csv'}
+
+# samples of all channels of a file read at a time (small chunks keep window arrays in cpu cache)
+psd_chunk_samples = 2 ** 17
+
+
+class WelchPSD:
+    """
+    Welch power spectral density of signals with the same sampling rate, updated one chunk at a time.
+    Hann windows with 50% overlap, mean of each window removed and one sided density scaling
+    (same as scipy.signal.welch defaults with the given nperseg). Windows are computed for all signals at once.
+    """
+
+    def __init__(self, fs:float, nperseg:int, n_signals:int = 1):
+        self.fs = fs
+        self.nperseg = nperseg
+        self.step = nperseg - nperseg // 2
+        self.window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(nperseg) / nperseg)
+        self.scale = 1 / (fs * (self.window ** 2).sum())
+        self.tail = np.empty((n_signals, 0))
+        self.power = np.zeros((n_signals, nperseg // 2 + 1))
+        self.n_windows = 0
+
+    def update(self, data):
+        """
+        Add next chunk of signals (samples that do not fill a window are kept for the next chunk)
+
+        Parameters
+        ----------
+        data : np.array, signals x samples
+
+        Returns
+        -------
+        None.
+
+        """
+
+        data = np.concatenate([self.tail, np.asarray(data, dtype = np.float64)], axis = 1)
+        n_windows = (data.shape[1] - self.nperseg) // self.step + 1 if data.shape[1] >= self.nperseg else 0
+
+        if n_windows > 0:
+            windows = np.lib.stride_tricks.sliding_window_view(data, self.nperseg, axis = 1)[:, ::self.step][:, :n_windows]
+            windows = windows - windows.mean(axis = 2, keepdims = True)
+            spectrum = np.fft.rfft(windows * self.window, axis = 2)
+            self.power += (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis = 1)
+            self.n_windows += n_windows
+
+        self.tail = data[:, n_windows * self.step:]
+
+    def result(self):
+        """
+        Get power spectral density of each signal
+
+        Returns
+        -------
+        freqs : np.array, frequencies (Hz)
+        psd : np.array, signals x frequencies (NaN if signals are shorter than one window)
+
+        """
+
+        freqs = np.arange(self.nperseg // 2 + 1) * self.fs / self.nperseg
+        if self.n_windows == 0:
+            return freqs, np.full(self.power.shape, np.nan)
+
+        psd = self.power * self.scale / self.n_windows
+        psd[:, 1:] *= 2
+        if self.nperseg % 2 == 0:
+            psd[:, -1] /= 2
+
+        return freqs, psd
+
+
+def read_file_psd(file_path:str, segments, freqs, reader:str = 'auto', window_sec:float = 2.0,
+                  chunk:int = psd_chunk_samples):
+    """
+    Get power spectral density of segments of one labchart file.
+    Segments with the same block, times and sampling rate (channels of one file) are read chunk by chunk
+    and their Welch windows are computed together.
+
+    Parameters
+    ----------
+    file_path : str, labchart file
+    segments : np.array, (channel_id, block, start_time, stop_time, row, sampling_rate) rows
+    freqs : np.array, output frequencies (Hz)
+    reader : str or ReaderBackend, reader backend that can open signals
+    window_sec : float, Welch window length (s)
+    chunk : int, maximum samples read at a time for all signals together
+
+    Returns
+    -------
+    rows : list, index row position per segment
+    psd : np.array, segments x freqs (float32)
+
+    """
+
+    signals = get_reader(reader).open_signals(file_path)
+    keys, groups = np.unique(segments[:, [1, 2, 3, 5]], axis = 0, return_inverse = True)
+
+    rows, spectra = [], []
+    for i, (block, start, stop, fs) in enumerate(keys):
+        group = segments[groups.ravel() == i]
+        nperseg = max(int(round(fs * window_sec)), 1)
+        welch = WelchPSD(fs, nperseg, len(group))
+
+        # read all channels of the group one chunk at a time (chunk holds whole windows)
+        group_chunk = max(chunk // len(group) // nperseg, 1) * nperseg
+        readers = [iter_segment_chunks(signals, file_path, channel_id, block, start, stop, group_chunk)
+                   for channel_id in group[:, 0]]
+        for values in zip(*readers):
+            welch.update(np.stack([x[1] for x in values]))
+
+        # map to output frequencies (NaN above nyquist)
+        group_freqs, psd = welch.result()
+        if len(group_freqs) >= len(freqs) and np.allclose(group_freqs[:len(freqs)], freqs):
+            psd = psd[:, :len(freqs)]
+        else:
+            psd = np.array([np.interp(freqs, group_freqs, x, right = np.nan) for x in psd])
+
+        rows.extend(group[:, 4].tolist())
+        spectra.append(psd.astype(np.float32))
+
+    return rows, np.concatenate(spectra) if spectra else np.empty((0, len(freqs)), dtype = np.float32)
+
+
+def get_psd_freqs(sampling_rates, window_sec:float = 2.0, max_freq:float = None):
+    """
+    Get shared frequencies of psd store (resolution 1 / window_sec up to max_freq or highest nyquist)
+
+    Parameters
+    ----------
+    sampling_rates : array like
+    window_sec : float, Welch window length (s)
+    max_freq : float, highest frequency (Hz)
+
+    Returns
+    -------
+    freqs : np.array
+
+    """
+
+    nyquist = np.max(sampling_rates) / 2 if len(sampling_rates) else 0
+    max_freq = nyquist if max_freq is None else min(max_freq, nyquist)
+    return np.arange(int(np.floor(max_freq * window_sec + 1e-9)) + 1) / window_sec
+
+
+def index_psd(index_df, folder_path:str, output_path:str, n_workers:int = 1, reader:str = 'auto',
+              window_sec:float = 2.0, max_freq:float = None, progress = None, cancel = None):
+    """
+    Compute Welch power spectral density of each index row and write them as one frequency x row array.
+    Rows are grouped by file (each file is opened once, see extract_segments), channels of a file
+    with the same times are computed together and files are processed in parallel.
+
+    Writes psd.npy (float32, frequencies x index rows, column i is index row i), freqs.npy and
+    psd_index.csv (index with file_id, column i is row i).
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index with sampling_rate
+    folder_path : str, data folder that was indexed
+    output_path : str, output folder
+    n_workers : int, number of worker processes reading files
+    reader : str or ReaderBackend, reader backend that can open signals (auto, adi or registered backend)
+    window_sec : float, Welch window length (s), frequency resolution is 1 / window_sec
+    max_freq : float, highest stored frequency (Hz, highest nyquist if None)
+    progress : callable, called with (tasks done, total tasks)
+    cancel : threading.Event, psd stops when set
+
+    Raises
+    ------
+    ScanCancelled
+
+    Returns
+    -------
+    freqs : np.array
+    psd : np.memmap, frequencies x index rows (NaN for rows shorter than one window)
+
+    """
+
+    plan = get_segment_plan(index_df, os.path.normpath(folder_path))
+    plan['sampling_rate'] = index_df['sampling_rate'].to_numpy(dtype = np.int64)
+    freqs = get_psd_freqs(plan['sampling_rate'].to_numpy(), window_sec, max_freq)
+    columns = ['channel_id', 'block', 'start_time', 'stop_time', 'row', 'sampling_rate']
+    tasks = [(file_path, segments, freqs, reader, window_sec)
+             for file_path, segments in get_file_tasks(plan, None, columns)]
+
+    # one task per file keeps channels together, rows are stored contiguously (fortran order)
+    os.makedirs(output_path, exist_ok = True)
+    psd = np.lib.format.open_memmap(os.path.join(output_path, psd_names['psd']), mode = 'w+', dtype = np.float32,
+                                    shape = (len(freqs), len(index_df)), fortran_order = True)
+    psd[:] = np.nan
+    for rows, values in run_tasks(tasks, read_file_psd, n_workers, progress, cancel):
+        psd[:, rows] = values.T
+    psd.flush()
+
+    np.save(os.path.join(output_path, psd_names['freqs']), freqs)
+    index_df.to_csv(os.path.join(output_path, psd_names['index']), index = False)
+
+    return freqs, psd
+
+
+def load_psd(output_path:str):
+    """
+    Open psd store written by index_psd (psd is not loaded into memory)
+
+    Parameters
+    ----------
+    output_path : str, output folder of index_psd
+
+    Returns
+    -------
+    freqs : np.array
+    psd : np.memmap, frequencies x index rows
+    psd_df : pd.DataFrame, index rows in psd column order
+
+    """
+
+    freqs = np.load(os.path.join(output_path, psd_names['freqs']))
+    psd = np.load(os.path.join(output_path, psd_names['psd']), mmap_mode = 'r')
+    psd_df = pd.read_csv(os.path.join(output_path, psd_names['index']))
+
+    return freqs, psd, psd_df
+
+
+def get_group_psd(freqs, psd, psd_df, group_columns:list = ['brain_region']):
+    """
+    Get mean power spectral density per group (e.g. brain_region and treatment)
+
+    Parameters
+    ----------
+    freqs : np.array
+    psd : np.array, frequencies x index rows
+    psd_df : pd.DataFrame, index rows in psd column order
+    group_columns : list
+
+    Returns
+    -------
+    group_psd : pd.DataFrame, one row per group and one column per frequency
+
+    """
+
+    codes, uniques = pd.MultiIndex.from_frame(psd_df[group_columns].astype(str)).factorize()
+    group_psd = np.full((len(uniques), len(freqs)), np.nan)
+    for i in range(len(uniques)):
+        values = np.asarray(psd[:, codes == i], dtype = np.float64)
+        finite = np.isfinite(values)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            group_psd[i] = np.where(finite, values, 0).sum(axis = 1) / finite.sum(axis = 1)
+
+    return pd.DataFrame(group_psd, index = uniques, columns = freqs)
@@ -0,0 +1,224 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from backend.metadata_cache import get_cache_dir
+### ------------------------------------------- ###
+
+# tracemalloc is process wide, profilers share it (e.g. concurrent app jobs)
+trace_lock = threading.Lock()
+trace_state = {'users' : 0,         # profilers tracing memory
+               'started' : False,   # tracing was started by a profiler (stopped by the last user)
+               'stages' : 0,        # traced stages running
+               'count' : 0}         # traced stages started (detects overlapping stages)
+
+def get_log_path():
+    """
+    Get path of structured profile log (json lines in user cache dir)
+
+    Returns
+    -------
+    log_path : str
+
+    """
+
+    return os.path.join(get_cache_dir(), 'logs', 'profile.jsonl')
+
+
+class StageProfiler:
+    """
+    Record wall time, item counts and peak memory of index stages and read time of each file.
+    Memory is traced with tracemalloc (python allocations of this process only) if trace_memory is set.
+    Tracing is shared by all profilers of the process and stopped when the last one stops.
+    Peak memory of a stage that overlapped another traced stage (e.g. of a concurrent job)
+    cannot be attributed to it and is None.
+    """
+
+    def __init__(self, trace_memory:bool = False):
+        """
+        Create empty profiler
+
+        Parameters
+        ----------
+        trace_memory : bool, record peak memory of each stage (slows down stages)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.trace_memory = trace_memory
+        self.tracing = False    # profiler is a user of shared tracing
+        self.stages = []        # dict per stage with stage, seconds, items and peak_mb
+        self.file_times = []    # (file path, seconds)
+        self.start_time = time.time()
+
+    @contextmanager
+    def stage(self, name:str, items:int = None):
+        """
+        Time stage (items can be updated through the yielded dict)
+
+        Parameters
+        ----------
+        name : str, stage name
+        items : int, number of files or rows processed
+
+        Yields
+        -------
+        entry : dict, stage record (peak_mb is None if another traced stage ran at the same time)
+
+        """
+
+        entry = {'stage' : name, 'seconds' : None, 'items' : items, 'peak_mb' : None}
+
+        # start shared tracing and reset peak memory (only if no other traced stage is running)
+        if self.trace_memory:
+            with trace_lock:
+                if not self.tracing:
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start()
+                        trace_state['started'] = True
+                    trace_state['users'] += 1
+                    self.tracing = True
+                if trace_state['stages'] == 0:
+                    if hasattr(tracemalloc, 'reset_peak'):
+                        tracemalloc.reset_peak()
+                    else:
+                        tracemalloc.clear_traces()
+                    base_memory = tracemalloc.get_traced_memory()[0]
+                else:
+                    base_memory = None
+                trace_state['stages'] += 1
+                trace_state['count'] += 1
+                stage_count = trace_state['count']
+
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                with trace_lock:
+                    trace_state['stages'] -= 1
+                    if base_memory is not None and trace_state['count'] == stage_count:
+                        entry['peak_mb'] = (tracemalloc.get_traced_memory()[1] - base_memory) / 1024**2
+            self.stages.append(entry)
+
+    def add_file_times(self, file_paths:list, times:list):
+        """
+        Add read time of files
+
+        Parameters
+        ----------
+        file_paths : list
+        times : list, seconds per file
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.file_times.extend(zip(file_paths, times))
+
+    def get_slowest_files(self, n_files:int = 10):
+        """
+        Get files with longest read time
+
+        Parameters
+        ----------
+        n_files : int
+
+        Returns
+        -------
+        slowest : list, of dicts with path and seconds
+
+        """
+
+        slowest = sorted(self.file_times, key = lambda x: x[1], reverse = True)[:n_files]
+        return [{'path' : path, 'seconds' : seconds} for path, seconds in slowest]
+
+    def stop(self):
+        """
+        Stop using memory tracing (tracing is stopped when no other profiler uses it)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        with trace_lock:
+            if not self.tracing:
+                return
+            self.tracing = False
+            trace_state['users'] -= 1
+            if trace_state['users'] == 0 and trace_state['started']:
+                tracemalloc.stop()
+                trace_state['started'] = False
+
+    def get_summary(self, n_files:int = 10):
+        """
+        Get stage breakdown and slowest files
+
+        Parameters
+        ----------
+        n_files : int, number of slowest files
+
+        Returns
+        -------
+        summary : dict
+
+        """
+
+        return {'timestamp' : time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.start_time)),
+                'total_seconds' : sum(entry['seconds'] for entry in self.stages),
+                'stages' : list(self.stages), 'files_read' : len(self.file_times),
+                'slowest_files' : self.get_slowest_files(n_files)}
+
+    def write_log(self, log_path:str = None, **info):
+        """
+        Append summary as one json line to log
+
+        Parameters
+        ----------
+        log_path : str, json lines file (default in user cache dir)
+        **info : added to logged summary (e.g. folder path)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if log_path is None:
+            log_path = get_log_path()
+
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok = True)
+        with open(log_path, 'a') as file:
+            file.write(json.dumps(dict(info, **self.get_summary())) + '\n')
+
+
+def profile_stage(profiler, name:str, items:int = None):
+    """
+    Time stage with profiler or do nothing if profiler is None
+
+    Parameters
+    ----------
+    profiler : StageProfiler or None
+    name : str
+    items : int
+
+    Returns
+    -------
+    context manager yielding stage record (dict)
+
+    """
+
+    if profiler is None:
+        return nullcontext({})
+    return profiler.stage(name, items)
@@ -0,0 +1,399 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import json
+import numpy as np
+from backend.metadata_cache import get_file_stat
+### ------------------------------------------- ###
+
+# sidecar formats and suffixes (added to labchart file name, e.g. rec1.adicht.json)
+sidecar_formats = {'json' : '.json', 'parquet' : '.parquet'}
+
+# version of sidecar layout (see read_sidecar)
+sidecar_version = 1
+
+
+def get_record(metadata:dict):
+    """
+    Get file record used for indexing from recording metadata
+
+    Parameters
+    ----------
+    metadata : dict, with keys:
+        channel_names : list, channel names
+        record_lengths : list, number of samples per block (first channel)
+        tick_dt : list, sampling period of each channel per block
+        comments : list, [channel, text, tick_position] for each comment of first block
+
+    Returns
+    -------
+    record : dict, with keys:
+        n_channels : int, total number of channels
+        channel_names : list, channel names
+        record_lengths : list, number of samples per block (first channel)
+        block : int, block with the largest length
+        file_length : int, length of selected block in samples
+        tick_dt : list, sampling period per channel for the selected block
+        comments : list, [channel, text, tick_position] for each comment of first block
+
+    """
+
+    # find the block with larger length
+    record_lengths = [int(length) for length in metadata['record_lengths']]
+    block = int(np.argmax(record_lengths))
+
+    return {'n_channels' : len(metadata['channel_names']),
+            'channel_names' : list(metadata['channel_names']),
+            'record_lengths' : record_lengths,
+            'block' : block,
+            'file_length' : record_lengths[block],
+            'tick_dt' : [float(tick_dt[block]) for tick_dt in metadata['tick_dt']],
+            'comments' : [[int(channel), text, int(tick_position)] for channel, text, tick_position in metadata['comments']],
+            }
+
+
+def get_sidecar_path(file_path:str, file_format:str = 'json'):
+    """
+    Get sidecar path of labchart file
+
+    Parameters
+    ----------
+    file_path : str
+    file_format : str, json or parquet
+
+    Returns
+    -------
+    sidecar_path : str
+
+    """
+
+    if file_format not in sidecar_formats:
+        raise Exception('Sidecar format -' + file_format + '- is not supported, use ' + ', '.join(sidecar_formats) + '.')
+
+    return file_path + sidecar_formats[file_format]
+
+
+def is_sidecar_current(metadata:dict, file_path:str):
+    """
+    Check if sidecar metadata belong to the current labchart file
+    (same size and modification time, as in the metadata cache)
+
+    Parameters
+    ----------
+    metadata : dict, from read_sidecar
+    file_path : str, labchart file
+
+    Returns
+    -------
+    bool
+
+    """
+
+    return (metadata.get('file_size'), metadata.get('mtime_ns')) == get_file_stat(file_path)
+
+
+def write_sidecar(file_path:str, metadata:dict, file_format:str = 'json'):
+    """
+    Write recording metadata to sidecar next to labchart file.
+    The size and modification time of the labchart file are stored to detect outdated sidecars.
+
+    Parameters
+    ----------
+    file_path : str, labchart file
+    metadata : dict, from AdiReader.read_metadata
+    file_format : str, json or parquet (requires pyarrow)
+
+    Returns
+    -------
+    sidecar_path : str
+
+    """
+
+    sidecar_path = get_sidecar_path(file_path, file_format)
+    file_size, mtime_ns = get_file_stat(file_path)
+    content = {'version' : sidecar_version, 'file_size' : file_size, 'mtime_ns' : mtime_ns,
+               'channel_names' : list(metadata['channel_names']),
+               'record_lengths' : [int(length) for length in metadata['record_lengths']],
+               'tick_dt' : [[float(x) for x in tick_dt] for tick_dt in metadata['tick_dt']],
+               'comments' : [[int(channel), text, int(tick_position)] for channel, text, tick_position in metadata['comments']],
+               }
+
+    # write to temporary file first so that readers never see partial sidecars
+    temp_path = sidecar_path + '.tmp'
+    if file_format == 'json':
+        with open(temp_path, 'w') as file:
+            json.dump(content, file)
+    else:
+        from backend.export_index import import_pyarrow
+        pa = import_pyarrow()
+        comments = content.pop('comments')
+        table = pa.table({key: [value] for key, value in content.items()})
+        table = table.append_column('comment_channel', pa.array([[com[0] for com in comments]], pa.list_(pa.int64())))
+        table = table.append_column('comment_text', pa.array([[com[1] for com in comments]], pa.list_(pa.string())))
+        table = table.append_column('comment_time', pa.array([[com[2] for com in comments]], pa.list_(pa.int64())))
+        pa.parquet.write_table(table, temp_path)
+    os.replace(temp_path, sidecar_path)
+
+    return sidecar_path
+
+
+def read_sidecar(sidecar_path:str):
+    """
+    Read recording metadata from json or parquet sidecar
+
+    Parameters
+    ----------
+    sidecar_path : str
+
+    Returns
+    -------
+    metadata : dict, with version, file_size, mtime_ns, channel_names, record_lengths, tick_dt and comments
+
+    """
+
+    if sidecar_path.endswith(sidecar_formats['parquet']):
+        from backend.export_index import import_pyarrow
+        pa = import_pyarrow()
+        metadata = {key: values[0] for key, values in pa.parquet.read_table(sidecar_path).to_pydict().items()}
+        metadata['comments'] = [list(com) for com in zip(metadata.pop('comment_channel'), metadata.pop('comment_text'),
+                                                        metadata.pop('comment_time'))]
+    else:
+        with open(sidecar_path, 'r') as file:
+            metadata = json.load(file)
+
+    if metadata.get('version') != sidecar_version:
+        raise Exception('Sidecar ' + sidecar_path + ' has unsupported version -' + str(metadata.get('version')) + '-.')
+
+    return metadata
+
+
+def import_adi():
+    """
+    Import adi-reader (only needed to read labchart files)
+
+    Returns
+    -------
+    adi : module
+
+    """
+
+    try:
+        import adi
+    except ImportError:
+        raise Exception('adi-reader is required to read labchart files (pip install adi-reader, windows only), '
+                        'use metadata sidecars on other systems (see sake_sidecar.py).')
+
+    return adi
+
+
+class ReaderBackend:
+    """
+    Base class of labchart reader backends.
+    Backends implement read_metadata, records for indexing are derived from it with get_record.
+    Backends that can read samples also implement open_signals.
+    """
+
+    def read_metadata(self, file_path:str):
+        """
+        Read recording metadata (see get_record)
+
+        Parameters
+        ----------
+        file_path : str, labchart file
+
+        Returns
+        -------
+        metadata : dict, with channel_names, record_lengths, tick_dt and comments
+
+        """
+
+        raise NotImplementedError
+
+    def read_record(self, file_path:str):
+        """
+        Read file record used for indexing
+
+        Parameters
+        ----------
+        file_path : str, labchart file
+
+        Returns
+        -------
+        record : dict, see get_record
+
+        """
+
+        return get_record(self.read_metadata(file_path))
+
+    def open_signals(self, file_path:str):
+        """
+        Open labchart file to read channel samples
+
+        Parameters
+        ----------
+        file_path : str, labchart file
+
+        Returns
+        -------
+        signals : object with get_data(channel_id, block, start_sample, stop_sample)
+
+        """
+
+        raise Exception('Reader -' + type(self).__name__ + '- can not read signals, use reader adi or auto.')
+
+
+class AdiSignals:
+    """
+    Channel samples of an open labchart file (samples start at 1 and stop_sample is included, as in adi-reader).
+    """
+
+    def __init__(self, adi_obj):
+        self.adi_obj = adi_obj
+
+    def get_data(self, channel_id:int, block:int, start_sample:int, stop_sample:int):
+        """
+        Get samples of one channel and block
+
+        Parameters
+        ----------
+        channel_id : int, channel (starts at 0)
+        block : int, block (starts at 0)
+        start_sample : int, first sample (starts at 1)
+        stop_sample : int, last sample (included)
+
+        Returns
+        -------
+        data : np.array
+
+        """
+
+        return np.asarray(self.adi_obj.channels[channel_id].get_data(block + 1, start_sample, stop_sample))
+
+
+class AdiReader(ReaderBackend):
+    """
+    Read labchart files with the adi-reader library (requires the ADInstruments SDK).
+    """
+
+    def read_metadata(self, file_path:str):
+
+        # read file
+        adi_obj = import_adi().read_file(file_path)
+
+        # get channel properties
+        channels = [adi_obj.channels[ch] for ch in range(adi_obj.n_channels)]
+        metadata = {'channel_names' : [ch.name for ch in channels],
+                    'record_lengths' : [int(channels[0].n_samples[block]) for block in range(adi_obj.n_records)],
+                    'tick_dt' : [[float(ch.tick_dt[block]) for block in range(adi_obj.n_records)] for ch in channels],
+                    'comments' : [[int(com.channel_), com.text, int(com.tick_position)]
+                                  for com in adi_obj.records[0].comments],
+                    }
+
+        del adi_obj                                       # clear memory
+
+        return metadata
+
+    def open_signals(self, file_path:str):
+        return AdiSignals(import_adi().read_file(file_path))
+
+
+class SidecarReader(ReaderBackend):
+    """
+    Read recording metadata from sidecars written by sake_sidecar.py (labchart file is not opened).
+    """
+
+    def find_sidecar(self, file_path:str):
+        """
+        Get path of existing sidecar (json is preferred over parquet)
+
+        Parameters
+        ----------
+        file_path : str, labchart file
+
+        Returns
+        -------
+        sidecar_path : str or None
+
+        """
+
+        for file_format in sidecar_formats:
+            sidecar_path = get_sidecar_path(file_path, file_format)
+            if os.path.isfile(sidecar_path):
+                return sidecar_path
+
+        return None
+
+    def read_metadata(self, file_path:str):
+
+        sidecar_path = self.find_sidecar(file_path)
+        if sidecar_path is None:
+            raise Exception('No metadata sidecar was found for ' + file_path + '.')
+
+        metadata = read_sidecar(sidecar_path)
+        if not is_sidecar_current(metadata, file_path):
+            raise Exception('Sidecar ' + sidecar_path + ' is outdated (labchart file size or modification time changed).')
+
+        return metadata
+
+
+class AutoReader(ReaderBackend):
+    """
+    Read sidecar if one exists for the file and is up to date, otherwise read labchart file with adi-reader.
+    """
+
+    def read_metadata(self, file_path:str):
+
+        # use sidecar if it matches labchart file
+        sidecar_path = SidecarReader().find_sidecar(file_path)
+        if sidecar_path is not None:
+            metadata = read_sidecar(sidecar_path)
+            if is_sidecar_current(metadata, file_path):
+                return metadata
+
+        return AdiReader().read_metadata(file_path)
+
+    def open_signals(self, file_path:str):
+        return AdiReader().open_signals(file_path)
+
+
+# reader backends by name (see register_reader)
+reader_backends = {'auto' : AutoReader, 'adi' : AdiReader, 'sidecar' : SidecarReader}
+
+
+def register_reader(name:str, backend):
+    """
+    Add reader backend (register at import of a module so that worker processes also find it)
+
+    Parameters
+    ----------
+    name : str
+    backend : class, subclass of ReaderBackend
+
+    Returns
+    -------
+    None.
+
+    """
+
+    reader_backends[name] = backend
+
+
+def get_reader(name:str = 'auto'):
+    """
+    Get reader backend by name (reader backend instances are returned as they are)
+
+    Parameters
+    ----------
+    name : str or ReaderBackend, auto, adi, sidecar or registered backend
+
+    Returns
+    -------
+    reader : ReaderBackend
+
+    """
+
+    if isinstance(name, ReaderBackend):
+        return name
+    if name not in reader_backends:
+        raise Exception('Reader -' + name + '- is not supported, use ' + ', '.join(reader_backends) + '.')
+
+    return reader_backends[name]()
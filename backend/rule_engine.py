@@ -0,0 +1,111 @@
+### --------- IMPORTS --------- ###
+import re
+import numpy as np
+import pandas as pd
+from backend import search_function
+### --------------------------- ###
+
+# search functions that are batched in one regular expression
+# (contains uses regex search as pd.Series.str.contains, startswith/endswith are literal)
+batch_patterns = {'contains' : lambda name, x: '(?s:.*?)(?P<' + name + '>' + x + ')',
+                  'startswith' : lambda name, x: '(?P<' + name + '>' + re.escape(x) + ')',
+                  'endswith' : lambda name, x: '(?s:.*)(?P<' + name + '>' + re.escape(x) + r')\Z',
+                  }
+
+
+class RuleProgram:
+    """
+    User search rules for one source column compiled to run on unique column values.
+    Contains, startswith and endswith rules are matched together with one regular expression
+    and results are broadcast back to rows through integer codes.
+    """
+
+    def __init__(self, functions:list, values:list):
+        """
+        Compile rules
+
+        Parameters
+        ----------
+        functions : list, search function names (from search_function module)
+        values : list, search values
+
+        Returns
+        -------
+        None.
+
+        """
+
+        # pass to object
+        self.functions = list(functions)
+        self.values = list(values)
+        self.n_rules = len(self.functions)
+
+        # separate rules that can be batched (numbered backreferences of user expressions
+        # would point at groups of other rules in the combined expression)
+        self.batch_idx = [i for i, func in enumerate(self.functions) if func in batch_patterns and
+                          not (func == 'contains' and re.search(r'\\\d', str(self.values[i])))]
+        self.other_idx = [i for i in range(self.n_rules) if i not in self.batch_idx]
+
+        # build one expression with an optional lookahead per rule (named group set when rule matches)
+        self.matcher = None
+        if len(self.batch_idx) > 0:
+            pattern = '^' + ''.join(['(?:(?=' + batch_patterns[self.functions[i]]('rule%d' %i, self.values[i]) + '))?'
+                                     for i in self.batch_idx])
+            try:
+                self.matcher = re.compile(pattern)
+            except re.error:
+                # evaluate rules separately (e.g. user expression with global flags)
+                self.other_idx = list(range(self.n_rules))
+                self.batch_idx = []
+
+    def run_unique(self, uniques):
+        """
+        Run rules on unique values
+
+        Parameters
+        ----------
+        uniques : np.array, unique string values
+
+        Returns
+        -------
+        logic : np.array (values x rules), bool
+
+        """
+
+        logic = np.zeros((len(uniques), self.n_rules), dtype = bool)
+
+        # batched rules, one match per value (rule group is None if rule did not match)
+        if len(self.batch_idx) > 0 and len(uniques) > 0:
+            groups = [self.matcher.match(str(value)).groups() for value in uniques]
+            group_idx = [self.matcher.groupindex['rule%d' %i] - 1 for i in self.batch_idx]
+            logic[:, self.batch_idx] = np.not_equal(np.array(groups, dtype = object)[:, group_idx], None)
+
+        # remaining rules
+        series = pd.Series(uniques, dtype = object)
+        for i in self.other_idx:
+            logic[:, i] = getattr(search_function, self.functions[i])(series, self.values[i])
+
+        return logic
+
+    def run(self, series):
+        """
+        Run rules on all rows of a series
+
+        Parameters
+        ----------
+        series : pd.Series
+
+        Returns
+        -------
+        logic : np.array (rows x rules), bool
+
+        """
+
+        # get integer codes and unique values (missing values get code -1)
+        codes, uniques = pd.factorize(series)
+
+        # run rules on unique values, add last row (False) for missing values
+        logic = self.run_unique(np.asarray(uniques, dtype = object))
+        logic = np.vstack([logic, np.zeros((1, self.n_rules), dtype = bool)])
+
+        return logic[codes]
@@ -0,0 +1,156 @@
+### ----------------- IMPORTS ----------------- ###
+import os
+import threading
+from collections import OrderedDict
+### ------------------------------------------- ###
+
+def normalize_folder_path(folder_path:str):
+    """
+    Normalize folder path used in cache keys and file data (same as get_file_data).
+    Case is only folded on case insensitive systems (os.path.normcase) so that paths can still be opened.
+
+    Parameters
+    ----------
+    folder_path : str
+
+    Returns
+    -------
+    folder_path : str
+
+    """
+
+    return os.path.normcase(os.path.normpath(folder_path))
+
+
+def get_data_size(data:tuple):
+    """
+    Get memory size of cached dataframes
+
+    Parameters
+    ----------
+    data : tuple, of pd.DataFrames
+
+    Returns
+    -------
+    size : int, bytes
+
+    """
+
+    return int(sum(df.memory_usage(index = True, deep = True).sum() for df in data))
+
+
+class ScanCache:
+    """
+    In-memory LRU cache of scanned folder data (file_data, comment_data) shared across requests.
+    Entries are valid only while the folder fingerprint does not change.
+    """
+
+    def __init__(self, max_bytes:int = 512*1024**2):
+        """
+        Create empty cache
+
+        Parameters
+        ----------
+        max_bytes : int, maximum memory of cached data, least recently used entries are evicted
+
+        Returns
+        -------
+        None.
+
+        """
+
+        # pass to object properties
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key: (fingerprint, data, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key:tuple, fingerprint:str):
+        """
+        Get cached data if folder did not change
+
+        Parameters
+        ----------
+        key : tuple, (folder path, channel structures)
+        fingerprint : str, current folder fingerprint
+
+        Returns
+        -------
+        data : tuple or None
+
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            # remove outdated entries
+            if entry is not None and entry[0] != fingerprint:
+                self.total_bytes -= self.entries.pop(key)[2]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # mark as recently used
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key:tuple, fingerprint:str, data:tuple):
+        """
+        Add data to cache and evict least recently used entries above max_bytes
+
+        Parameters
+        ----------
+        key : tuple, (folder path, channel structures)
+        fingerprint : str, folder fingerprint
+        data : tuple, of pd.DataFrames
+
+        Returns
+        -------
+        None.
+
+        """
+
+        size = get_data_size(data)
+        with self.lock:
+
+            # replace previous entry
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[2]
+
+            # do not cache data larger than cache
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = (fingerprint, data, size)
+            self.total_bytes += size
+
+            # evict least recently used
+            while self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.entries.popitem(last = False)[1][2]
+
+    def invalidate(self, folder_path:str = None):
+        """
+        Remove cached scans of one folder or all folders
+
+        Parameters
+        ----------
+        folder_path : str, folder path (all entries are removed if None)
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if folder_path is not None:
+            folder_path = normalize_folder_path(folder_path)
+
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if folder_path is None or key[0] == folder_path:
+                    self.total_bytes -= self.entries.pop(key)[2]
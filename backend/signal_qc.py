@@ -0,0 +1,285 @@
+### ----------------- IMPORTS ----------------- ###
+import numpy as np
+import pandas as pd
+from backend.extract_segments import (chunk_samples, max_task_samples, get_segment_plan, get_file_tasks,
+                                      iter_segment_chunks, run_tasks)
+from backend.readers import get_reader
+### ------------------------------------------- ###
+
+# qc metrics added to the index (in this order)
+qc_columns = ['rms', 'flat_fraction', 'clip_fraction', 'line_noise_power', 'nan_count']
+
+# rows outside these [min, max] ranges are dropped (None = no bound)
+default_qc_thresholds = {'flat_fraction' : [None, 0.5], 'clip_fraction' : [None, 0.01]}
+
+
+class SegmentQC:
+    """
+    Signal quality metrics of one segment, updated one chunk at a time (memory does not depend on segment length).
+
+    rms : root mean square of finite samples
+    flat_fraction : fraction of samples equal to the previous sample (within flat_tolerance)
+    clip_fraction : fraction of finite samples at the segment minimum or maximum (0 for constant segments)
+    line_noise_power : power of the line frequency component (amplitude ** 2 / 2)
+    nan_count : number of NaN samples
+    """
+
+    def __init__(self, fs:float, line_freq:float = 60, flat_tolerance:float = 0):
+        self.omega = 2 * np.pi * line_freq / fs
+        self.flat_tolerance = flat_tolerance
+        self.n = 0
+        self.n_finite = 0
+        self.n_nan = 0
+        self.n_flat = 0
+        self.sum_sq = 0.0
+        self.line = 0j
+        self.last = np.nan
+        self.max = -np.inf
+        self.min = np.inf
+        self.n_max = 0
+        self.n_min = 0
+
+    def update(self, data):
+        """
+        Add next chunk of segment
+
+        Parameters
+        ----------
+        data : np.array, chunk samples
+
+        Returns
+        -------
+        None.
+
+        """
+
+        data = np.asarray(data, dtype = np.float64)
+        if len(data) == 0:
+            return
+
+        finite = np.isfinite(data)
+        values = data[finite]
+        self.n_nan += int(np.isnan(data).sum())
+        self.n_finite += len(values)
+        self.sum_sq += float(np.dot(values, values))
+
+        # flat samples (first sample is compared with the last sample of the previous chunk)
+        diff = np.abs(np.diff(data, prepend = self.last))
+        self.n_flat += int((diff <= self.flat_tolerance).sum())
+        self.last = data[-1]
+
+        # line frequency component (phase from position in segment)
+        phase = self.omega * np.arange(self.n, self.n + len(data))
+        values_zero = np.where(finite, data, 0)
+        self.line += complex(np.dot(values_zero, np.cos(phase)), -np.dot(values_zero, np.sin(phase)))
+        self.n += len(data)
+
+        # samples at running extremes
+        if len(values) > 0:
+            for attr, count, extreme in (('max', 'n_max', values.max()), ('min', 'n_min', values.min())):
+                current = getattr(self, attr)
+                if extreme == current:
+                    setattr(self, count, getattr(self, count) + int((values == extreme).sum()))
+                elif (extreme > current) == (attr == 'max'):
+                    setattr(self, attr, extreme)
+                    setattr(self, count, int((values == extreme).sum()))
+
+    def result(self):
+        """
+        Get metrics of segment
+
+        Returns
+        -------
+        metrics : list, values of qc_columns
+
+        """
+
+        rms = np.sqrt(self.sum_sq / self.n_finite) if self.n_finite else np.nan
+        flat_fraction = self.n_flat / (self.n - 1) if self.n > 1 else np.nan
+        if self.n_finite == 0:
+            clip_fraction = np.nan
+        elif self.max > self.min:
+            clip_fraction = (self.n_max + self.n_min) / self.n_finite
+        else:
+            clip_fraction = 0.0
+        line_noise_power = 2 * abs(self.line) ** 2 / self.n ** 2 if self.n else np.nan
+
+        return [rms, flat_fraction, clip_fraction, line_noise_power, self.n_nan]
+
+
+def read_file_qc(file_path:str, segments, reader:str = 'auto', line_freq:float = 60, flat_tolerance:float = 0,
+                 chunk:int = chunk_samples):
+    """
+    Get qc metrics of segments of one labchart file (file is opened once, samples are read in chunks)
+
+    Parameters
+    ----------
+    file_path : str, labchart file
+    segments : np.array, (channel_id, block, start_time, stop_time, row, sampling_rate) rows
+    reader : str or ReaderBackend, reader backend that can open signals
+    line_freq : float, line noise frequency (Hz)
+    flat_tolerance : float, maximum difference between flat samples
+    chunk : int, samples read at a time
+
+    Returns
+    -------
+    rows : list, index row position per segment
+    metrics : list, qc metrics per segment (see qc_columns)
+
+    """
+
+    signals = get_reader(reader).open_signals(file_path)
+
+    rows, metrics = [], []
+    for channel_id, block, start, stop, row, fs in segments:
+        qc = SegmentQC(fs, line_freq, flat_tolerance)
+        for _, values in iter_segment_chunks(signals, file_path, channel_id, block, start, stop, chunk):
+            qc.update(values)
+        rows.append(int(row))
+        metrics.append(qc.result())
+
+    return rows, metrics
+
+
+def get_signal_qc(index_df, folder_path:str, n_workers:int = 1, reader:str = 'auto', line_freq:float = 60,
+                  flat_tolerance:float = 0, progress = None, cancel = None):
+    """
+    Get qc metrics of each index row.
+    Rows are grouped by file and read in chunks (see extract_segments), files are read in parallel.
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index with sampling_rate
+    folder_path : str, data folder that was indexed
+    n_workers : int, number of worker processes reading files
+    reader : str or ReaderBackend, reader backend that can open signals (auto, adi or registered backend)
+    line_freq : float, line noise frequency (Hz, 50 or 60)
+    flat_tolerance : float, maximum difference between flat samples
+    progress : callable, called with (tasks done, total tasks)
+    cancel : threading.Event, qc stops when set
+
+    Raises
+    ------
+    ScanCancelled
+
+    Returns
+    -------
+    qc_df : pd.DataFrame, qc_columns with the index of index_df (NaN for empty segments)
+
+    """
+
+    plan = get_segment_plan(index_df, folder_path)
+    plan['sampling_rate'] = index_df['sampling_rate'].to_numpy(dtype = np.int64)
+    columns = ['channel_id', 'block', 'start_time', 'stop_time', 'row', 'sampling_rate']
+    tasks = [(file_path, segments, reader, line_freq, flat_tolerance)
+             for file_path, segments in get_file_tasks(plan, max_task_samples, columns)]
+
+    metrics = np.full((len(index_df), len(qc_columns)), np.nan)
+    metrics[:, qc_columns.index('nan_count')] = 0
+    for rows, values in run_tasks(tasks, read_file_qc, n_workers, progress, cancel):
+        if rows:
+            metrics[rows] = values
+
+    qc_df = pd.DataFrame(metrics, columns = qc_columns, index = index_df.index)
+    qc_df['nan_count'] = qc_df['nan_count'].astype(np.int64)
+
+    return qc_df
+
+
+def parse_qc_thresholds(texts:list):
+    """
+    Parse qc thresholds from text (metric=min:max, e.g. flat_fraction=:0.5 or rms=0.01:5)
+
+    Parameters
+    ----------
+    texts : list, of str
+
+    Returns
+    -------
+    thresholds : dict, metric -> [min, max] (None = no bound)
+
+    """
+
+    thresholds = {}
+    for text in texts:
+        metric, sep, bounds = text.partition('=')
+        if metric not in qc_columns or ':' not in bounds:
+            raise Exception('QC threshold -' + text + '- is not valid, use metric=min:max with metric one of '
+                            + ', '.join(qc_columns) + '.')
+        try:
+            thresholds[metric] = [float(x) if x.strip() else None for x in bounds.split(':', 1)]
+        except ValueError:
+            raise Exception('QC threshold -' + text + '- bounds are not numbers.')
+
+    return thresholds
+
+
+def get_qc_drop(qc_df, thresholds:dict):
+    """
+    Get rows with qc metrics outside of thresholds
+
+    Parameters
+    ----------
+    qc_df : pd.DataFrame, from get_signal_qc
+    thresholds : dict, metric -> [min, max] (None = no bound)
+
+    Returns
+    -------
+    drop_df : pd.DataFrame, bool column per metric (True = row is dropped)
+
+    """
+
+    drop_df = pd.DataFrame(index = qc_df.index)
+    for metric, (low, high) in thresholds.items():
+        if metric not in qc_columns:
+            raise Exception('QC metric -' + metric + '- is not supported, use ' + ', '.join(qc_columns) + '.')
+        values = qc_df[metric].to_numpy(dtype = np.float64)
+        drop = np.zeros(len(values), dtype = bool)
+        if low is not None:
+            drop |= values < low
+        if high is not None:
+            drop |= values > high
+        drop_df[metric] = drop
+
+    return drop_df
+
+
+def add_signal_qc(index_df, folder_path:str, thresholds:dict = default_qc_thresholds, n_workers:int = 1,
+                  reader:str = 'auto', line_freq:float = 60, flat_tolerance:float = 0, progress = None, cancel = None):
+    """
+    Add qc metrics to index and drop rows with metrics outside of thresholds
+
+    Parameters
+    ----------
+    index_df : pd.DataFrame, plan index
+    folder_path : str, data folder that was indexed
+    thresholds : dict, metric -> [min, max] (None = no bound, empty dict keeps all rows)
+    n_workers : int, number of worker processes reading files
+    reader : str or ReaderBackend, reader backend that can open signals
+    line_freq : float, line noise frequency (Hz)
+    flat_tolerance : float, maximum difference between flat samples
+    progress : callable, called with (tasks done, total tasks)
+    cancel : threading.Event, qc stops when set
+
+    Returns
+    -------
+    index_df : pd.DataFrame, index with qc columns (rows outside thresholds removed)
+    warning_str : str, string used for warning
+
+    """
+
+    qc_df = get_signal_qc(index_df, folder_path, n_workers, reader, line_freq, flat_tolerance, progress, cancel)
+    index_df = pd.concat([index_df.drop(columns = [col for col in qc_columns if col in index_df.columns]), qc_df],
+                         axis = 1)
+
+    # remove rows outside of thresholds
+    warning_str = ''
+    drop_df = get_qc_drop(qc_df, thresholds)
+    if drop_df.shape[1] != 0:
+        drop_mask = drop_df.to_numpy().any(axis = 1)
+        if drop_mask.any():
+            counts = ', '.join([metric + ': ' + str(n) for metric, n in drop_df.sum().items() if n > 0])
+            warning_str = 'Warning: QC dropped %d of %d rows (%s).' % (drop_mask.sum(), len(index_df), counts)
+        index_df = index_df[~drop_mask]
+
+    return index_df, warning_str
@@ -3,37 +3,179 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly
 import numpy as np
-import itertools
 ### --------------------------- ###
 
-def drawSankey(data):
-    
-    group_tree={col:{unique:len(data[col][data[col]==unique]) for unique in data[col].unique()} for col in data}
-    uniques=[[unique for unique in data[col].unique()] for col in data]
-    
-    
-    all_combo=[combo for col in range(1,len(uniques)+1) for combo in list(itertools.product(*uniques[:col]))]
-    value=[(data.iloc[:,:len(combo)]==combo).all(axis=1).sum() for combo in all_combo]  
-    
-    
-    labels=['Total']
-    source=[]
-    target=[]
-    multiplier=1 #number of repeats due to previous groups
-    k=0#cumulative multiplier (how many groups cames before this)
-    
-    for i,col in enumerate(group_tree):
-        list(itertools.product(*uniques[:1]))
-        labels+=list(group_tree[col].keys())*multiplier
-        k+=multiplier
-        target+=list(range(k,k+len(group_tree[col])*multiplier))
-        source+= [[t]*len(group_tree[col]) for t in range(k-multiplier,k)]
-        multiplier*=len(group_tree[col])
-        
-    source=[item for sublist in source for item in sublist]
-    custom=np.array(value)
-    colors=['rgb(250,250,250)' if value>=1 else 'lightgrey' for value in custom]
-    
+def count_unique(groups, values, n_groups:int):
+    """
+    Count distinct non-negative values per group
+
+    Parameters
+    ----------
+    groups : np.array, group index of each value
+    values : np.array, integer codes (negative codes are not counted)
+    n_groups : int
+
+    Returns
+    -------
+    counts : np.array, distinct values per group
+
+    """
+
+    # unique (group, value) pairs as one integer key
+    keep = values >= 0
+    n_values = int(values.max()) + 1 if keep.any() else 1
+    keys = np.unique(np.asarray(groups, dtype = np.int64)[keep] * n_values + values[keep])
+    return np.bincount(keys // n_values, minlength = n_groups)
+
+
+def get_tree_nodes(data, animal_id = None, count:str = 'rows', max_depth:int = None, min_size:int = 0,
+                   max_nodes:int = None, expanded = ()):
+    """
+    Get tree nodes from observed combinations of group values.
+    Children are ordered by parent and then by order of appearance of values in each column.
+    Children smaller than min_size are collapsed to one 'other' node per parent,
+    and nodes deeper than max_depth are only shown below expanded nodes.
+
+    Parameters
+    ----------
+    data : pd.DataFrame, group columns (tree levels in column order)
+    animal_id : pd.Series, animal id of each row (animals are not counted if None)
+    count : str, size used for min_size, 'rows' or 'animals'
+    max_depth : int, number of levels shown (all if None)
+    min_size : int, children below this size are collapsed to 'other'
+    max_nodes : int, levels that would exceed this number of nodes are only shown below expanded nodes
+        (no limit if None)
+    expanded : iterable, of node paths (tuples of group values) whose children are always shown
+
+    Returns
+    -------
+    nodes : pd.DataFrame, one row per node (first row is Total) with parent, label, path, depth,
+        rows, animals, other (collapsed children) and collapsed (children hidden)
+    truncated : bool, True if levels were not shown because of max_nodes
+
+    """
+
+    n_rows, n_levels = data.shape
+    max_depth = n_levels if max_depth is None else min(max_depth, n_levels)
+    expanded = set(tuple(path) for path in expanded)
+
+    # integer codes of group values ordered by appearance (-1 for missing values)
+    cats = []
+    for col in data.columns:
+        codes, uniques = pd.factorize(data[col])
+        cats.append(pd.Categorical.from_codes(codes, np.asarray(uniques, dtype = object)))
+    if animal_id is not None:
+        animal_codes = pd.factorize(animal_id)[0]
+
+    # total node
+    paths, parents, labels, depths, other = [()], [-1], ['Total'], [0], [False]
+    rows = [n_rows]
+    animals = count_unique(np.zeros(n_rows, dtype = np.int64), animal_codes, 1).tolist() if animal_id is not None else []
+    row_node = np.zeros(n_rows, dtype = np.int64)   # node of each row at current depth (-1 if not shown)
+    truncated = False
+
+    depth = 0
+    while depth < n_levels:
+
+        # parents whose children are shown
+        show = (np.array(depths) == depth) & ~np.array(other)
+        if depth >= max_depth:
+            show[show] = [paths[i] in expanded for i in np.nonzero(show)[0]]
+        child_rows = (row_node >= 0) & show[np.maximum(row_node, 0)] & (cats[depth].codes >= 0)
+        if not child_rows.any():
+            break
+
+        # count rows (and animals) of each observed parent and child value
+        combos = pd.DataFrame({'parent' : row_node[child_rows], 'code' : cats[depth].codes[child_rows]})
+        sizes = combos.groupby(['parent', 'code'], sort = True).size().rename('rows').to_frame()
+        combo_idx = sizes.index.get_indexer(pd.MultiIndex.from_arrays([combos['parent'], combos['code']]))
+        if animal_id is not None:
+            sizes['animals'] = count_unique(combo_idx, animal_codes[child_rows], len(sizes))
+        small = (sizes[count] < min_size).to_numpy()
+
+        # do not show level if it exceeds max_nodes
+        n_new = (~small).sum() + sizes.index.get_level_values('parent')[small].nunique()
+        if max_nodes is not None and len(paths) + n_new > max_nodes:
+            truncated = True
+            if depth >= max_depth:
+                break
+            # show only children of expanded nodes from this level on
+            max_depth = depth
+            continue
+
+        # add kept children and one 'other' node per parent
+        combo_node = np.zeros(len(sizes), dtype = np.int64)
+        combo_label = cats[depth].categories[sizes.index.get_level_values('code')].tolist()
+        for parent, idx in sizes.groupby(level = 'parent', sort = False).indices.items():
+            for j in idx[~small[idx]]:
+                combo_node[j] = len(paths)
+                paths.append(paths[parent] + (combo_label[j],))
+                parents.append(parent); labels.append(combo_label[j]); depths.append(depth + 1); other.append(False)
+            if small[idx].any():
+                combo_node[idx[small[idx]]] = len(paths)
+                paths.append(paths[parent] + ('other',))
+                parents.append(parent); labels.append('other'); depths.append(depth + 1); other.append(True)
+
+        # assign rows to new nodes
+        row_node = np.full(n_rows, -1, dtype = np.int64)
+        row_node[child_rows] = combo_node[combo_idx]
+
+        # count rows and animals of new nodes (exact for 'other' nodes)
+        n_prev = len(rows)
+        shown = row_node >= 0
+        rows.extend(np.bincount(row_node[shown], minlength = len(paths))[n_prev:].tolist())
+        if animal_id is not None:
+            animals.extend(count_unique(row_node[shown], animal_codes[shown], len(paths))[n_prev:].tolist())
+        depth += 1
+
+    nodes = pd.DataFrame({'parent' : parents, 'label' : labels, 'path' : paths, 'depth' : depths, 'rows' : rows})
+    if animal_id is not None:
+        nodes['animals'] = animals
+    nodes['other'] = other
+
+    # nodes with children that are not shown
+    has_children = np.zeros(len(nodes), dtype = bool)
+    has_children[nodes['parent'][1:]] = True
+    nodes['collapsed'] = (nodes['depth'] < n_levels) & ~nodes['other'] & ~has_children
+
+    return nodes, truncated
+
+
+def drawSankey(data, animal_id = None, count:str = 'rows', max_depth:int = None, min_size:int = 0,
+               max_nodes:int = None, expanded = ()):
+    """
+    Draw tree of groups from observed group combinations
+
+    Parameters
+    ----------
+    data : pd.DataFrame, group columns (tree levels in column order)
+    animal_id : pd.Series, animal id of each row, required to count animals
+    count : str, link width, 'rows' (index rows) or 'animals' (distinct animal ids)
+    max_depth, min_size, max_nodes, expanded : level of detail, see get_tree_nodes
+
+    Returns
+    -------
+    fig : go.Figure, node indices match rows of get_tree_nodes (used to expand nodes on click)
+
+    """
+
+    if count not in ('rows', 'animals'):
+        raise Exception('Count -' + count + '- is not supported, use rows or animals.')
+    if count == 'animals' and animal_id is None:
+        raise Exception('Animal ids are required to count animals.')
+
+    nodes, truncated = get_tree_nodes(data, animal_id, count, max_depth, min_size, max_nodes, expanded)
+    count_cols = ['rows', 'animals'] if animal_id is not None else ['rows']
+
+    # mark nodes that can be expanded
+    labels = [label + ' [+]' if collapsed else label for label, collapsed in zip(nodes['label'], nodes['collapsed'])]
+    node_data = nodes[count_cols].to_numpy().tolist()
+    link_data = node_data[1:]
+
+    # hover text
+    hover = 'Rows: %{customdata[0]}'
+    if animal_id is not None:
+        hover += '<br>Animals: %{customdata[1]}'
 
     fig = go.Figure(data=[go.Sankey(
         textfont = plotly.graph_objects.sankey.Textfont(size=18, color='black',family='Droid Serif'),
@@ -43,23 +185,27 @@ def drawSankey(data):
           thickness = 10,
           line = dict(color = 'black', width = 3),
           label = labels,
-          hovertemplate='Mice: %{value}<extra></extra>',
+          customdata = node_data,
+          hovertemplate = hover + '<extra></extra>',
           color = 'rgb(190,45,45)',
         ),
         link = dict(
           line = dict(color = 'rgb(130,130,130)', width = 3),
-          source = source, # indices correspond to labels, eg A1, A2, A1, B1, ...
-          target = target,
-          value = value,
-          customdata=custom,
-          hovertemplate=' %{source.label}->%{target.label} Mice: %{customdata}<extra></extra>',
-          color=colors
+          source = nodes['parent'][1:].tolist(), # indices correspond to labels, eg A1, A2, A1, B1, ...
+          target = list(range(1, len(nodes))),
+          value = nodes[count][1:].tolist(),
+          customdata = link_data,
+          hovertemplate = ' %{source.label}->%{target.label}<br>' + hover + '<extra></extra>',
+          color = 'rgb(250,250,250)'
       ))])
 
+    if truncated:
+        fig.update_layout(title_text = 'Deeper levels are hidden (too many groups), click nodes to expand')
+
     return fig
 
 if __name__ == '__main__':
     example_path=r'C:\Users\gweiss01\Documents\GitHub\SAKE\example_data\sankey_data.csv'
     data=pd.read_csv(example_path,index_col=0)
     fig = drawSankey(data)
-    plotly.offline.plot(fig)
\ No newline at end of file
+    plotly.offline.plot(fig)
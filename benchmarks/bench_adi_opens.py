@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Count labchart reader opens per file for AdiParse.get_all_file_properties.
+
+usage: python benchmarks/bench_adi_opens.py [n_files]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import time
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import fake_adi
+sys.modules['adi'] = fake_adi
+from backend.adi_parse import AdiParse
+### ------------------------------------###
+
+def main(n_files:int = 100):
+    
+    channel_structures = {4 : ['bla', 'pfc']}
+    with tempfile.TemporaryDirectory() as folder_path:
+        
+        # create fake files
+        paths = []
+        for i in range(n_files):
+            path = os.path.join(folder_path, '%d_wt.adicht' %i)
+            fake_adi.write_file(path, ['m_-%d-bla' %i, 'm_-%d-pfc' %i]*2, 
+                                comments = [['veh', 1000, -1], ['odor', 2000, 1]])
+            paths.append(path)
+        
+        # parse files
+        fake_adi.open_counts.clear()
+        start = time.perf_counter()
+        for path in paths:
+            AdiParse(path, channel_structures).get_all_file_properties()
+        elapsed = time.perf_counter() - start
+    
+    opens = sum(fake_adi.open_counts.values()) / n_files
+    print('files: %d, reader opens per file: %.1f, time per file: %.3f ms' 
+          % (n_files, opens, elapsed/n_files*1000))
+    return opens
+
+if __name__ == '__main__':
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    main(n_files)
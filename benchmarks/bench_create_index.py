@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark for create_index_array on synthetic file data.
+
+usage: python benchmarks/bench_create_index.py [n_rows ...]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import fake_adi
+sys.modules['adi'] = fake_adi
+from backend.filter_table import create_index_array, reverse_hot_encoding
+### ------------------------------------###
+
+# user table without comment and animal id rows
+user_data = pd.DataFrame([
+    ['total_channels', 'number', '16', 'drop-bla-drop-pfc', 'region', 'all'],
+    ['channel_name', 'contains', 'm_', 'male', 'sex', 'all'],
+    ['channel_name', 'contains', 'f_', 'female', 'sex', 'all'],
+    ['file_name', 'contains', '_wt', 'wildtype', 'genotype', 'all'],
+    ['file_name', 'contains', '_ko', 'knockout', 'genotype', 'all'],
+    ['file_name', 'contains', '_het', 'drop', 'genotype', 'all'],
+    ], columns = ['Source', 'Search Function', 'Search Value', 'Assigned Group Name', 'Category', 'Time Selection (sec)'])
+
+
+def make_file_data(n_rows:int, n_channels:int = 16, seed:int = 0):
+    """
+    Create synthetic file data with n_rows channels
+
+    Parameters
+    ----------
+    n_rows : int
+    n_channels : int, channels per file
+    seed : int
+
+    Returns
+    -------
+    file_data : pd.DataFrame
+
+    """
+    
+    rng = np.random.default_rng(seed)
+    n_files = int(np.ceil(n_rows / n_channels))
+    file_idx = np.repeat(np.arange(n_files), n_channels)[:n_rows]
+    channel_id = np.tile(np.arange(n_channels), n_files)[:n_rows]
+    genotype = rng.choice(['_wt', '_ko', '_het'], n_files)[file_idx]
+    sex = rng.choice(['m_', 'f_', 'x_'], n_rows)
+    animal = file_idx * 4 + channel_id // 4
+    
+    file_data = pd.DataFrame({
+        'channel_id' : channel_id,
+        'channel_name' : sex.astype(object) + '-' + animal.astype(str).astype(object) + '-',
+        'file_name' : pd.Series(file_idx).astype(str).to_numpy(dtype = object) + genotype + '.adicht',
+        'brain_region' : np.tile(['drop', 'bla', 'drop', 'pfc'], n_files * 4)[:n_rows],
+        'file_length' : 3600000,
+        'block' : 0,
+        'sampling_rate' : 1000,
+        'folder_path' : '',
+        'animal_id' : '-' + animal.astype(str).astype(object) + '-',
+        })
+    
+    return file_data
+
+
+def main(sizes:list):
+    
+    for n_rows in sizes:
+        file_data = make_file_data(n_rows)
+        logic = pd.DataFrame({'male': file_data.channel_name.str.startswith('m_'), 
+                              'female': file_data.channel_name.str.startswith('f_')})
+        
+        start = time.perf_counter()
+        reverse_hot_encoding(logic)
+        t_reverse = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        index_df, group_columns, warning_str = create_index_array(file_data, user_data)
+        t_index = time.perf_counter() - start
+        
+        print('rows: %d, reverse_hot_encoding: %.3f s, create_index_array: %.3f s, index rows: %d' 
+              % (n_rows, t_reverse, t_index, len(index_df)))
+
+if __name__ == '__main__':
+    sizes = [int(x) for x in sys.argv[1:]] if len(sys.argv) > 1 else [10000, 100000, 1000000]
+    main(sizes)
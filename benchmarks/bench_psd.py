@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Measure PSD stage throughput (segments per second) with an increasing number of worker processes,
+and compare with a per row loop (one Welch estimate per index row, file opened for each row).
+
+Uses fake labchart files with synthetic signals (see fake_adi).
+
+usage: python benchmarks/bench_psd.py [--files 16] [--channels 8] [--minutes 10] [--workers 1 2 4]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import fake_adi
+sys.modules['adi'] = fake_adi
+import pandas as pd
+from backend.power_spectra import WelchPSD, index_psd
+### ------------------------------------###
+
+def create_index(folder_path:str, n_files:int, n_channels:int, n_samples:int, fs:int):
+    """
+    Write fake labchart files and return index with one row per channel
+    """
+
+    rows = []
+    for i in range(n_files):
+        file_name = 'rec%d_wt.adicht' % i
+        fake_adi.write_file(os.path.join(folder_path, file_name), ['ch%d' % ch for ch in range(n_channels)],
+                            [n_samples], fs)
+        rows += [{'file_id' : len(rows), 'folder_path' : '', 'file_name' : file_name, 'channel_id' : ch,
+                  'block' : 0, 'sampling_rate' : fs, 'start_time' : 1, 'stop_time' : n_samples}
+                 for ch in range(n_channels)]
+    return pd.DataFrame(rows)
+
+
+def row_loop_psd(index_df, folder_path:str, window_sec:float):
+    """
+    Ad-hoc analysis loop (whole segment read and Welch estimate per row)
+    """
+
+    for row in index_df.itertuples():
+        channel = fake_adi.read_file(os.path.join(folder_path, row.file_name)).channels[row.channel_id]
+        welch = WelchPSD(row.sampling_rate, int(row.sampling_rate * window_sec))
+        welch.update(channel.get_data(row.block + 1, row.start_time, row.stop_time)[None, :])
+        welch.result()
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark PSD stage.')
+    parser.add_argument('--files', type = int, default = 16, help = 'number of files')
+    parser.add_argument('--channels', type = int, default = 8, help = 'channels per file')
+    parser.add_argument('--minutes', type = float, default = 10, help = 'recording length (min)')
+    parser.add_argument('--fs', type = int, default = 1000, help = 'sampling rate (Hz)')
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, 2, 4], help = 'worker processes')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        index_df = create_index(folder_path, args.files, args.channels, int(args.minutes * 60 * args.fs), args.fs)
+        n_rows = len(index_df)
+
+        start = time.perf_counter()
+        row_loop_psd(index_df, folder_path, 2.0)
+        loop_time = time.perf_counter() - start
+        print('row loop: %.1f segments/s' % (n_rows / loop_time))
+
+        for n_workers in args.workers:
+            start = time.perf_counter()
+            index_psd(index_df, folder_path, os.path.join(folder_path, 'psd'), n_workers)
+            elapsed = time.perf_counter() - start
+            print('psd stage (%d workers): %.1f segments/s, %.1fx' % (n_workers, n_rows / elapsed, loop_time / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+App cold start benchmark.
+
+Starts fresh python processes that import sake.py and serve the first page
+(index and layout) with the flask test client, then checks the median time
+against a budget and that heavy modules were not imported at startup.
+
+usage: python benchmarks/bench_startup.py [--repeats 5] [--budget 3.0] [--output results.json]
+
+Exit code is 1 if the budget is exceeded or heavy modules are imported at startup.
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import statistics
+### ------------------------------------###
+
+# app folder (sake.py loads assets and example data relative to it)
+app_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that should only be loaded on first use
+heavy_modules = ['pandas', 'plotly.graph_objects', 'adi', 'backend.filter_table', 'backend.tree',
+                 'backend.folder_watcher', 'backend.create_user_table']
+
+# code run in child process (prints json timings)
+child_code = '''
+import time
+start = time.perf_counter()
+import sys, json
+import sake
+imported = time.perf_counter()
+client = sake.app.server.test_client()
+status = [client.get('/').status_code, client.get('/_dash-layout').status_code]
+served = time.perf_counter()
+served_at = time.time()
+loaded = [name for name in %r if name in sys.modules]
+sake.warm_up()
+warm = time.perf_counter()
+print(json.dumps({'import' : imported - start, 'first_page' : served - start, 'status' : status,
+                  'heavy_modules' : loaded, 'warm_up' : warm - served, 'served_at' : served_at}))
+''' % (heavy_modules,)
+
+
+def run_once():
+    """
+    Start app in fresh process and measure time to first page
+
+    Returns
+    -------
+    result : dict, timings (s), response status and heavy modules loaded at startup
+
+    """
+
+    start = time.time()
+    output = subprocess.run([sys.executable, '-c', child_code], cwd = app_path, capture_output = True, text = True)
+    if output.returncode != 0:
+        raise Exception('App failed to start:\n' + output.stderr)
+
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['process_to_first_page'] = result.pop('served_at') - start
+    return result
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark SAKE Plan app cold start.')
+    parser.add_argument('--repeats', type = int, default = 5, help = 'number of app starts')
+    parser.add_argument('--budget', type = float, default = 3.0,
+                        help = 'maximum median seconds from process start to first page')
+    parser.add_argument('--output', default = None, help = 'json output path (printed if not set)')
+    args = parser.parse_args(argv)
+
+    results = [run_once() for i in range(max(args.repeats, 1))]
+    median = statistics.median(result['process_to_first_page'] for result in results)
+    heavy = sorted(set(name for result in results for name in result['heavy_modules']))
+    served = all(status == 200 for result in results for status in result['status'])
+    passed = median <= args.budget and not heavy and served
+
+    report = {'timestamp' : time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform' : platform.platform(),
+              'python' : platform.python_version(), 'budget' : args.budget,
+              'median_process_to_first_page' : median,
+              'median_import' : statistics.median(result['import'] for result in results),
+              'median_warm_up' : statistics.median(result['warm_up'] for result in results),
+              'heavy_modules_at_startup' : heavy, 'passed' : passed, 'results' : results}
+
+    if args.output is None:
+        print(json.dumps(report, indent = 2))
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+
+    print('first page: %.2f s (budget %.2f s), warm up: %.2f s, heavy modules at startup: %s -> %s' % (
+          median, args.budget, report['median_warm_up'], ', '.join(heavy) or 'none',
+          'passed' if passed else 'FAILED'), file = sys.stderr)
+
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
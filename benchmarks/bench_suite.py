@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite on synthetic cohorts (fake adi reader, runs on any OS).
+
+Times AdiParse, get_file_data, create_index_array, GetComments and drawSankey
+for each cohort size, measures memory of scan and index tables and writes the
+results as json.
+
+usage: python benchmarks/bench_suite.py [--sizes 10 100 1000] [--output results.json]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import fake_adi
+sys.modules['adi'] = fake_adi
+from benchmarks.synthetic import make_cohort, naming_schemes
+from backend.adi_parse import AdiParse
+from backend.filter_table import get_file_data, prepare_user_data, add_animal_id, create_index_array
+from backend.get_all_comments import GetComments
+### ------------------------------------###
+
+# default user data
+user_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'example_data', 'default_table_data.csv')
+
+
+def timed(func, *args, **kwargs):
+    """
+    Run function and measure wall time
+
+    Returns
+    -------
+    result : output of func
+    elapsed : float, seconds
+
+    """
+
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_size(folder_path:str, n_files:int, user_data, config:dict):
+    """
+    Generate cohort and time all stages
+
+    Parameters
+    ----------
+    folder_path : str, empty folder for cohort
+    n_files : int
+    user_data : pd.DataFrame, user table
+    config : dict, cohort settings (see make_cohort) and max_parse_files
+
+    Returns
+    -------
+    result : dict, sizes and timings (s)
+
+    """
+
+    file_paths, t_generate = timed(make_cohort, folder_path, n_files, config['channel_counts'],
+                                   config['record_length'], config['n_comments'], config['naming'],
+                                   seed = config['seed'])
+    user_data, channel_structures, _ = prepare_user_data(user_data)
+    timings = {}
+
+    # parse sample of files one by one
+    sample = file_paths[:config['max_parse_files']]
+    def parse_files():
+        for file_path in sample:
+            adi_parse = AdiParse(file_path, channel_structures)
+            adi_parse.get_all_file_properties()
+            adi_parse.get_comments()
+    _, elapsed = timed(parse_files)
+    timings['adi_parse_per_file'] = elapsed / max(len(sample), 1)
+
+    # scan folder
+    (file_data, comment_data), timings['get_file_data'] = timed(get_file_data, folder_path, channel_structures)
+    (file_data, user_data, _), timings['add_animal_id'] = timed(add_animal_id, file_data, user_data)
+
+    # comments on index rows before drop rows are removed
+    user_data_use = user_data[user_data['Assigned Group Name'] != 'drop']
+    index_df = pd.DataFrame({'animal_id' : file_data['animal_id'], 'sampling_rate' : file_data['sampling_rate']})
+    index_df['start_time'] = 1
+    index_df['stop_time'] = file_data['file_length'].to_numpy()
+    def get_comments():
+        obj = GetComments(comment_data, user_data_use, 'comment_text', 'comment_time')
+        return obj.add_comments_to_index(index_df)
+    _, timings['get_comments'] = timed(get_comments)
+
+    # full index
+    (index_table, group_columns, _), timings['create_index_array'] = timed(create_index_array, file_data,
+                                                                             user_data, comment_data)
+    index_df, timings['materialize_index'] = timed(index_table.to_frame)
+
+    # tree plot (imported here so that the suite runs without plotly)
+    try:
+        from backend.tree import drawSankey
+        _, timings['draw_sankey'] = timed(drawSankey, index_table[group_columns], index_table['animal_id'])
+    except ImportError:
+        timings['draw_sankey'] = None
+
+    # memory of scan and index tables and of flat dataframes with one row per channel/index row (MB)
+    memory = {'file_data' : file_data.memory_usage().sum() / 1024**2,
+              'comment_data' : comment_data.memory_usage(deep = True).sum() / 1024**2,
+              'index_table' : index_table.memory_usage().sum() / 1024**2,
+              'flat_file_data' : file_data.to_frame().memory_usage(deep = True).sum() / 1024**2,
+              'flat_index' : index_df.memory_usage(deep = True).sum() / 1024**2}
+
+    return {'n_files' : n_files, 'n_channels' : len(file_data), 'n_comments' : len(comment_data),
+            'n_index_rows' : len(index_table), 'generate' : t_generate, 'timings' : timings, 'memory_mb' : memory}
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark SAKE Plan on synthetic labchart cohorts.')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [10, 100, 1000, 10000, 100000],
+                        help = 'number of files per cohort')
+    parser.add_argument('--channels', type = int, nargs = '+', default = [12, 16], help = 'total channels per file')
+    parser.add_argument('--record-length', type = int, nargs = 2, default = [5000000, 9000000],
+                        help = 'min and max samples per file')
+    parser.add_argument('--comments', type = int, nargs = 2, default = [0, 4], help = 'min and max comments per file')
+    parser.add_argument('--naming', choices = list(naming_schemes), default = 'default', help = 'naming scheme')
+    parser.add_argument('--max-parse-files', type = int, default = 1000, help = 'files parsed one by one with AdiParse')
+    parser.add_argument('--user-data', default = user_data_path, help = 'user data csv')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--workdir', default = None, help = 'folder for generated cohorts (temporary if not set)')
+    parser.add_argument('--output', default = None, help = 'json output path (printed if not set)')
+    args = parser.parse_args(argv)
+
+    config = {'channel_counts' : args.channels, 'record_length' : args.record_length, 'n_comments' : args.comments,
+              'naming' : args.naming, 'max_parse_files' : args.max_parse_files, 'seed' : args.seed,
+              'user_data' : os.path.basename(args.user_data)}
+    user_data = pd.read_csv(args.user_data)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix = 'sake_bench_')
+    results = []
+    try:
+        for n_files in args.sizes:
+            folder_path = os.path.join(workdir, 'cohort_%d' % n_files)
+            shutil.rmtree(folder_path, ignore_errors = True)
+            result = run_size(folder_path, n_files, user_data, config)
+            results.append(result)
+            print('files: %d, %s' % (n_files, ', '.join('%s: %.3f s' % (k, v) for k, v in result['timings'].items()
+                                                         if v is not None)), file = sys.stderr)
+            shutil.rmtree(folder_path, ignore_errors = True)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors = True)
+
+    report = {'timestamp' : time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform' : platform.platform(),
+              'python' : platform.python_version(), 'numpy' : np.__version__, 'pandas' : pd.__version__,
+              'config' : config, 'results' : results}
+
+    if args.output is None:
+        print(json.dumps(report, indent = 2))
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent = 2)
+
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Compare folder enumeration with os.walk and the concurrent scandir walker.
+
+Creates a tree of subfolders with labchart files and adds a fixed delay to each
+folder listing to simulate a network share (SMB) round trip.
+
+usage: python benchmarks/bench_walk.py [--folders 500] [--files 4] [--latency 5] [--threads 8]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend import file_walker
+### ------------------------------------###
+
+def create_tree(folder_path:str, n_folders:int, n_files:int):
+    """
+    Create nested folders (two levels) with empty labchart files and other files
+    """
+
+    for i in range(n_folders):
+        path = os.path.join(folder_path, 'group%d' % (i % 10), 'animal%d' % i)
+        os.makedirs(path)
+        for j in range(n_files):
+            open(os.path.join(path, 'rec%d_wt.adicht' % j), 'w').close()
+        open(os.path.join(path, 'rec0_wt.adicht.bak'), 'w').close()
+
+
+def walk_files(folder_path:str):
+    """
+    Previous enumeration (sorted os.walk with substring filter and one stat per file)
+    """
+
+    file_entries = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for file in sorted(filter(lambda k: '.adicht' in k, files)):
+            stat = os.stat(os.path.join(root, file))
+            file_entries.append((root, file, (stat.st_size, stat.st_mtime_ns)))
+    return file_entries
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Benchmark folder enumeration.')
+    parser.add_argument('--folders', type = int, default = 500, help = 'number of subfolders')
+    parser.add_argument('--files', type = int, default = 4, help = 'labchart files per subfolder')
+    parser.add_argument('--latency', type = float, default = 5, help = 'delay per folder listing (ms)')
+    parser.add_argument('--threads', type = int, default = file_walker.walk_threads, help = 'walker threads')
+    args = parser.parse_args(argv)
+
+    # add delay to folder listing (used by os.walk and the walker)
+    scandir = os.scandir
+    def slow_scandir(path):
+        time.sleep(args.latency / 1000)
+        return scandir(path)
+    os.scandir = slow_scandir
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        create_tree(folder_path, args.folders, args.files)
+
+        start = time.perf_counter()
+        walked = walk_files(folder_path)
+        walk_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        entries = file_walker.get_file_entries(folder_path, args.threads)
+        scandir_time = time.perf_counter() - start
+
+    os.scandir = scandir
+    print('os.walk: %d entries in %.2f s (.bak files included), scandir walker (%d threads): %d files in %.2f s, %.1fx' % (
+          len(walked), walk_time, args.threads, len(entries), scandir_time, walk_time / scandir_time))
+
+if __name__ == '__main__':
+    main()
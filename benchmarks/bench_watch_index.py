@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Check and time incremental updates of a watched folder index (WatchedIndex.update)
+against a fresh full build after files are added, modified and deleted.
+
+The added file has comments at positions not used by other files, so comment group
+numbers (e.g. baseline1) of the whole cohort have to be ranked again.
+
+usage: python benchmarks/bench_watch_index.py [--files 200] [--seed 0]
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import pandas as pd
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks import fake_adi
+sys.modules['adi'] = fake_adi
+from benchmarks.synthetic import make_cohort
+from backend.filter_table import prepare_user_data
+from backend.folder_watcher import FolderWatcher, WatchedIndex
+### ------------------------------------###
+
+# default user data
+user_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'example_data', 'default_table_data.csv')
+
+
+def add_shifted_file(file_path:str, template_path:str):
+    """
+    Write labchart file with the channels of template and comments at new positions
+    (unmatched comments before matched ones)
+    """
+
+    with open(template_path, 'r') as file:
+        spec = json.load(file)
+    length, fs = spec['record_lengths'][0], spec['fs']
+    comments = [['other', (i + 1) * 60 * fs, -1] for i in range(9)] + [['veh', length // 2, -1]]
+    fake_adi.write_file(file_path, spec['channel_names'], spec['record_lengths'], fs, comments)
+
+
+def compare(watcher:FolderWatcher, watched_index:WatchedIndex, file_paths:list, user_data):
+    """
+    Update changed files and compare with a fresh build
+
+    Returns
+    -------
+    result : dict, update and build seconds, rows and equal
+
+    """
+
+    watcher.update_paths(file_paths)
+    start = time.perf_counter()
+    index_df = watched_index.update()[0]
+    update_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fresh = WatchedIndex(watcher, user_data)
+    fresh.build()
+    build_time = time.perf_counter() - start
+    fresh_df = fresh.update()[0]
+
+    return {'update_seconds' : update_time, 'build_seconds' : build_time, 'rows' : len(index_df),
+            'equal' : index_df.equals(fresh_df)}
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Check incremental index of watched folder against full build.')
+    parser.add_argument('--files', type = int, default = 200, help = 'number of files in cohort')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed of cohort')
+    args = parser.parse_args(argv)
+
+    user_data, channel_structures, _ = prepare_user_data(pd.read_csv(user_data_path).to_dict('records'))
+    folder_path = tempfile.mkdtemp()
+    try:
+        file_paths = make_cohort(folder_path, args.files, n_comments = [1, 4], seed = args.seed)
+        watcher = FolderWatcher(folder_path, channel_structures, use_inotify = False)
+        watcher.scan()
+        watched_index = WatchedIndex(watcher, user_data)
+        watched_index.build()
+
+        # add file with new comment positions, modify and delete files
+        new_path = os.path.join(os.path.dirname(file_paths[0]), 'zz_new_ko.adicht')
+        add_shifted_file(new_path, file_paths[0])
+        results = {'add' : compare(watcher, watched_index, [new_path], user_data)}
+        shutil.copy(file_paths[2], file_paths[1])
+        results['modify'] = compare(watcher, watched_index, [file_paths[1]], user_data)
+        os.remove(file_paths[3])
+        results['delete'] = compare(watcher, watched_index, [file_paths[3]], user_data)
+        os.remove(new_path)
+        results['delete added'] = compare(watcher, watched_index, [new_path], user_data)
+    finally:
+        shutil.rmtree(folder_path, ignore_errors = True)
+
+    for name, result in results.items():
+        print('%-12s rows: %6d, update: %.3f s, full build: %.3f s, equal: %s' % (name, result['rows'],
+              result['update_seconds'], result['build_seconds'], result['equal']))
+
+    passed = all(result['equal'] for result in results.values())
+    print('incremental index ' + ('passed' if passed else 'FAILED'), file = sys.stderr)
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in for the adi-reader module used for benchmarking on any OS.
+
+Fake labchart files are small json files that describe the recording.
+Channel data are synthetic signals computed from the sample position
+(sine wave, 60 Hz line noise and pseudo random noise, see get_signal).
+Import this module and register it as 'adi' before importing the backend:
+
+    import sys
+    from benchmarks import fake_adi
+    sys.modules['adi'] = fake_adi
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import json
+from collections import Counter
+import numpy as np
+### ------------------------------------###
+
+# default synthetic signal parameters (can be set per channel in the file spec)
+default_signal = {'freq' : 8.0, 'amp' : 1.0, 'line_noise' : 0.1, 'noise' : 0.2, 'offset' : 0.0,
+                  'clip' : None, 'flat' : None, 'nan' : None}
+
+# number of read_file calls per file path
+open_counts = Counter()
+
+
+class Comment:
+    """
+    Labchart comment (text, tick position and channel, -1 for all channels).
+    """
+    
+    def __init__(self, text, tick_position, channel_):
+        self.text = text
+        self.tick_position = tick_position
+        self.channel_ = channel_
+
+
+class Record:
+    """
+    Labchart record (block) holding comments.
+    """
+    
+    def __init__(self, comments):
+        self.comments = comments
+
+
+def get_signal(params:dict, fs:float, seed:int, start:int, stop:int):
+    """
+    Get synthetic signal of sample positions start to stop (0-based, stop excluded).
+    Values depend only on the position, so any chunk of a recording gives the same samples.
+
+    Parameters
+    ----------
+    params : dict, signal parameters (see default_signal), flat and nan are [start, stop] sample ranges
+    fs : float, sampling rate
+    seed : int, noise seed
+    start : int
+    stop : int
+
+    Returns
+    -------
+    data : np.array
+
+    """
+
+    n = np.arange(start, stop, dtype = np.float64)
+    t = n / fs
+    noise = np.modf(np.sin(n * 12.9898 + seed * 78.233) * 43758.5453)[0] * 2
+    data = (params['amp'] * np.sin(2 * np.pi * params['freq'] * t) +
+            params['line_noise'] * np.sin(2 * np.pi * 60 * t) + params['noise'] * noise + params['offset'])
+
+    if params['clip'] is not None:
+        data = np.clip(data, -params['clip'], params['clip'])
+    for key, value in (('flat', 0.0), ('nan', np.nan)):
+        if params[key] is not None:
+            data[max(params[key][0] - start, 0):max(params[key][1] - start, 0)] = value
+
+    return data
+
+
+class Channel:
+    """
+    Labchart channel with name, samples per record and sampling period per record.
+    """
+    
+    def __init__(self, name, n_samples, tick_dt, signal:dict = {}, seed:int = 0):
+        self.name = name
+        self.n_samples = n_samples
+        self.tick_dt = tick_dt
+        self.signal = dict(default_signal, **signal)
+        self.seed = seed
+
+    def get_data(self, record_id:int, start_sample:int = 1, stop_sample:int = None):
+        """
+        Get synthetic samples of record (record_id and samples start at 1, stop_sample is included,
+        samples beyond the record are not returned)
+        """
+
+        n_samples = self.n_samples[record_id - 1]
+        stop_sample = n_samples if stop_sample is None else min(stop_sample, n_samples)
+        return get_signal(self.signal, 1 / self.tick_dt[record_id - 1], self.seed, start_sample - 1, stop_sample)
+
+
+class File:
+    """
+    Labchart file read object.
+    """
+    
+    def __init__(self, spec:dict):
+        
+        self.n_records = len(spec['record_lengths'])
+        self.n_channels = len(spec['channel_names'])
+        signals = spec.get('signals', [{}] * self.n_channels)
+        self.channels = [Channel(name, spec['record_lengths'], [1/spec['fs']]*self.n_records, signals[i], i)
+                         for i, name in enumerate(spec['channel_names'])]
+        comments = [Comment(*com) for com in spec['comments']]
+        self.records = [Record(comments)] + [Record([]) for i in range(self.n_records-1)]
+
+
+def read_file(file_path:str):
+    """
+    Read fake labchart file and count opens.
+
+    Parameters
+    ----------
+    file_path : str
+
+    Returns
+    -------
+    File
+
+    """
+    
+    open_counts[os.path.normcase(file_path)] += 1
+    with open(file_path, 'r') as f:
+        spec = json.load(f)
+    return File(spec)
+
+
+def write_file(file_path:str, channel_names:list, record_lengths:list = [3600000], 
+               fs:int = 4000, comments:list = [], signals:list = None):
+    """
+    Write fake labchart file.
+
+    Parameters
+    ----------
+    file_path : str
+    channel_names : list, channel names
+    record_lengths : list, samples per record
+    fs : int, sampling rate
+    comments : list, [text, tick_position, channel] per comment (-1 for all channels)
+    signals : list, synthetic signal parameters per channel (see default_signal)
+
+    Returns
+    -------
+    None.
+
+    """
+    
+    spec = {'channel_names' : channel_names, 'record_lengths' : record_lengths,
+            'fs' : fs, 'comments' : comments}
+    if signals is not None:
+        spec['signals'] = signals
+    with open(file_path, 'w') as f:
+        json.dump(spec, f)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Generate synthetic labchart cohorts (fake_adi files) for benchmarking.
+
+Channel and file names follow example_data/default_table_data.csv
+(animal id within '-', sex prefix m_/f_, genotype suffix _wt/_ko and
+total channels of 12 or 16), comments match its treatment rules.
+
+"""
+
+### ----------- IMPORTS --------------- ###
+import os
+import numpy as np
+from benchmarks import fake_adi
+### ------------------------------------###
+
+# brain regions per total channels (tiled over channels as in AdiParse.add_brain_region)
+channel_regions = {12 : ['bla', 'pfc', 'drop'], 16 : ['drop', 'bla', 'drop', 'pfc']}
+
+# comment texts (veh and odor are matched by default user data)
+comment_texts = ['veh', 'odor', 'other']
+
+
+def default_names(rng, file_idx:int, n_channels:int):
+    """
+    Short names, e.g. f000001_wt.adicht and m_-4-bla
+    """
+
+    file_name = 'f%06d%s.adicht' % (file_idx, rng.choice(['_wt', '_ko']))
+    regions = channel_regions.get(n_channels, ['x'])
+    channel_names = ['%s-%d-%s' % (rng.choice(['m_', 'f_']), file_idx * 4 + i // 4, regions[i % len(regions)])
+                     for i in range(n_channels)]
+    return file_name, channel_names
+
+
+def long_names(rng, file_idx:int, n_channels:int):
+    """
+    Long names with extra tokens, e.g. cohort3_day12_f000001_wt_session2.adicht and lfp_m_-4-bla_probe1_ref
+    """
+
+    file_name = 'cohort%d_day%d_f%06d%s_session%d.adicht' % (file_idx % 7, file_idx % 30, file_idx,
+                                                              rng.choice(['_wt', '_ko']), file_idx % 3)
+    channel_names = ['lfp_%s-%d-x_probe%d_ref' % (rng.choice(['m_', 'f_']), file_idx * 4 + i // 4, i % 4)
+                     for i in range(n_channels)]
+    return file_name, channel_names
+
+
+def unmatched_names(rng, file_idx:int, n_channels:int):
+    """
+    Names that mostly do not match user rules (no sex prefix or genotype, every other channel without animal id)
+    """
+
+    file_name = 'rec%06d.adicht' % file_idx
+    channel_names = [('ch%d' % i) if i % 2 else ('ch-%d-%d' % (file_idx, i)) for i in range(n_channels)]
+    return file_name, channel_names
+
+
+naming_schemes = {'default' : default_names, 'long' : long_names, 'unmatched' : unmatched_names}
+
+
+def make_comments(rng, n_comments:int, n_channels:int, record_length:int, fs:int):
+    """
+    Create random comments inside time selections of default user data (+-1200 s)
+
+    Returns
+    -------
+    comments : list, [text, tick_position, channel] per comment (-1 for all channels)
+
+    """
+
+    low = 1250 * fs
+    high = max(low + 1, record_length - 1250 * fs)
+    return [[str(rng.choice(comment_texts)), int(rng.integers(low, high)), int(rng.integers(-1, n_channels))]
+            for i in range(n_comments)]
+
+
+def make_cohort(folder_path:str, n_files:int, channel_counts:list = [12, 16], record_length:list = [5000000, 9000000],
+                n_comments:list = [0, 4], naming:str = 'default', fs:int = 1000, n_subfolders:int = 10, seed:int = 0):
+    """
+    Write synthetic cohort of fake labchart files
+
+    Parameters
+    ----------
+    folder_path : str
+    n_files : int
+    channel_counts : list, total channels of each file are drawn from this list
+    record_length : list, [min, max] samples per file
+    n_comments : list, [min, max] comments per file
+    naming : str, naming scheme (see naming_schemes)
+    fs : int, sampling rate
+    n_subfolders : int, files are spread over this number of subfolders
+    seed : int
+
+    Returns
+    -------
+    file_paths : list
+
+    """
+
+    if naming not in naming_schemes:
+        raise Exception('Naming scheme -' + naming + '- is not defined, use ' + ', '.join(naming_schemes) + '.')
+
+    rng = np.random.default_rng(seed)
+    n_subfolders = max(n_subfolders, 1)
+    file_paths = []
+    for i in range(n_files):
+        sub_folder = os.path.join(folder_path, 'sub%d' % (i % n_subfolders))
+        if i < n_subfolders:
+            os.makedirs(sub_folder, exist_ok = True)
+
+        n_channels = int(rng.choice(channel_counts))
+        length = int(rng.integers(record_length[0], record_length[-1] + 1))
+        file_name, channel_names = naming_schemes[naming](rng, i, n_channels)
+        comments = make_comments(rng, int(rng.integers(n_comments[0], n_comments[-1] + 1)), n_channels, length, fs)
+
+        file_path = os.path.join(sub_folder, file_name)
+        fake_adi.write_file(file_path, channel_names, [length], fs, comments)
+        file_paths.append(file_path)
+
+    return file_paths
@@ -16,6 +16,14 @@ layout1 =  html.Div(id = 'layout_channel', children=[
     # store session data (hidden)
     dcc.Store(id='user_df', storage_type = 'session'),
 
+    # background generate job id and progress polling (hidden)
+    dcc.Store(id='job_id_store'),
+    dcc.Interval(id='job_interval', interval = 500, disabled = True),
+
+    # folder watcher polling and version of shown data (hidden)
+    dcc.Interval(id='watch_interval', interval = 2000, disabled = True),
+    dcc.Store(id='watch_version_store'),
+
     # 0- alerts
     html.Div(id = 'alert_div', children =[ # show warnings
         
@@ -32,6 +40,8 @@ layout1 =  html.Div(id = 'layout_channel', children=[
 
         html.Div( id='generate_div', children=[
             html.Button('Generate', id='generate_button', n_clicks=0,   
+            ),
+            html.Button('Cancel', id='cancel_button', n_clicks=0,   
             ),]),
 
         html.Div(id='data_path_main_div', children = [ 
@@ -42,8 +52,50 @@ layout1 =  html.Div(id = 'layout_channel', children=[
             dcc.Upload( id='upload_data', accept = '.csv', children = (html.Button('load_settings', id='load_settings', n_clicks=0))),
         ]),
 
+        html.Div( id='scan_options_div', children=[ # parallel scan settings
+            html.Label('workers', htmlFor='n_workers_input'),
+            dcc.Input(id='n_workers_input', type='number', min=1, step=1, value=1),
+            html.Label('chunk size', htmlFor='chunksize_input'),
+            dcc.Input(id='chunksize_input', type='number', min=1, step=1, value=1),
+            html.Label('reader', htmlFor='reader_dropdown'),
+            dcc.Dropdown(id='reader_dropdown', options=[{'label': 'auto (sidecar if present)', 'value': 'auto'},
+                                                        {'label': 'adi', 'value': 'adi'},
+                                                        {'label': 'sidecar', 'value': 'sidecar'}],
+                         value='auto', clearable=False),
+            dcc.Checklist(id='rebuild_cache_check', options=[{'label': 'rebuild cache', 'value': 'rebuild'}], 
+                          value=[], labelStyle={'display': 'inline-block'}),
+            dcc.Checklist(id='watch_folder_check', options=[{'label': 'watch folder', 'value': 'watch'}], 
+                          value=[], labelStyle={'display': 'inline-block'}),
+            dcc.Checklist(id='trace_memory_check', options=[{'label': 'trace memory', 'value': 'trace'}], 
+                          value=[], labelStyle={'display': 'inline-block'}),
+            html.Button('clear cached scans', id='clear_scan_cache_button', n_clicks=0),
+            html.Span(id='scan_cache_message'),
+        ]),
+
+        html.Div( id='export_options_div', children=[ # index export format
+            dcc.RadioItems(id='export_format_radio', options=[{'label': 'csv', 'value': 'csv'},
+                                                             {'label': 'parquet', 'value': 'parquet'},
+                                                             {'label': 'arrow', 'value': 'arrow'}],
+                           value='csv', labelStyle={'display': 'inline-block'}),
+            dcc.Input(id='partition_input', type='text', placeholder='partition by (e.g. brain_region, animal_id)'),
+        ]),
+
     ]),
 
+    # generate job progress and cancel message
+    html.Div(id = 'progress_div',
+    ),
+    html.Span(id = 'cancel_message',
+    ),
+
+    # scan status (e.g. using cached scan)
+    html.Div(id = 'scan_status_div',
+    ),
+
+    # time and memory of each index stage (collapsible)
+    html.Div(id = 'profile_div',
+    ),
+
     # generate example channel name
     html.Div(id = 'channel_name',
     ),
@@ -78,6 +130,19 @@ layout1 =  html.Div(id = 'layout_channel', children=[
     html.Div(id = 'drop_message', children =[ "Drop Channel keyword = 'drop'"]
     ),
 
+    # tree diagram link width (index rows or distinct animals)
+    dcc.RadioItems(id='sankey_count_radio', options=[{'label': 'count rows', 'value': 'rows'},
+                                                    {'label': 'count animals', 'value': 'animals'}],
+                   value='rows', labelStyle={'display': 'inline-block'}),
+
+    # tree diagram level of detail (deeper nodes are expanded on click)
+    html.Div(id='tree_options_div', children=[
+        html.Label('tree depth', htmlFor='tree_depth_input'),
+        dcc.Input(id='tree_depth_input', type='number', min=1, step=1, value=4),
+        html.Label('min group size', htmlFor='min_group_input'),
+        dcc.Input(id='min_group_input', type='number', min=0, step=1, value=0),
+    ]),
+
     # tree group diagram
      html.Div(id='tree_plot_div', children=[
      ]),
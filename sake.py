@@ -1,26 +1,72 @@
 ### ---------------------------- Imports ---------------------------- ###
 import os
-import pandas as pd
+import time
+import socket
+import importlib
+import threading
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 
 # User Defined #
+# (pandas, plotly, adi and the index backend are imported on first use, see warm_up)
 from app import app
 from layouts import layout1
 import dash_bootstrap_components as dbc
-from backend.create_user_table import dashtable, add_row
-from backend.tree import drawSankey
-from backend.filter_table import get_index_array
+from backend.export_index import get_index_bytes
+from backend.metadata_cache import MetadataCache
+from backend.scan_cache import ScanCache, normalize_folder_path
+from backend.jobs import JobManager
+from backend.profiler import StageProfiler, profile_stage
 import user_data_mod
 ### ----------------------------------------------------------------- ###
 
 # init dash app with css style sheets
 # apply general css styling
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
-app = dash.Dash(__name__, external_stylesheets = external_stylesheets)
+app = dash.Dash(__name__, external_stylesheets = external_stylesheets, suppress_callback_exceptions = True)
 app.server.secret_key = os.urandom(24)
 
+# persistent cache of labchart file properties
+metadata_cache = MetadataCache()
+
+# in-memory cache of scanned folders shared across sessions
+scan_cache = ScanCache()
+
+# background generate jobs
+job_manager = JobManager()
+
+# watcher of last generated folder and user data used to index it
+folder_watch = {'watcher' : None, 'index' : None, 'tree_options' : {}}
+
+# maximum number of tree plot nodes sent to browser
+max_tree_nodes = 500
+
+# data and level of detail of shown tree plot
+tree_state = {'data' : None, 'animal_id' : None, 'options' : {}, 'expanded' : set()}
+
+# modules imported in background after app start (slow imports that are not needed to serve the first page)
+warm_up_modules = ['pandas', 'backend.create_user_table', 'backend.filter_table', 'backend.folder_watcher',
+                   'backend.tree', 'plotly.graph_objects']
+
+
+def warm_up():
+    """
+    Import heavy modules so that first table update and first Generate do not wait for them
+    (runs in background thread, import errors are raised again on first use)
+
+    Returns
+    -------
+    None.
+
+    """
+
+    for name in warm_up_modules:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
 # Define main layout
 app.layout = html.Div(children = [
     
@@ -36,6 +82,7 @@ app.layout = html.Div(children = [
     )
 def update_user_data(table_data):
     
+    import pandas as pd
     df = pd.DataFrame(table_data)
 
     # get channel strings
@@ -70,6 +117,9 @@ def update_user_data(table_data):
     )
 def update_usertable(n_clicks, upload_contents, session_user_data):
 
+    import pandas as pd
+    from backend.create_user_table import dashtable, add_row
+
     # get context
     ctx = dash.callback_context
     
@@ -80,13 +130,13 @@ def update_usertable(n_clicks, upload_contents, session_user_data):
     else:
         if session_user_data == None:   # if new user session
             # get default dataframe
-            df = user_data_mod.original_user_data
+            df = user_data_mod.get_original_user_data()
         else:                           # load user input from current session
             # get data from user datatable
             df = pd.read_json(session_user_data, orient='split')
 
     # convert user data in dashtable format
-    dash_cols, df, drop_dict = dashtable(df[user_data_mod.original_user_data.columns]) 
+    dash_cols, df, drop_dict = dashtable(df[user_data_mod.get_user_data_columns()]) 
 
     if n_clicks > 0: # Add rows when button is clicked
         df = add_row(df)
@@ -94,69 +144,521 @@ def update_usertable(n_clicks, upload_contents, session_user_data):
     return dash_cols, df.to_dict('records'), True, drop_dict
 
 
-# Retrieve path and plot tree diagram
+### ---------- Clear scan cache --------- ###
+@app.callback(
+    Output('scan_cache_message', 'children'),
+    [Input('clear_scan_cache_button', 'n_clicks')],
+    )
+def clear_scan_cache(n_clicks):
+
+    if n_clicks == 0:
+        return None
+
+    scan_cache.invalidate()
+    return 'cached scans cleared'
+
+
+def set_folder_watcher(watcher = None, watched_index = None, tree_options:dict = {}):
+    """
+    Replace folder watcher (previous watcher is stopped)
+
+    Parameters
+    ----------
+    watcher : FolderWatcher, scanned watcher to start (no folder is watched if None)
+    watched_index : WatchedIndex, index of watched folder
+    tree_options : dict, tree plot options (see get_tree_outputs)
+
+    Returns
+    -------
+    None.
+
+    """
+
+    if folder_watch['watcher'] is not None:
+        folder_watch['watcher'].stop()
+
+    folder_watch['watcher'] = watcher
+    folder_watch['index'] = watched_index
+    folder_watch['tree_options'] = tree_options
+    if watcher is not None:
+        watcher.start()
+
+
+def get_watched_index(folder_path:str, user_data, reader:str):
+    """
+    Get index of watched folder if folder is watched with the same user data and reader
+
+    Parameters
+    ----------
+    folder_path : str
+    user_data : pd.DataFrame, from prepare_user_data
+    reader : str, reader backend
+
+    Returns
+    -------
+    watched_index : WatchedIndex or None
+
+    """
+
+    watcher, watched_index = folder_watch['watcher'], folder_watch['index']
+    if watcher is None or watched_index is None:
+        return None
+    if watcher.folder_path != normalize_folder_path(folder_path) or watcher.reader != reader:
+        return None
+    if not watched_index.user_data.equals(user_data):
+        return None
+
+    return watched_index
+
+
+def draw_tree():
+    """
+    Draw tree plot from tree_state
+
+    Returns
+    -------
+    fig : go.Figure
+
+    """
+
+    from backend.tree import drawSankey
+
+    options = tree_state['options']
+    return drawSankey(tree_state['data'], tree_state['animal_id'], options.get('count', 'rows'),
+                      options.get('max_depth'), options.get('min_size', 0), max_tree_nodes, tree_state['expanded'])
+
+
+def get_tree_options(count, max_depth, min_size):
+    """
+    Get tree plot options from app inputs
+
+    Parameters
+    ----------
+    count : str, tree plot link width ('rows' or 'animals')
+    max_depth : int, number of shown levels (None for all)
+    min_size : int, groups below this size are collapsed to 'other'
+
+    Returns
+    -------
+    tree_options : dict
+
+    """
+
+    return {'count' : count or 'rows', 'max_depth' : int(max_depth) if max_depth else None,
+            'min_size' : int(min_size or 0)}
+
+
+def get_tree_outputs(index_table, group_names:list, warning_str:str, tree_options:dict = {}, keep_expanded:bool = False,
+                     profiler = None):
+    """
+    Create warning and tree plot from index
+
+    Parameters
+    ----------
+    index_table : IndexTable
+    group_names : list
+    warning_str : str
+    tree_options : dict, from get_tree_options
+    keep_expanded : bool, keep nodes expanded by user (e.g. when watched folder changes)
+    profiler : StageProfiler, records sankey stage if not None
+
+    Returns
+    -------
+    warning, fig : outputs of app components
+
+    """
+
+    # Get tree plot as dcc graph
+    tree_state['data'] = index_table[group_names]
+    tree_state['animal_id'] = index_table['animal_id']
+    tree_state['options'] = tree_options
+    if not keep_expanded:
+        tree_state['expanded'] = set()
+    with profile_stage(profiler, 'sankey', len(index_table)):
+        fig = dcc.Graph(id = 'tree_structure', figure = draw_tree())
+
+    # if warning_str set to none so that no warning is shown in sake app
+    if len(warning_str.strip()) == 0:
+        warning = None
+    else:
+        warning = dbc.Alert(id = 'alert_message', children = [str(warning_str)], color="warning", dismissable=True)
+
+    return warning, fig
+
+
+def format_profile(summary:dict):
+    """
+    Format stage breakdown and slowest files as collapsible panel
+
+    Parameters
+    ----------
+    summary : dict, from StageProfiler.get_summary
+
+    Returns
+    -------
+    details : html.Details
+
+    """
+
+    header = html.Tr([html.Th(x) for x in ['stage', 'time (s)', 'items', 'peak memory (MB)']])
+    rows = [html.Tr([html.Td(stage['stage']), html.Td('%.3f' % stage['seconds']),
+                     html.Td('' if stage['items'] is None else str(stage['items'])),
+                     html.Td('' if stage['peak_mb'] is None else '%.1f' % stage['peak_mb'])])
+            for stage in summary['stages']]
+    files = [html.Li('%.3f s  %s' % (file['seconds'], file['path'])) for file in summary['slowest_files']]
+
+    text = 'profile: %.2f s, %d files read' % (summary['total_seconds'], summary['files_read'])
+    return html.Details([html.Summary(text),
+                         html.Table([header] + rows, id = 'profile_table'),
+                         html.Div('slowest files' if files else 'no files were read (cached)'),
+                         html.Ul(files)])
+
+
+def generate_outputs(folder_path, user_data, n_workers, chunksize, rebuild_cache, watch_folder, tree_options,
+                     export_format, partition_cols, trace_memory = None, reader = None, progress = None, cancel = None):
+    """
+    Create index, tree plot and downloads (runs as background job)
+
+    Parameters
+    ----------
+    folder_path : str
+    user_data : list, user table records
+    n_workers : int, number of worker processes
+    chunksize : int, number of files sent to a worker at a time
+    rebuild_cache : list, clear caches if not empty
+    watch_folder : list, keep index and tree plot updated when files change if not empty
+    tree_options : dict, tree plot options (see get_tree_options)
+    export_format : str, index download format (csv, parquet or arrow)
+    partition_cols : str, comma separated columns used to partition index download
+    trace_memory : list, record peak memory of each stage if not empty
+    reader : str, reader backend (auto, adi or sidecar)
+    progress : callable, called with (files scanned, total files)
+    cancel : threading.Event, scan stops between files when set
+
+    Returns
+    -------
+    warning, fig, data, user_data_export, scan_status, watch_version, profile : outputs of app components
+
+    """
+
+    import pandas as pd
+    from backend.filter_table import get_scan_data, prepare_user_data, index_file_data
+    from backend.folder_watcher import FolderWatcher, WatchedIndex
+
+    profiler = StageProfiler(bool(trace_memory))
+    try:
+
+        # clear caches to force reading all files
+        if rebuild_cache:
+            metadata_cache.clear()
+            scan_cache.invalidate(folder_path)
+
+        # get grouped dataframe
+        watch_version = None
+        user_data_df, channel_structures, warning_str = prepare_user_data(user_data)
+        watched_index = None
+        if watch_folder and not rebuild_cache:
+            watched_index = get_watched_index(folder_path, user_data_df, reader or 'auto')
+
+        if watched_index is not None:
+            # folder is already watched, index is updated from changed files only
+            with profile_stage(profiler, 'watched index') as stage:
+                index_table, group_names, warning_add, watch_version = watched_index.update()
+                stage['items'] = len(index_table)
+            warning_str += warning_add
+            folder_watch['tree_options'] = tree_options
+            scan_status = 'watching folder for changes'
+        elif watch_folder:
+            # scan with folder watcher to update index when files change
+            watcher = FolderWatcher(folder_path, channel_structures, metadata_cache,
+                                    int(n_workers or 1), int(chunksize or 1), reader = reader or 'auto')
+            with profile_stage(profiler, 'watcher scan') as stage:
+                watcher.scan(progress, cancel)
+                stage['items'] = len(watcher.files)
+            watched_index = WatchedIndex(watcher, user_data_df)
+            index_table, group_names, warning_add, watch_version = watched_index.build(profiler)
+            warning_str += warning_add
+            set_folder_watcher(watcher, watched_index, tree_options)
+            scan_status = 'watching folder for changes'
+        else:
+            set_folder_watcher()
+            file_data, comment_data, scan_cached = get_scan_data(folder_path, channel_structures,
+                                                                 int(n_workers or 1), int(chunksize or 1),
+                                                                 metadata_cache, scan_cache, progress, cancel,
+                                                                 profiler, reader or 'auto')
+            index_table, group_names, warning_add = index_file_data(file_data, comment_data, user_data_df, profiler)
+            warning_str += warning_add
+            scan_status = 'using cached scan' if scan_cached else None
+
+        # get warning and tree plot
+        warning, fig = get_tree_outputs(index_table, group_names, warning_str, tree_options, profiler = profiler)
+
+        # send index for download (index dataframe is only materialized here, watched index is already a dataframe)
+        partition_cols = [col.strip().lower() for col in (partition_cols or '').split(',') if col.strip()]
+        index_df = index_table if isinstance(index_table, pd.DataFrame) else index_table.to_frame()
+        content, file_name = get_index_bytes(index_df, group_names, export_format or 'csv', partition_cols)
+        data = dcc.send_bytes(content, file_name)
+
+        # send user data for download
+        user_data = pd.DataFrame(user_data)
+        user_data = user_data[user_data_mod.get_user_data_columns()] 
+        user_data_export = dcc.send_data_frame(user_data.to_csv, 'user_data.csv', index = False)
+
+        # log stage breakdown
+        profiler.write_log(folder_path = folder_path, n_workers = int(n_workers or 1), rows = len(index_table))
+
+        return warning, fig, data, user_data_export, scan_status, watch_version, format_profile(profiler.get_summary())
+
+    except Exception as err:
+        warning = dbc.Alert(id = 'alert_message', children = ['   ' + str(err)], color="warning", dismissable=True) #, duration = 10000
+        return warning, None, None, None, None, None, None
+
+    finally:
+        profiler.stop()
+
+
+def update_watched_outputs():
+    """
+    Update index and tree plot from watched folder (only changed files are read by the watcher
+    and indexed again, index rows of other files are kept)
+
+    Returns
+    -------
+    warning, fig, scan_status, watch_version : outputs of app components
+
+    """
+
+    watcher = folder_watch['watcher']
+    try:
+        index_df, group_names, warning_str, watch_version = folder_watch['index'].update()
+        warning, fig = get_tree_outputs(index_df, group_names, warning_str, tree_state['options'], True)
+        scan_status = 'folder changed: index updated (%d channels), generate to download it' % len(index_df)
+    except Exception as err:
+        warning = dbc.Alert(id = 'alert_message', children = ['   ' + str(err)], color="warning", dismissable=True)
+        fig, scan_status, watch_version = None, None, watcher.version
+
+    return warning, fig, scan_status, watch_version
+
+
+def format_progress(progress:dict):
+    """
+    Format job progress for display
+
+    Parameters
+    ----------
+    progress : dict, from Job.get_progress
+
+    Returns
+    -------
+    children : list, of dash components
+
+    """
+
+    n_done, n_total = progress['n_done'], progress['n_total']
+    percent = 100 * n_done / n_total if n_total > 0 else 0
+    text = 'scanned %d/%d files, %.1f files/s' % (n_done, n_total, progress['rate'])
+    if progress['status'] == 'running':
+        if progress['eta'] is not None:
+            text += ', ETA %.0f s' % progress['eta']
+    else:
+        text += ', %s in %.1f s' % (progress['status'], progress['elapsed'])
+
+    return [dbc.Progress(value = percent, id = 'job_progress_bar'), html.Span(text)]
+
+
+# Start background job to retrieve path and plot tree diagram
+@app.callback(
+    [Output('job_id_store', 'data'),
+     Output('watch_interval', 'disabled')],
+    [Input('generate_button', 'n_clicks')],
+    [State('data_path_input', 'value'),
+    State('user_table', 'data'),
+    State('n_workers_input', 'value'),
+    State('chunksize_input', 'value'),
+    State('rebuild_cache_check', 'value'),
+    State('watch_folder_check', 'value'),
+    State('sankey_count_radio', 'value'),
+    State('tree_depth_input', 'value'),
+    State('min_group_input', 'value'),
+    State('export_format_radio', 'value'),
+    State('partition_input', 'value'),
+    State('trace_memory_check', 'value'),
+    State('reader_dropdown', 'value'),
+    State('job_id_store', 'data')],
+)
+def start_generate_job(n_clicks1, folder_path, user_data, n_workers, chunksize, rebuild_cache, watch_folder,
+                       count, max_depth, min_size, export_format, partition_cols, trace_memory, reader,
+                       previous_job_id):
+
+    # stop previous job
+    if previous_job_id is not None:
+        job_manager.cancel(previous_job_id)
+
+    if folder_path is None:
+        return None, True
+
+    job_id = job_manager.submit(generate_outputs, folder_path, user_data, n_workers, chunksize,
+                                rebuild_cache, watch_folder, get_tree_options(count, max_depth, min_size),
+                                export_format, partition_cols, trace_memory, reader)
+    return job_id, not watch_folder
+
+
+# Report job progress and pass results to app when job is finished
+# or update tree plot when watched folder changed
 @app.callback(
     [Output('alert_div', 'children'),
      Output('tree_plot_div', 'children'),
      Output('download_index_csv', 'data'),
-     Output('download_user_data_csv', 'data')],
-    [Input('generate_button', 'n_clicks')],
-    [State('data_path_input', 'value'),
-    State('user_table', 'data')],
+     Output('download_user_data_csv', 'data'),
+     Output('scan_status_div', 'children'),
+     Output('watch_version_store', 'data'),
+     Output('profile_div', 'children'),
+     Output('progress_div', 'children'),
+     Output('job_interval', 'disabled')],
+    [Input('job_interval', 'n_intervals'),
+     Input('job_id_store', 'data'),
+     Input('watch_interval', 'n_intervals')],
+    [State('watch_version_store', 'data')],
 )
-def update_output(n_clicks1, folder_path, user_data):
+def update_output(n_intervals, job_id, n_watch_intervals, watch_version):
 
-    try:
-        if folder_path is None:         
-            warning = None
-            fig = None
-            data = None
-            user_data_export = None
-        else:
+    no_results = (dash.no_update,) * 7
 
-            # get grouped dataframe
-            index_df, group_names, warning_str = get_index_array(folder_path, user_data)
+    # get context
+    ctx = dash.callback_context
 
-            # Get tree plot as dcc graph
-            fig = dcc.Graph(id = 'tree_structure', figure = drawSankey(index_df[group_names]))
+    # update tree plot if watched folder changed
+    if 'watch_interval' in ctx.triggered[0]['prop_id']:
+        watcher = folder_watch['watcher']
+        running = job_manager.get(job_id) is not None if job_id is not None else False
+        if running or watcher is None or watch_version is None or watcher.version == watch_version:
+            return no_results + (dash.no_update, dash.no_update)
+        warning, fig, scan_status, watch_version = update_watched_outputs()
+        return (warning, fig, dash.no_update, dash.no_update, scan_status, watch_version, dash.no_update,
+                dash.no_update, dash.no_update)
+
+    if job_id is None:
+        return (None,) * 7 + (None, True)
+
+    # job was already retrieved
+    job = job_manager.get(job_id)
+    if job is None:
+        return no_results + (dash.no_update, True)
+
+    # report progress while running
+    if job.status == 'running':
+        return no_results + (format_progress(job.get_progress()), False)
+
+    # pass results when finished
+    job_manager.pop(job_id)
+    if job.result is None:
+        warning = dbc.Alert(id = 'alert_message', children = ['   ' + str(job.error)], color="warning", dismissable=True)
+        results = (warning, None, None, None, None, None, None)
+    else:
+        results = job.result
 
-            # send index_df for download
-            data = dcc.send_data_frame(index_df.to_csv, 'index.csv', index = False)
+    return results + (format_progress(job.get_progress()), True)
 
-            # send user data for download
-            user_data = pd.DataFrame(user_data)
-            user_data = user_data[user_data_mod.original_user_data.columns] 
-            user_data_export = dcc.send_data_frame(user_data.to_csv, 'user_data.csv', index = False)
 
-            # if warning_str set to none so that no warning is shown in sake app
-            if len(warning_str.strip()) == 0:
-                warning = None
-            else:
-                warning = dbc.Alert(id = 'alert_message', children = [str(warning_str)], color="warning", dismissable=True)
+# Redraw tree plot when level of detail changes or a node is clicked (expand/collapse)
+@app.callback(
+    Output('tree_structure', 'figure'),
+    [Input('tree_structure', 'clickData'),
+     Input('sankey_count_radio', 'value'),
+     Input('tree_depth_input', 'value'),
+     Input('min_group_input', 'value')],
+    prevent_initial_call = True,
+)
+def update_tree(click_data, count, max_depth, min_size):
 
-        return warning, fig, data, user_data_export
+    from backend.tree import get_tree_nodes
 
-    except Exception as err:
-        warning = dbc.Alert(id = 'alert_message', children = ['   ' + str(err)], color="warning", dismissable=True) #, duration = 10000
-        return warning, None, None, None
+    if tree_state['data'] is None:
+        return dash.no_update
 
-# Automatic browser launch
-import webbrowser
-from threading import Timer
-def open_browser():
-      webbrowser.open('http://localhost:8050/', new = 2)
+    # get context
+    ctx = dash.callback_context
 
-if __name__ == '__main__':
-    Timer(1, open_browser).start()
-    app.run_server(debug = False,
-                    port = 8050,
-                    host = 'localhost',
-                   )
+    if 'clickData' in ctx.triggered[0]['prop_id']:
+
+        # only nodes have labels (links are ignored)
+        point = click_data['points'][0] if click_data else {}
+        if 'label' not in point or 'pointNumber' not in point:
+            return dash.no_update
+
+        # get path of clicked node from current tree
+        options = tree_state['options']
+        nodes, _ = get_tree_nodes(tree_state['data'], tree_state['animal_id'], options.get('count', 'rows'),
+                                  options.get('max_depth'), options.get('min_size', 0), max_tree_nodes,
+                                  tree_state['expanded'])
+        node = nodes.iloc[point['pointNumber']]
+
+        # expand collapsed node or collapse expanded node and its children
+        if node['collapsed']:
+            tree_state['expanded'].add(node['path'])
+        elif node['path'] in tree_state['expanded']:
+            tree_state['expanded'] = {path for path in tree_state['expanded'] if path[:len(node['path'])] != node['path']}
+        else:
+            return dash.no_update
+    else:
+        tree_state['options'] = get_tree_options(count, max_depth, min_size)
 
+    return draw_tree()
 
 
+# Cancel running job (stops between files)
+@app.callback(
+    Output('cancel_message', 'children'),
+    [Input('cancel_button', 'n_clicks'),
+     Input('job_id_store', 'data')],
+)
+def cancel_job(n_clicks, job_id):
+
+    # get context
+    ctx = dash.callback_context
 
+    if 'cancel_button' in ctx.triggered[0]['prop_id'] and job_id is not None:
+        job_manager.cancel(job_id)
+        return 'cancel requested'
 
+    return None
 
 
+# Automatic browser launch (as soon as server accepts connections)
+import webbrowser
+def wait_for_server(host:str, port:int, timeout:float = 10):
+    """
+    Wait until server accepts connections
+
+    Parameters
+    ----------
+    host : str
+    port : int
+    timeout : float, seconds
+
+    Returns
+    -------
+    ready : bool
+
+    """
+
+    end_time = time.time() + timeout
+    while time.time() < end_time:
+        try:
+            with socket.create_connection((host, port), timeout = 0.5):
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+def open_browser(host:str = 'localhost', port:int = 8050):
+      wait_for_server(host, port)
+      webbrowser.open('http://%s:%d/' % (host, port), new = 2)
 
+if __name__ == '__main__':
+    threading.Thread(target = warm_up, daemon = True).start()
+    threading.Thread(target = open_browser, args = ('localhost', 8050), daemon = True).start()
+    app.run_server(debug = False,
+                    port = 8050,
+                    host = 'localhost',
+                   )
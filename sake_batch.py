@@ -0,0 +1,264 @@
+### ---------------------------- Imports ---------------------------- ###
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+# User Defined # (backend only, no dash or plotly)
+from backend.filter_table import get_index_array
+from backend.metadata_cache import MetadataCache
+from backend.export_index import export_formats, write_index
+from backend.profiler import StageProfiler
+from backend.readers import reader_backends
+from backend.signal_qc import qc_columns, default_qc_thresholds, add_signal_qc, parse_qc_thresholds
+### ----------------------------------------------------------------- ###
+
+# columns of user data csv (same as example_data/default_table_data.csv)
+user_data_columns = ['Source', 'Search Function', 'Search Value', 'Assigned Group Name', 'Category',
+                     'Time Selection (sec)']
+
+
+def load_user_data(user_data_path:str):
+    """
+    Load user data csv
+
+    Parameters
+    ----------
+    user_data_path : str
+
+    Returns
+    -------
+    user_data : pd.DataFrame
+
+    """
+
+    # read all cells as text (same as the app table, e.g. animal id 001 stays 001 and empty cells stay empty)
+    user_data = pd.read_csv(user_data_path, dtype = str, keep_default_na = False)
+    missing = [col for col in user_data_columns if col not in user_data.columns]
+    if missing:
+        raise Exception('Columns -' + ', '.join(missing) + '- are missing from user data file ' + user_data_path + '.')
+
+    return user_data[user_data_columns]
+
+
+def get_output_names(folder_paths:list):
+    """
+    Get unique output folder name for each data folder
+
+    Parameters
+    ----------
+    folder_paths : list
+
+    Returns
+    -------
+    names : list
+
+    """
+
+    names = []
+    for folder_path in folder_paths:
+        name = os.path.basename(os.path.normpath(folder_path)) or 'root'
+        unique_name, i = name, 1
+        while unique_name in names:
+            i += 1
+            unique_name = name + '_' + str(i)
+        names.append(unique_name)
+
+    return names
+
+
+def index_folder(folder_path:str, user_data, output_path:str, n_workers:int = 1, chunksize:int = 1,
+                 use_cache:bool = True, file_format:str = 'csv', partition_cols:list = [], profile:bool = False,
+                 reader:str = 'auto', qc_thresholds:dict = None, line_freq:float = 60):
+    """
+    Create index of one folder and write index, user data and warnings to output_path
+
+    Parameters
+    ----------
+    folder_path : str
+    user_data : pd.DataFrame
+    output_path : str, output folder (created if missing)
+    n_workers : int, number of worker processes used to read files
+    chunksize : int, number of files sent to a worker at a time
+    use_cache : bool, use persistent file record cache
+    file_format : str, index format (csv, parquet or arrow)
+    partition_cols : list, columns used to partition index (parquet and arrow)
+    profile : bool, write time and peak memory of each stage and slowest files to profile.jsonl
+    reader : str, reader backend (auto, adi or sidecar)
+    qc_thresholds : dict, add signal qc metrics and drop rows outside of thresholds (no qc if None)
+    line_freq : float, line noise frequency of qc (Hz)
+
+    Returns
+    -------
+    result : dict, with folder, output, status (ok or error), rows, warnings, error and elapsed (s)
+
+    """
+
+    start_time = time.time()
+    result = {'folder' : folder_path, 'output' : output_path, 'status' : 'ok', 'rows' : 0,
+              'warnings' : '', 'error' : ''}
+
+    profiler = StageProfiler(trace_memory = True) if profile else None
+    try:
+        cache = MetadataCache() if use_cache else None
+        index_table, group_names, warning_str = get_index_array(folder_path, user_data.to_dict('records'),
+                                                                   n_workers, chunksize, cache, profiler = profiler,
+                                                                   reader = reader)
+
+        # add signal qc metrics (reads samples of all index rows)
+        index_df = index_table.to_frame()
+        if qc_thresholds is not None:
+            index_df, qc_warning = add_signal_qc(index_df, folder_path, qc_thresholds, n_workers, reader, line_freq)
+            warning_str += qc_warning
+
+        # write index, user data and warnings
+        os.makedirs(output_path, exist_ok = True)
+        index_name = 'index' if partition_cols else 'index' + export_formats[file_format]
+        write_index(index_df, group_names, os.path.join(output_path, index_name), file_format, partition_cols)
+        user_data.to_csv(os.path.join(output_path, 'user_data.csv'), index = False)
+        with open(os.path.join(output_path, 'warnings.txt'), 'w') as file:
+            file.write(warning_str)
+        if profiler is not None:
+            profiler.write_log(os.path.join(output_path, 'profile.jsonl'), folder_path = folder_path,
+                               n_workers = n_workers, rows = len(index_df))
+
+        result['rows'] = len(index_df)
+        result['warnings'] = warning_str
+
+    except Exception as err:
+        result['status'] = 'error'
+        result['error'] = str(err)
+
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+    result['elapsed'] = time.time() - start_time
+    return result
+
+
+def run_batch(folder_paths:list, user_data, output_dir:str, n_jobs:int = 1, n_workers:int = 1,
+              chunksize:int = 1, use_cache:bool = True, file_format:str = 'csv', partition_cols:list = [],
+              profile:bool = False, reader:str = 'auto', qc_thresholds:dict = None, line_freq:float = 60):
+    """
+    Index folders and write a summary of all folders to output_dir.
+    Folders are indexed in parallel processes if n_jobs > 1 (files of each folder are then read serially),
+    otherwise one folder at a time with n_workers processes reading files.
+
+    Parameters
+    ----------
+    folder_paths : list
+    user_data : pd.DataFrame
+    output_dir : str
+    n_jobs : int, number of folders indexed at a time
+    n_workers : int, number of worker processes used to read files (if n_jobs = 1)
+    chunksize : int, number of files sent to a worker at a time
+    use_cache : bool, use persistent file record cache
+    file_format : str, index format (csv, parquet or arrow)
+    partition_cols : list, columns used to partition index (parquet and arrow)
+    profile : bool, write stage profile of each folder (see index_folder)
+    reader : str, reader backend (auto, adi or sidecar)
+    qc_thresholds : dict, add signal qc metrics and drop rows outside of thresholds (no qc if None)
+    line_freq : float, line noise frequency of qc (Hz)
+
+    Returns
+    -------
+    summary : pd.DataFrame, one row per folder
+
+    """
+
+    output_paths = [os.path.join(output_dir, name) for name in get_output_names(folder_paths)]
+
+    results = []
+    def report(result):
+        results.append(result)
+        text = result['error'] if result['status'] == 'error' else '%d rows' % result['rows']
+        print('[%s] %s -> %s (%.1f s)' % (result['status'], result['folder'], text, result['elapsed']), flush = True)
+
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            futures = [executor.submit(index_folder, folder_path, user_data, output_path, 1, chunksize, use_cache,
+                                       file_format, partition_cols, profile, reader, qc_thresholds, line_freq)
+                       for folder_path, output_path in zip(folder_paths, output_paths)]
+            for future in as_completed(futures):
+                report(future.result())
+    else:
+        for folder_path, output_path in zip(folder_paths, output_paths):
+            report(index_folder(folder_path, user_data, output_path, n_workers, chunksize, use_cache,
+                                file_format, partition_cols, profile, reader, qc_thresholds, line_freq))
+
+    # write summary in input order
+    order = {output_path: i for i, output_path in enumerate(output_paths)}
+    summary = pd.DataFrame(results, columns = ['folder', 'output', 'status', 'rows', 'warnings', 'error', 'elapsed'])
+    summary = summary.iloc[summary['output'].map(order).argsort()].reset_index(drop = True)
+    os.makedirs(output_dir, exist_ok = True)
+    summary.to_csv(os.path.join(output_dir, 'batch_summary.csv'), index = False)
+
+    return summary
+
+
+def main(argv = None):
+    """
+    Command line entry point
+
+    Parameters
+    ----------
+    argv : list, command line arguments (sys.argv[1:] if None)
+
+    Returns
+    -------
+    exit_code : int, 0 if all folders were indexed, 1 if any folder failed
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Create SAKE index files for labchart data folders without the app.')
+    parser.add_argument('folders', nargs = '+', help = 'data folder(s) with labchart files')
+    parser.add_argument('-u', '--user-data', required = True, help = 'user data csv (format of default_table_data.csv)')
+    parser.add_argument('-o', '--output', required = True,
+                        help = 'output folder, index, user_data.csv and warnings.txt are written per data folder')
+    parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'number of folders indexed at a time')
+    parser.add_argument('-w', '--workers', type = int, default = 1,
+                        help = 'number of processes reading files of one folder (used with --jobs 1)')
+    parser.add_argument('--chunksize', type = int, default = 1, help = 'number of files sent to a worker at a time')
+    parser.add_argument('--no-cache', action = 'store_true', help = 'do not use the persistent file cache')
+    parser.add_argument('-f', '--format', choices = list(export_formats), default = 'csv', help = 'index file format')
+    parser.add_argument('-p', '--partition-by', nargs = '+', default = [],
+                        help = 'partition parquet or arrow index by columns (e.g. brain_region animal_id)')
+    parser.add_argument('--profile', action = 'store_true',
+                        help = 'write time and peak memory of each stage and slowest files to profile.jsonl')
+    parser.add_argument('-r', '--reader', choices = list(reader_backends), default = 'auto',
+                        help = 'read labchart files (adi), metadata sidecars (sidecar) or sidecars if present (auto)')
+    parser.add_argument('--qc', nargs = '*', metavar = 'METRIC=MIN:MAX',
+                        help = 'add signal qc metrics (' + ', '.join(qc_columns) + ') and drop rows outside of '
+                               'thresholds (default: ' + ' '.join([metric + '=%s:%s' % tuple('' if x is None else x
+                               for x in bounds) for metric, bounds in default_qc_thresholds.items()]) + ')')
+    parser.add_argument('--line-freq', type = float, default = 60, help = 'line noise frequency of qc (Hz)')
+    args = parser.parse_args(argv)
+
+    try:
+        user_data = load_user_data(args.user_data)
+        qc_thresholds = None
+        if args.qc is not None:
+            qc_thresholds = parse_qc_thresholds(args.qc) if args.qc else default_qc_thresholds
+    except Exception as err:
+        print('error: ' + str(err), file = sys.stderr)
+        return 1
+
+    if args.partition_by and args.format == 'csv':
+        parser.error('--partition-by requires parquet or arrow format')
+
+    summary = run_batch(args.folders, user_data, args.output, max(args.jobs, 1), max(args.workers, 1),
+                        max(args.chunksize, 1), not args.no_cache, args.format, args.partition_by, args.profile,
+                        args.reader, qc_thresholds, args.line_freq)
+
+    n_errors = (summary['status'] == 'error').sum()
+    print('%d/%d folders indexed, summary written to %s' % (len(summary) - n_errors, len(summary),
+          os.path.join(args.output, 'batch_summary.csv')))
+
+    return 1 if n_errors > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
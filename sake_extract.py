@@ -0,0 +1,54 @@
+### ---------------------------- Imports ---------------------------- ###
+import sys
+import time
+import argparse
+
+# User Defined # (backend only, no dash or plotly)
+from backend.extract_segments import store_formats, extract_segments
+from backend.export_index import read_index
+### ----------------------------------------------------------------- ###
+
+
+def main(argv = None):
+    """
+    Command line entry point
+
+    Parameters
+    ----------
+    argv : list, command line arguments (sys.argv[1:] if None)
+
+    Returns
+    -------
+    exit_code : int, 0 if segments were extracted, 1 otherwise
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Extract samples of each SAKE index row into a segment store '
+                                                   '(segments.npy or segments.h5 with segments.csv and segments.json).')
+    parser.add_argument('index', help = 'plan index (csv, parquet or arrow)')
+    parser.add_argument('folder', help = 'data folder that was indexed')
+    parser.add_argument('-o', '--output', required = True, help = 'output folder')
+    parser.add_argument('-f', '--format', choices = list(store_formats), default = 'npy', help = 'segment store format')
+    parser.add_argument('-w', '--workers', type = int, default = 1, help = 'number of processes reading files')
+    parser.add_argument('-r', '--reader', default = 'auto', help = 'labchart reader backend (auto or adi)')
+    parser.add_argument('--dtype', default = 'float32', help = 'data type of stored samples')
+    args = parser.parse_args(argv)
+
+    def progress(n_done, n_total):
+        print('\rfiles: %d/%d' % (n_done, n_total), end = '', file = sys.stderr)
+
+    start_time = time.time()
+    try:
+        segment_df = extract_segments(read_index(args.index), args.folder, args.output, args.format,
+                                      max(args.workers, 1), args.reader, args.dtype, progress)
+    except Exception as err:
+        print('\nerror: ' + str(err), file = sys.stderr)
+        return 1
+
+    print('\n%d segments (%d samples) written to %s (%.1f s)' % (len(segment_df), segment_df['segment_length'].sum(),
+                                                                  args.output, time.time() - start_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+### ---------------------------- Imports ---------------------------- ###
+import sys
+import time
+import argparse
+
+# User Defined # (backend only, no dash or plotly)
+from backend.join_behavior import time_units, write_interval_join
+from backend.export_index import read_index
+### ----------------------------------------------------------------- ###
+
+
+def main(argv = None):
+    """
+    Command line entry point
+
+    Parameters
+    ----------
+    argv : list, command line arguments (sys.argv[1:] if None)
+
+    Returns
+    -------
+    exit_code : int, 0 if index and bouts were joined, 1 otherwise
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Join behavior bouts onto overlapping rows of a SAKE index.')
+    parser.add_argument('index', help = 'plan index (csv, parquet or arrow)')
+    parser.add_argument('bouts', help = 'behavior bouts with key columns, start_time, stop_time and bout columns')
+    parser.add_argument('-o', '--output', required = True, help = 'joined index csv')
+    parser.add_argument('--on', nargs = '+', default = ['animal_id'], help = 'key columns of index and bouts')
+    parser.add_argument('-t', '--time-unit', choices = time_units, default = 'seconds', help = 'unit of bout times')
+    parser.add_argument('--chunk-rows', type = int, default = 100000, help = 'number of joined rows written at a time')
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    try:
+        n_rows = write_interval_join(read_index(args.index), read_index(args.bouts), args.output, args.on,
+                                     args.time_unit, max(args.chunk_rows, 1))
+    except Exception as err:
+        print('error: ' + str(err), file = sys.stderr)
+        return 1
+
+    print('%d joined rows written to %s (%.1f s)' % (n_rows, args.output, time.time() - start_time))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+### ---------------------------- Imports ---------------------------- ###
+import sys
+import time
+import argparse
+
+# User Defined # (backend only, no dash or plotly)
+from backend.power_spectra import index_psd
+from backend.export_index import read_index
+### ----------------------------------------------------------------- ###
+
+
+def main(argv = None):
+    """
+    Command line entry point
+
+    Parameters
+    ----------
+    argv : list, command line arguments (sys.argv[1:] if None)
+
+    Returns
+    -------
+    exit_code : int, 0 if power spectra were computed, 1 otherwise
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Compute Welch power spectral density of each SAKE index row '
+                                                   '(psd.npy frequencies x rows, freqs.npy and psd_index.csv).')
+    parser.add_argument('index', help = 'plan index (csv, parquet or arrow)')
+    parser.add_argument('folder', help = 'data folder that was indexed')
+    parser.add_argument('-o', '--output', required = True, help = 'output folder')
+    parser.add_argument('-w', '--workers', type = int, default = 1, help = 'number of processes reading files')
+    parser.add_argument('-r', '--reader', default = 'auto', help = 'labchart reader backend (auto or adi)')
+    parser.add_argument('--window', type = float, default = 2.0, help = 'Welch window length (s)')
+    parser.add_argument('--max-freq', type = float, default = None, help = 'highest stored frequency (Hz)')
+    args = parser.parse_args(argv)
+
+    def progress(n_done, n_total):
+        print('\rfiles: %d/%d' % (n_done, n_total), end = '', file = sys.stderr)
+
+    start_time = time.time()
+    try:
+        freqs, psd = index_psd(read_index(args.index), args.folder, args.output, max(args.workers, 1), args.reader,
+                               args.window, args.max_freq, progress)
+    except Exception as err:
+        print('\nerror: ' + str(err), file = sys.stderr)
+        return 1
+
+    elapsed = time.time() - start_time
+    print('\n%d rows x %d frequencies written to %s (%.1f s, %.1f rows/s)' % (psd.shape[1], psd.shape[0], args.output,
+                                                                             elapsed, psd.shape[1] / max(elapsed, 1e-9)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
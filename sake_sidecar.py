@@ -0,0 +1,131 @@
+### ---------------------------- Imports ---------------------------- ###
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# User Defined # (backend only, no dash or plotly)
+from backend.file_walker import get_file_entries
+from backend.readers import (AdiReader, sidecar_formats, get_sidecar_path, write_sidecar, read_sidecar,
+                             is_sidecar_current)
+### ----------------------------------------------------------------- ###
+
+
+def write_file_sidecar(file_path:str, file_format:str = 'json'):
+    """
+    Read labchart file with adi-reader and write its metadata sidecar
+
+    Parameters
+    ----------
+    file_path : str
+    file_format : str, json or parquet
+
+    Returns
+    -------
+    file_path : str
+    error : str, empty if sidecar was written
+
+    """
+
+    try:
+        write_sidecar(file_path, AdiReader().read_metadata(file_path), file_format)
+        return file_path, ''
+    except Exception as err:
+        return file_path, str(err)
+
+
+def has_current_sidecar(file_path:str, file_format:str = 'json'):
+    """
+    Check if sidecar exists and matches size and modification time of the labchart file
+
+    Parameters
+    ----------
+    file_path : str
+    file_format : str, json or parquet
+
+    Returns
+    -------
+    bool
+
+    """
+
+    try:
+        return is_sidecar_current(read_sidecar(get_sidecar_path(file_path, file_format)), file_path)
+    except Exception:   # missing or unreadable sidecar
+        return False
+
+
+def write_sidecars(folder_paths:list, file_format:str = 'json', n_workers:int = 1, overwrite:bool = False):
+    """
+    Write metadata sidecars of all labchart files in folders (files with current sidecars are skipped)
+
+    Parameters
+    ----------
+    folder_paths : list
+    file_format : str, json or parquet
+    n_workers : int, number of worker processes reading files
+    overwrite : bool, write sidecars of all files
+
+    Returns
+    -------
+    n_written : int
+    n_skipped : int
+    errors : list, of (file path, error)
+
+    """
+
+    file_paths, n_skipped = [], 0
+    for folder_path in folder_paths:
+        for root, file, _ in get_file_entries(os.path.normpath(folder_path)):
+            file_path = os.path.join(root, file)
+            if not overwrite and has_current_sidecar(file_path, file_format):
+                n_skipped += 1
+            else:
+                file_paths.append(file_path)
+
+    if n_workers > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers = n_workers) as executor:
+            results = list(executor.map(write_file_sidecar, file_paths, [file_format] * len(file_paths),
+                                        chunksize = 4))
+    else:
+        results = [write_file_sidecar(file_path, file_format) for file_path in file_paths]
+
+    errors = [(file_path, error) for file_path, error in results if error]
+    return len(results) - len(errors), n_skipped, errors
+
+
+def main(argv = None):
+    """
+    Command line entry point
+
+    Parameters
+    ----------
+    argv : list, command line arguments (sys.argv[1:] if None)
+
+    Returns
+    -------
+    exit_code : int, 0 if all sidecars were written, 1 if any file could not be read
+
+    """
+
+    parser = argparse.ArgumentParser(description = 'Write labchart metadata sidecars for indexing without adi-reader '
+                                                   '(run on the acquisition machine).')
+    parser.add_argument('folders', nargs = '+', help = 'data folder(s) with labchart files')
+    parser.add_argument('-f', '--format', choices = list(sidecar_formats), default = 'json', help = 'sidecar format')
+    parser.add_argument('-w', '--workers', type = int, default = 1, help = 'number of processes reading files')
+    parser.add_argument('--overwrite', action = 'store_true', help = 'write sidecars that are already up to date')
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    n_written, n_skipped, errors = write_sidecars(args.folders, args.format, max(args.workers, 1), args.overwrite)
+    for file_path, error in errors:
+        print('[error] %s: %s' % (file_path, error), file = sys.stderr)
+    print('%d sidecars written, %d up to date, %d errors (%.1f s)' % (n_written, n_skipped, len(errors),
+                                                                        time.time() - start_time))
+
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,49 @@
 import io, base64
-import pandas as pd
+from functools import lru_cache
 
 # define path to load table
 user_table_path = 'example_data/default_table_data.csv'
 
-# load table
-original_user_data = pd.read_csv(user_table_path)
+@lru_cache(maxsize = None)
+def load_original_user_data():
+    """
+    Load default user table (read once on first use, pandas is imported here to keep app startup fast)
+
+    OUTPUT
+    ----------
+    df: pd.DataFrame, with default user data
+
+    """
+
+    import pandas as pd
+    return pd.read_csv(user_table_path)
+
+
+def get_original_user_data():
+    """
+    Get copy of default user table
+
+    OUTPUT
+    ----------
+    df: pd.DataFrame, with default user data
+
+    """
+
+    return load_original_user_data().copy()
+
+
+def get_user_data_columns():
+    """
+    Get columns of default user table
+
+    OUTPUT
+    ----------
+    columns: pd.Index
+
+    """
+
+    return load_original_user_data().columns
 
-# get original columns
-user_data_columns = original_user_data.columns
 
 def upload_csv(upload_contents:str):
     """
@@ -18,20 +53,22 @@ def upload_csv(upload_contents:str):
     PARAMETERS
     ---------
     upload_contents: str, contents from dcc upload object
-    
+
     OUTPUT
     ----------
     df: pd.DataFrame, with user data
 
     """
 
+    import pandas as pd
+
     # parse user csv as df
     _, content_string = upload_contents.split(',')
     decoded = base64.b64decode(content_string)
     df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
 
     # if columns do not match load original user data
-    if set(df.columns) != set(user_data_columns):
-        df = original_user_data
+    if set(df.columns) != set(get_user_data_columns()):
+        df = get_original_user_data()
 
     return df
\ No newline at end of file